@@ -1,37 +1,220 @@
+import io
 import os
-import zipfile
-import shutil
 import json
-import csv
-
-import cv2
+import shutil
+import threading
+import time
+import uuid
+
+from flask import (Flask, Request, Response, request, jsonify, render_template, send_from_directory, url_for, abort,
+                   stream_with_context, current_app, g)
+
+from src.archive import stream_zip
+from src.cache import ResultCache
+from src.http_cache import PRIVATE_IMMUTABLE_CACHE_CONTROL, STATIC_VERSION_PARAMETER, PageCache, StaticAssets
+from src.jobs import JobManager
+from src.metrics import (PROMETHEUS_CONTENT_TYPE, REQUEST_DURATION, STAGE_DURATION, register_cache_metrics, registry,
+                         timed_iterator)
+from src.presets import get_preset_registry
+from src.profiling import profiling_requested
+from src.workspace import (create_workspace, get_workspace, is_preview_workspace, manifest_etags, preview_folder,
+                           processed_folder, profile_folder, proxy_folder, read_job_status, read_manifest,
+                           remove_expired_workspaces, upload_folder, write_job_status, write_manifest)
+
+
+class UploadRequest(Request):
+    """
+    Request that keeps uploaded files in memory instead of letting werkzeug spool them to temporary files.
+    Requests larger than IN_MEMORY_UPLOAD_LIMIT fall back to werkzeug's default disk spooling.
+    """
 
-from flask import Flask, request, jsonify, send_file, render_template, send_from_directory
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limit = current_app.config['IN_MEMORY_UPLOAD_LIMIT']
+        if total_content_length is not None and total_content_length <= limit:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
 
-from src.image_processing import ImageProcessor
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+
+# Uploads are processed straight from memory unless the request is larger than this many bytes,
+# or KEEP_UPLOADS_ON_DISK is set, in which case the files are saved to the workspace uploads/ folder first.
+app.config['IN_MEMORY_UPLOAD_LIMIT'] = int(os.environ.get('MAPMORPH_IN_MEMORY_UPLOAD_LIMIT', 256 * 1024 * 1024))
+app.config['KEEP_UPLOADS_ON_DISK'] = os.environ.get('MAPMORPH_KEEP_UPLOADS_ON_DISK', '0') == '1'
+
+# Number of worker processes used to process the files of a batch in parallel.
+# Set MAPMORPH_WORKERS=1 to process every file in the request thread instead.
+app.config['PROCESSING_WORKERS'] = int(os.environ.get('MAPMORPH_WORKERS', os.cpu_count() or 1))
+
+# Encoder settings of the generated maps, pick the throughput/size trade-off per deployment.
+# Anything not set here falls back to ENCODER_DEFAULTS in src/image_processing.py.
+ENCODER_SETTINGS = {
+    key: parse(os.environ[variable])
+    for key, variable, parse in (
+        ("png_compression", 'MAPMORPH_PNG_COMPRESSION', int),
+        ("png_strategy", 'MAPMORPH_PNG_STRATEGY', str),
+        ("jpeg_quality", 'MAPMORPH_JPEG_QUALITY', int),
+        ("jpeg_progressive", 'MAPMORPH_JPEG_PROGRESSIVE', lambda value: value == '1'),
+        ("webp_quality", 'MAPMORPH_WEBP_QUALITY', int),
+        ("webp_lossless", 'MAPMORPH_WEBP_LOSSLESS', lambda value: value == '1'),
+        ("preview_format", 'MAPMORPH_PREVIEW_FORMAT', str),
+        ("preview_quality", 'MAPMORPH_PREVIEW_QUALITY', int),
+        ("preview_size", 'MAPMORPH_PREVIEW_SIZE', int),
+    )
+    if variable in os.environ
+}
+
+# Admin token that unlocks per-request profiling: send it in the X-MapMorph-Profile header or the ?profile=
+# query parameter of /upload or /jobs. The profiles are saved in the workspace, profiling is off while unset.
+ADMIN_TOKEN = os.environ.get('MAPMORPH_ADMIN_TOKEN', '')
+
+# Importing the app stays cheap: OpenCV, NumPy and the processing modules are only imported by the first
+# upload or by preload(), and no folder is created or scanned until a request needs it. Pages that never
+# process anything, like the documentation, never pay for the imaging stack.
+
+# Every submission gets its own workspace folder with uploads/ and processed/ inside,
+# so concurrent requests never clear or zip each other's files. The folder is created with the first workspace.
+WORKSPACE_FOLDER = 'workspaces'
+WORKSPACE_RETENTION_SECONDS = int(os.environ.get('MAPMORPH_WORKSPACE_RETENTION', 3600))
+
+# Generated maps are cached by input image hash and settings, so re-uploads skip processing.
+# MAPMORPH_CACHE_BYTES is the disk budget of the cache, 0 turns caching off.
+CACHE_FOLDER = os.environ.get('MAPMORPH_CACHE_DIR', 'cache')
+CACHE_MAX_BYTES = int(os.environ.get('MAPMORPH_CACHE_BYTES', 1024 * 1024 * 1024))
+
+# Pages that look the same for every visitor are rendered once per process, see render_page
+page_cache = PageCache()
+
+# Result cache, job manager and static assets of this process, created on first use by their get_ functions
+_result_cache: ResultCache = None
+_job_manager: JobManager = None
+_static_assets: StaticAssets = None
+_startup_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Return the result cache of this process, opening it and scanning its folder on first use.
+    Returns None when caching is turned off.
+    """
+    global _result_cache
+
+    if _result_cache is None and CACHE_MAX_BYTES > 0:
+        with _startup_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(CACHE_FOLDER, CACHE_MAX_BYTES)
+                register_cache_metrics(_result_cache)
+    return _result_cache
+
+
+def get_job_manager() -> JobManager:
+    """
+    Return the background executor of the asynchronous job API, jobs are forgotten together with their workspace.
+    """
+    global _job_manager
+
+    if _job_manager is None:
+        result_cache = get_result_cache()
+        with _startup_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(
+                    processing_workers=app.config['PROCESSING_WORKERS'],
+                    max_concurrent_jobs=int(os.environ.get('MAPMORPH_CONCURRENT_JOBS', 2)),
+                    retention_seconds=WORKSPACE_RETENTION_SECONDS,
+                    cache=result_cache
+                )
+    return _job_manager
+
+
+def get_static_assets() -> StaticAssets:
+    """
+    Return the hashed and precompressed static files, reading the static folder on first use.
+    """
+    global _static_assets
+
+    if _static_assets is None:
+        with _startup_lock:
+            if _static_assets is None:
+                _static_assets = StaticAssets(app.static_folder)
+    return _static_assets
+
+
+def preload() -> None:
+    """
+    Load what the first requests would otherwise load: OpenCV, NumPy and the processing modules, the material
+    presets, the result cache index and the hashed static files. Call it once in the master process of a prefork server, see
+    gunicorn.conf.py, so every forked worker shares the loaded pages copy-on-write instead of importing
+    OpenCV again on its first request.
+    Nothing that must not cross a fork is started here, the processing pool and the job threads are created
+    by each worker when it needs them.
+    """
+    import numpy as np
+    from src.image_processing import ImageProcessor
+    import src.pipeline  # noqa: F401
+
+    # One tiny encode per common format pages in the codec code before the fork
+    for extension in ('.png', '.jpg'):
+        ImageProcessor.encode_image(np.zeros((8, 8, 3), dtype=np.uint8), extension)
+
+    get_preset_registry()
+    get_result_cache()
+    get_static_assets()
+    print("Imaging stack, presets, result cache and static assets preloaded.")
+
+
+def workspace_or_404(workspace_id: str) -> str:
+    """
+    Return the path of an existing workspace, or abort with 404 if it is unknown or expired.
+    """
+    workspace_path = get_workspace(WORKSPACE_FOLDER, workspace_id)
+    if workspace_path is None:
+        abort(404, description="Workspace not found")
+    return workspace_path
+
+
+# Every request is timed per endpoint, scrapes of /metrics itself and static files are left out
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    if request.endpoint not in (None, 'static', 'metrics') and 'request_start' in g:
+        REQUEST_DURATION.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint)
+    return response
+
+
+def render_page(template_name: str) -> Response:
+    """
+    Serve a template that renders the same for every visitor from the page cache, with ETag and Last-Modified
+    so repeat visits get a 304. The debug server renders every request so template edits show up straight away.
+    """
+    if app.debug:
+        return render_template(template_name)
+    return page_cache.response(request, template_name, lambda: render_template(template_name))
+
+
+# Static URLs built with url_for carry the content hash of the file, e.g. /static/styles.css?v=3f2a9c0d1e7b4a65,
+# so browsers can cache them forever and still fetch a new version as soon as the file changes
+@app.url_defaults
+def add_static_version(endpoint, values):
+    if endpoint == 'static' and not app.debug and STATIC_VERSION_PARAMETER not in values:
+        version = get_static_assets().version(values.get('filename'))
+        if version:
+            values[STATIC_VERSION_PARAMETER] = version
+
+
+def static_file(filename):
+    if app.debug:
+        return app.send_static_file(filename)
+    return get_static_assets().response(request, filename)
+
+
+# Serve /static/ through StaticAssets: immutable caching for hashed URLs and precompressed gzip/brotli variants
+app.view_functions['static'] = static_file
 
-# create a folder for uploads and processed images
-UPLOAD_FOLDER = 'uploads'
-PROCESSED_FOLDER = 'processed'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-if not os.path.exists(PROCESSED_FOLDER):
-    os.makedirs(PROCESSED_FOLDER)
-
-
-# Clear the uploads and processed folders on startup to avoid duplication from previous runs.
-def clear_folder(folder: str) -> None:
-    for filename in os.listdir(folder):
-        file_path = os.path.join(folder, filename)
-        try:
-            if os.path.isdir(file_path):  # if item is a directory, remove it and its contents
-                shutil.rmtree(file_path)
-            else:
-                os.unlink(file_path)  # if item is a file, remove it
-        except Exception as e:
-            print(f'Failed to delete {file_path}. Reason: {e}')
 
 ##################################################################
 # Routes for the image processing application
@@ -42,357 +225,460 @@ def clear_folder(folder: str) -> None:
 # Serve the index.html file
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return render_page('index.html')
 
 
 # Route for the processing page
 @app.route('/processing')
 def processing():
-    return render_template('processing.html')
+    return render_page('processing.html')
 
 
 # Route for the login/signup page
 @app.route('/auth')
 def auth():
-    return render_template("auth.html")
+    return render_page('auth.html')
 
 
 # Route for the help page
 @app.route('/help')
 def help():
-    return render_template('help.html')
+    return render_page('help.html')
 
 
 # Route for the pricing page
 @app.route('/pricing')
 def pricing():
-    return render_template('pricing.html')
+    return render_page('pricing.html')
 
 
 # Route for the bug report page
 @app.route('/bug_report')
 def bug_report():
-    return render_template('bug_report.html')
+    return render_page('bug_report.html')
 
 
-@app.route('/processed/<path:filename>')
-def processed_file(filename):
-    return send_from_directory(os.path.abspath(PROCESSED_FOLDER), filename)
+def send_output_file(folder: str,
+                     filename: str,
+                     etag: str = None) -> Response:
+    """
+    Serve a generated file of a workspace. Files listed in the finished batch's manifest never change again,
+    they are served with their content hash as a strong ETag and cached by the browser for good.
+    If-None-Match, If-Modified-Since and Range requests are answered by send_from_directory.
+    """
+    response = send_from_directory(os.path.abspath(folder), filename, etag=etag or True)
+    if etag:
+        response.headers['Cache-Control'] = PRIVATE_IMMUTABLE_CACHE_CONTROL
+    else:
+        # Still being processed, or not in the manifest, revalidate every time
+        response.cache_control.no_cache = True
+    return response
+
+
+# Full resolution maps of a workspace, only fetched for explicit downloads
+@app.route('/processed/<workspace_id>/<path:filename>')
+def processed_file(workspace_id, filename):
+    workspace_path = workspace_or_404(workspace_id)
+    manifest = read_manifest(workspace_path)
+    etag = manifest_etags(manifest).get(filename) if manifest else None
+    return send_output_file(processed_folder(workspace_path), filename, etag)
+
+
+# Small WebP/JPEG previews of the maps, what the processing page shows instead of the full resolution files
+@app.route('/preview/<workspace_id>/<path:filename>')
+def preview_file(workspace_id, filename):
+    workspace_path = workspace_or_404(workspace_id)
+    manifest = read_manifest(workspace_path)
+    etag = manifest_etags(manifest, previews=True).get(filename) if manifest else None
+    return send_output_file(preview_folder(workspace_path), filename, etag)
 
 @app.route('/documentation')
 def documentation():
-    return render_template('docs/documentation.html')
+    return render_page('docs/documentation.html')
 
 
 @app.route('/about')
 def about():
-    return render_template('docs/about.html')
+    return render_page('docs/about.html')
 
 @app.route('/version-history')
 def version_history():
-    return render_template('docs/version_history.html')
+    return render_page('docs/version_history.html')
 
 @app.route('/roadmap')
 def roadmap():
-    return render_template('docs/roadmap.html')
+    return render_page('docs/roadmap.html')
 
 @app.route('/getting-started')
 def getting_started():
-    return render_template('docs/getting_started.html')
+    return render_page('docs/getting_started.html')
 
 @app.route('/faqs')
 def faqs():
-    return render_template('docs/faqs.html')
+    return render_page('docs/faqs.html')
 
 @app.route('/web-app-overview')
 def web_app_overview():
-    return render_template('docs/web_app_overview.html')
+    return render_page('docs/web_app_overview.html')
 
 @app.route('/uploading-setup')
 def uploading_setup():
-    return render_template('docs/uploading_setup.html')
+    return render_page('docs/uploading_setup.html')
 
 @app.route('/user-preferences-setup')
 def user_preferences_setup():
-    return render_template('docs/user_preferences_setup.html')
+    return render_page('docs/user_preferences_setup.html')
 
 @app.route('/post-processing')
 def post_processing():
-    return render_template('docs/post_processing.html')
+    return render_page('docs/post_processing.html')
 
 @app.route('/export-output')
 def export_output():
-    return render_template('docs/export_output.html')
+    return render_page('docs/export_output.html')
 
 @app.route('/integration')
 def integration():
-    return render_template('docs/integration.html')
+    return render_page('docs/integration.html')
 
 @app.route('/advanced-overview')
 def advanced_overview():
-    return render_template('docs/advanced_overview.html')
+    return render_page('docs/advanced_overview.html')
 
 
 @app.route('/api-access')
 def api_access():
-    return render_template('docs/api_access.html')
+    return render_page('docs/api_access.html')
 
 @app.route('/contributing')
 def contributing():
-    return render_template('docs/contributing.html')
+    return render_page('docs/contributing.html')
 
 @app.route('/acknowledgments')
 def acknowledgments():
-    return render_template('docs/acknowledgments.html')
+    return render_page('docs/acknowledgments.html')
 
 
-# Static route for processed images as a zip file
-@app.route('/download/processed.zip')
-def download_zip():
-    zip_filename = 'MyTextures.zip'
-    zip_filepath = os.path.join(PROCESSED_FOLDER, zip_filename)
+# Route for the processed images of one workspace as a zip file.
+# Optional filters: ?map_type=Normal,Roughness and ?source=brick.png (both may be repeated)
+@app.route('/download/<workspace_id>/processed.zip')
+def download_zip(workspace_id):
+    workspace_path = workspace_or_404(workspace_id)
+    output_folder = processed_folder(workspace_path)
 
-    # Debugging: Check if the processed folder exists
-    if not os.path.exists(PROCESSED_FOLDER):
-        return jsonify({"error": "Processed folder not found"}), 500
+    manifest = read_manifest(workspace_path)
+    if manifest is None:
+        return jsonify({"error": "Processing has not finished yet"}), 409
 
-    # Remove pre-existing zip file if it exists
-    if os.path.exists(zip_filepath):
-        os.remove(zip_filepath)
+    map_types = {value.strip().lower() for values in request.args.getlist('map_type') for value in values.split(',') if value.strip()}
+    sources = {value.strip() for values in request.args.getlist('source') for value in values.split(',') if value.strip()}
 
     # Check if there are any files to add to the zip
-    files_to_zip = [f for f in os.listdir(PROCESSED_FOLDER) if os.path.isfile(os.path.join(PROCESSED_FOLDER, f)) and f != zip_filename]
+    files_to_zip = []
+    for entry in manifest["sources"]:
+        # The source texture can be given with or without its extension
+        if sources and entry["source"] not in sources and os.path.splitext(entry["source"])[0] not in sources:
+            continue
+        for processed_map in entry["maps"]:
+            if map_types and processed_map["map_type"].lower() not in map_types:
+                continue
+            file_path = os.path.join(output_folder, processed_map["filename"])
+            if os.path.isfile(file_path):
+                files_to_zip.append(file_path)
 
     if not files_to_zip:
         return jsonify({"error": "No processed files found to zip"}), 400
 
-    # Create a new zip file with the processed files
-    try:
-        with zipfile.ZipFile(zip_filepath, 'w') as zipf:
-            for filename in files_to_zip:
-                file_path = os.path.join(PROCESSED_FOLDER, filename)
-                zipf.write(file_path, os.path.basename(file_path))
+    # Stream the archive while it is being built, nothing is written to disk
+    return Response(
+        stream_with_context(timed_iterator(stream_zip(files_to_zip), STAGE_DURATION, stage="zip")),
+        mimetype='application/zip',
+        headers={"Content-Disposition": "attachment; filename=MyTextures.zip"}
+    )
 
-        # Debugging: Check if the zip file was created
-        if not os.path.exists(zip_filepath):
-            return jsonify({"error": "Failed to create ZIP file"}), 500
 
-    except Exception as e:
-        return jsonify({"error": f"Error creating ZIP: {str(e)}"}), 500
+def validate_preferences(preferences: dict):
+    """
+    Validate preferences once for the whole batch.
 
-    # Send the zip file
-    return send_file(os.path.abspath(zip_filepath), as_attachment=True)
+    Returns:
+        The error response if the preferences cannot be processed, otherwise None.
+    """
+    if preferences.get('generate_roughness', None):
+        specular_workflow_preference = preferences.get('specular_workflow', "PBR Rough/Metallic Workflow")
+        if specular_workflow_preference != "PBR Rough/Metallic Workflow":
+            print("Using Specular/Glossiness Workflow has not yet been implemented, please select PBR Rough/Metallic Workflow.")
+            return jsonify({"Error": "Specular/Glossiness Workflow has not yet been implemented, please select PBR Rough/Metallic Workflow."}), 400
+    return None
 
 
-@app.route('/upload', methods=['POST'])
-def upload_image():
-    # Clear the uploads and processed folders before processing new images
-    clear_folder(PROCESSED_FOLDER)
-    clear_folder(UPLOAD_FOLDER)
+def prepare_batch():
+    """
+    Save the uploaded files into a new workspace and build one process_texture task per file.
+    Instead of files the request can name the preview_id of a previewed submission, its uploads are then
+    processed at full resolution without being sent again.
 
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+    Returns:
+        tuple: (workspace_id, tasks, None) on success, or (None, None, error response) if the request is invalid.
+    """
+    preview_path = None
+    if request.form.get('preview_id'):
+        preview_path = workspace_or_404(request.form['preview_id'])
+        if not is_preview_workspace(preview_path):
+            return None, None, (jsonify({"error": "Not the ID of a previewed submission"}), 400)
+    elif 'file' not in request.files:
+        return None, None, (jsonify({"error": "No file uploaded"}), 400)
 
     # Extract files and preferences from the request
-    # files = request.files.getlist('file')
     preferences = json.loads(request.form['preferences'])
 
-    # Load PBR presets from the /presets directory
-    pbr_presets_directory = 'presets'  # Use relative path
-    pbr_presets = load_presets(pbr_presets_directory)
-    
-    naming_convention = preferences.get("naming_convention","Don't Convert")
-    if naming_convention == "Don't Convert":
-        naming_convention = ""
-    
-    desired_extension = preferences.get("export_format","Don't Convert")
-        
-    print("Desired extension:", desired_extension)
+    # PBR presets of the selected source, cached by the registry and only re-read when a CSV changes
+    pbr_presets = get_preset_registry().materials(preferences.get('pbr_preset'))
 
     # Log preferences for debugging
     print("User Preferences:", preferences)
 
-    processed_files = []
-    for file in request.files.getlist('file'):
-        
-        if desired_extension == "Don't Convert":
-            desired_extension = file.filename.split('.')[-1]  # Default to the original file extension
-        
-        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filepath)
-
-        try:
-            # Pre-process check, file size, file corruption, extension etc.
-            ImageProcessor.pre_process_check(filepath)
-
-            #########################################################################
-            # Apply user preferences
-            #########################################################################
-
-            # Target resolution, resize the image to fit the new size
-            export_resolution = preferences.get('target_export_resolution', "512x512")
-            width, height = map(int, export_resolution.split('x'))
-            resized_cropped_image = ImageProcessor.resize_and_crop(filepath, target_size=(width, height))
-
-            # base greyscale adjust. change this to work on top of resize, not replace!
-            processed_image = ImageProcessor.greyscale_adjust(resized_cropped_image)
-
-            # Apply AI segmentation if selected
-            if preferences.get('use_ai_segmentation', False):
-                pass
-                print("AI segmentation feature is in development and will be implemented later.")
-                # processed_image = apply_segmentation(processed_image)
-
-            # Apply manual material selection if provided
-            manual_material = preferences.get('manual_material_selection', None)
-            if manual_material:
-                processed_image = ImageProcessor.detect_material(processed_image)
+    error_response = validate_preferences(preferences)
+    if error_response:
+        return None, None, error_response
+
+    # Drop the workspaces of old submissions, then create a fresh one for this submission.
+    # An accepted preview gets a fresh workspace too, so the outputs of every render stay immutable
+    remove_expired_workspaces(WORKSPACE_FOLDER, WORKSPACE_RETENTION_SECONDS)
+    workspace_id, workspace_path = create_workspace(WORKSPACE_FOLDER)
+
+    # An admin can have the batch profiled, every file then gets its own profile in the workspace
+    profiles = None
+    if profiling_requested(request.headers, request.args, ADMIN_TOKEN):
+        profiles = profile_folder(workspace_path)
+        os.makedirs(profiles, exist_ok=True)
+
+    # Collect every upload first, then run each file's pipeline as an independent task
+    uploads = []
+    if preview_path is not None:
+        for original_filename in sorted(os.listdir(upload_folder(preview_path))):
+            previewed = os.path.join(upload_folder(preview_path), original_filename)
+            upload = os.path.join(upload_folder(workspace_path), original_filename)
+            try:
+                # A hard link shares the previewed upload instead of copying it
+                os.link(previewed, upload)
+            except OSError:
+                shutil.copyfile(previewed, upload)
+            uploads.append((original_filename, upload))
+    else:
+        for file in request.files.getlist('file'):
+            # Only keep the base name so an upload can never be written outside its workspace
+            original_filename = os.path.basename(file.filename)
+
+            if isinstance(file.stream, io.BytesIO) and not app.config['KEEP_UPLOADS_ON_DISK']:
+                # Small enough to have been kept in memory, hand the bytes straight to the pipeline
+                upload = file.stream.getvalue()
             else:
-                print("Error, no material selected.")
-
-            # Apply AI upscaling if selected
-            if preferences.get('apply_ai_upscale', False):
-                pass
-                print("AI Upscaling feature is in development and will be implemented later.")
-                processed_image = ImageProcessor.apply_upscaling(processed_image)
-
-            # Standardize PBR if selected
-            if preferences.get('pbr_standardize', False):
-                # Apply user preferences PBR material preset to image given dropdown selection
-                material_preset_name = preferences.get('material_type', 'Brick')  # Default to brick material
-                material_preset = pbr_presets.get(material_preset_name, None)
-                processed_image = ImageProcessor.standardize_pbr(processed_image, material_preset)
-
-            # Set texel density if selected
-            if preferences.get('set_texel_ai', False):
-                pass
-                print("Set Texel Density feature is in development and will be implemented later.")
-                texel_value = preferences.get('texel_value', 1.0)
-                processed_image = ImageProcessor.set_texel_density(processed_image, texel_value)
-
-            # Add grunge if selected
-            if preferences.get('add_grunge', False):
-                print("Add grunge featur    e is in development and will be implemented later.")
-                pass
-                processed_image = ImageProcessor.add_grunge(processed_image)
-
-            # Remove artefacts if selected
-            if preferences.get('remove_artifacts', False):
-                print("Remove artefacts feature is in development and will be implemented later.")
-                pass
-                processed_image = ImageProcessor.remove_artifacts(processed_image)
-
-            # Make tilig material tiling if selected
-            if preferences.get('make_tiling', False):
-                processed_image = ImageProcessor.make_tiling(processed_image)
-                print("Made tiling image.")
-
-            # Force square if selected
-            if preferences.get('force_square', False):
-                print("Force square feature is in development and will be implemented later.")
-                pass
-                processed_image = ImageProcessor.force_square(processed_image)
-                
-            #########################################################################
-            # Output Maps
-            #########################################################################
-
-            # export format setup, conversion logic goes here
-            export_preference = preferences.get('export_format', "Don't Convert")
-            if not export_preference == "Don't Convert":
-                print("Exporting image as", export_preference)
-                processed_image = ImageProcessor.convert_image_format(processed_image, export_preference)
-
-            # Helper function to process and save maps
-            def process_and_save_map(map_type, image, preset_name=None, preset_value=None):
-                if map_type == "Roughness":
-                    processed_map = image
-                elif map_type == "Normal":
-                    processed_map = ImageProcessor.generate_normal_map(image, preset_name)
-                elif map_type == "Metallic":
-                    processed_map = ImageProcessor.generate_metallic(image, preset_value)
-                else:
-                    return
-
-                processed_filename = ImageProcessor.rename_output_image(
-                    file,
-                    naming_convention,
-                    desired_extension,
-                    target_map_type=map_type
-                )
+                # Spooled by werkzeug, save it into the workspace so worker processes can read it
+                upload = os.path.join(upload_folder(workspace_path), original_filename)
+                file.save(upload)
+            uploads.append((original_filename, upload))
+
+    tasks = []
+    for original_filename, upload in uploads:
+        tasks.append({
+            "upload": upload,
+            "original_filename": original_filename,
+            "preferences": preferences,
+            "pbr_presets": pbr_presets,
+            "output_folder": processed_folder(workspace_path),
+            "encoder_settings": ENCODER_SETTINGS,
+            "profile_folder": profiles,
+            "preview_folder": preview_folder(workspace_path)
+        })
+
+    return workspace_id, tasks, None
 
-                ImageProcessor.save_output_image(
-                    PROCESSED_FOLDER,
-                    processed_files,
-                    processed_filename,
-                    processed_map
-                )
 
-                print(f"Processed {map_type.lower()} texture saved as", processed_filename)
+@app.route('/upload', methods=['POST'])
+def upload_image():
+    workspace_id, tasks, error_response = prepare_batch()
+    if error_response:
+        return error_response
+
+    # Imported here so the imaging stack is only loaded once something is processed
+    from src.pipeline import run_batch
+
+    results = run_batch(tasks, max_workers=app.config['PROCESSING_WORKERS'], cache=get_result_cache())
+    write_manifest(get_workspace(WORKSPACE_FOLDER, workspace_id), results)
+
+    processed_files = [filename for result in results for filename in result["files"]]
+    errors = [{"file": result["source"], "error": result["error"]} for result in results if result["error"]]
+
+    # Nothing could be processed, report it as a bad request like before
+    if errors and not processed_files:
+        return jsonify({"Error during main processing loop:": errors[0]["error"], "job_id": workspace_id, "errors": errors}), 400
+
+    # Size and encode time of every map, to compare encoder settings
+    maps = [dict(saved, source=result["source"]) for result in results for saved in result["maps"]]
+
+    response = {"message": "Images processed", "job_id": workspace_id, "files": processed_files, "maps": maps,
+                "errors": errors}
+
+    # Only profiled requests report their profiles, fetch them from /profiles/<job_id>/<name>
+    profiles = [dict(result["profile"], source=result["source"]) for result in results if result.get("profile")]
+    if profiles:
+        response["profiles"] = profiles
+
+    return jsonify(response)
+
+
+# Instant preview: the same stages run on a proxy of about 256 px of every upload, in the request itself.
+# The first call uploads the files, later calls only send the preview_id and the changed preferences.
+# Posting the preview_id to /jobs (or /upload) accepts the settings and renders the full resolution maps.
+# Unlike a direct submission, previewed uploads are always saved to the workspace, later previews and the
+# accepted render may be handled by another web worker.
+@app.route('/preview', methods=['POST'])
+def preview_batch():
+    in_memory = {}
+    if request.form.get('preview_id'):
+        preview_id = request.form['preview_id']
+        workspace_path = workspace_or_404(preview_id)
+        if not is_preview_workspace(workspace_path):
+            return jsonify({"error": "Not the ID of a previewed submission"}), 400
+    elif 'file' in request.files:
+        remove_expired_workspaces(WORKSPACE_FOLDER, WORKSPACE_RETENTION_SECONDS)
+        preview_id, workspace_path = create_workspace(WORKSPACE_FOLDER, previewed=True)
+        for file in request.files.getlist('file'):
+            # Kept on disk, the uploads are previewed again with every change and rendered once accepted.
+            # Uploads that arrived in memory are still previewed from memory, the first preview does not read them back
+            original_filename = os.path.basename(file.filename)
+            if isinstance(file.stream, io.BytesIO):
+                in_memory[original_filename] = file.stream.getvalue()
+            file.save(os.path.join(upload_folder(workspace_path), original_filename))
+    else:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    preferences = json.loads(request.form['preferences'])
+    error_response = validate_preferences(preferences)
+    if error_response:
+        return error_response
+    pbr_presets = get_preset_registry().materials(preferences.get('pbr_preset'))
+
+    # Imported here so the imaging stack is only loaded once something is processed
+    from src.pipeline import preview_texture
+
+    # Every preview gets its own folder, so a page never shows previews of older settings from the browser cache
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    files = []
+    for original_filename in sorted(os.listdir(upload_folder(workspace_path))):
+        upload = in_memory.get(original_filename, os.path.join(upload_folder(workspace_path), original_filename))
+        result = preview_texture(upload, original_filename, preferences, pbr_presets,
+                                 os.path.join(preview_folder(workspace_path), run_id),
+                                 proxy_folder(workspace_path), ENCODER_SETTINGS)
+        maps = [{"map_type": saved["map_type"], "filename": saved["filename"],
+                 "preview_url": url_for('preview_file', workspace_id=preview_id, filename=f'{run_id}/{saved["preview"]}')}
+                for saved in result["maps"]]
+        files.append({"source": result["source"], "maps": maps, "error": result["error"]})
+
+    # Keep a preview that is still being tuned from expiring
+    os.utime(workspace_path)
+
+    return jsonify({"preview_id": preview_id, "files": files, "seconds": round(time.perf_counter() - started, 3),
+                    "accept_url": url_for('submit_job')})
+
+
+# Profiles of an admin profiled submission, the .prof files open in snakeviz or pstats
+@app.route('/profiles/<workspace_id>/<path:filename>')
+def download_profile(workspace_id, filename):
+    if not profiling_requested(request.headers, request.args, ADMIN_TOKEN):
+        abort(403)
+    workspace_path = workspace_or_404(workspace_id)
+    return send_from_directory(os.path.abspath(profile_folder(workspace_path)), filename, as_attachment=True)
+
+
+# Read-only material presets for the frontend, revalidated with an ETag instead of re-downloaded
+@app.route('/api/presets')
+def presets_api():
+    preset_registry = get_preset_registry()
+    response = jsonify(preset_registry.to_dict())
+    response.set_etag(preset_registry.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 
+##################################################################
+# Asynchronous job API
+# Submit a batch, get a job ID back straight away and poll for progress.
+##################################################################
 
-            # Generate roughness map if selected
-            if preferences.get('generate_roughness', None):
-                specular_workflow_preference = preferences.get('specular_workflow', "PBR Rough/Metallic Workflow")
-                if specular_workflow_preference == "PBR Rough/Metallic Workflow":
-                    print("Using PBR Rough/Metallic Workflow")
-                    process_and_save_map("Roughness", processed_image)
-                else:
-                    print("Using Specular/Glossiness Workflow has not yet been implemented, please select PBR Rough/Metallic Workflow.")
-                    return jsonify({"Error": "Specular/Glossiness Workflow has not yet been implemented, please select PBR Rough/Metallic Workflow."}), 400
 
-            # Generate normal map if selected
-            if preferences.get('generate_normal', None):
-                normal_preset_name = preferences.get('normal_bump_workflow', 'Normal Map')
-                process_and_save_map("Normal", resized_cropped_image, preset_name=normal_preset_name)
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    workspace_id, tasks, error_response = prepare_batch()
+    if error_response:
+        return error_response
 
-            # Generate metallic map if selected
-            if preferences.get('generate_metallic', None):
-                material_preset_name = preferences.get('manual_material_selection', 'Brick')
-                material_preset = pbr_presets.get(material_preset_name, {})
-                metallic_value = material_preset.get('IsMetallic', 0)  # Default to not metallic if not specified
-                process_and_save_map("Metallic", processed_image, preset_value=metallic_value)
+    # The job shares its ID with the workspace its files live in
+    workspace = get_workspace(WORKSPACE_FOLDER, workspace_id)
+    # The job state is also saved in the workspace, so polls that land on another web worker can be answered
+    job_id = get_job_manager().submit(tasks, job_id=workspace_id,
+                                      on_finish=lambda results: write_manifest(workspace, results),
+                                      on_update=lambda job: write_job_status(workspace, job))
 
-        except ValueError as e:
-            return jsonify({"Error during main processing loop:": str(e)}), 400
-        
-    return jsonify({"message": "Images processed", "files": processed_files})
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for('job_status', job_id=job_id),
+        "result_url": url_for('job_result', job_id=job_id)
+    }), 202
 
 
-def load_presets(presets_directory:str) -> dict:
+def find_job(job_id: str) -> dict:
     """
-    Load all preset CSV files from the specified directory.
-
-    Parameters:
-        presets_directory (str): Directory containing preset CSV files.
+    Return the state of a job, from memory if this web worker runs it, otherwise from its workspace.
 
     Returns:
-        presets (dict): A dictionary of materials with their properties.
+        dict: Job snapshot as returned by JobManager.get, or None if the job is unknown.
     """
-    presets = {}
-    
-    # Use the absolute path based on the current working directory
-    absolute_presets_directory = os.path.join(os.path.dirname(__file__), presets_directory)
-
-    # Loop through all CSV files in the /presets directory
-    for filename in os.listdir(absolute_presets_directory):
-        if filename.endswith('.csv'):
-            with open(os.path.join(absolute_presets_directory, filename), mode='r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    material_name = row["Material"]
-                    base_color = row["BaseColor"]
-                    roughness = int(row["Roughness"])
-                    is_metallic = int(row["IsMetallic"])
-
-                    presets[material_name] = {
-                        "BaseColor": base_color,
-                        "Roughness": roughness,
-                        "IsMetallic": is_metallic
-                    }
-    print("Presets loaded successfully from CSV files.", absolute_presets_directory)
-
-    return presets
+    job = get_job_manager().get(job_id)
+    if job is None:
+        workspace_path = get_workspace(WORKSPACE_FOLDER, job_id)
+        if workspace_path is not None:
+            job = read_job_status(workspace_path)
+    return job
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job["status"] not in ("done", "failed"):
+        return jsonify({"error": "Job is not finished yet", "status": job["status"]}), 409
+
+    return jsonify({"status": job["status"], "files": job["outputs"], "errors": job["errors"]})
+
+
+# Pipeline metrics of this web worker in the Prometheus text format: stage latencies, file, byte and
+# megapixel counters, errors by stage and the result cache counters
+@app.route('/metrics')
+def metrics():
+    # The cache counters are registered when the cache is opened, open it so they are always exported
+    get_result_cache()
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Servers that import the app in their master process without a config hook, e.g. uWSGI without lazy-apps,
+# can preload by setting MAPMORPH_PRELOAD=1
+if os.environ.get('MAPMORPH_PRELOAD', '0') == '1':
+    preload()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,306 @@
+"""
+Benchmarks of the ImageProcessor stages and the end-to-end /upload route.
+
+Synthetic textures are generated at every size, each stage is timed and its traced peak memory recorded,
+and the results are saved as JSON and compared against baseline.json. Any stage slower or hungrier than
+its baseline by more than the tolerance is reported and the script exits with status 1.
+
+Run from the backend folder:
+    python benchmarks/run_benchmarks.py                       # all sizes, compare against the baseline
+    python benchmarks/run_benchmarks.py --sizes 512 1024      # quick run on the small sizes
+    python benchmarks/run_benchmarks.py --update-baseline     # record a new baseline on this machine
+
+Timings depend on the machine, so compare against a baseline recorded on the same hardware.
+The file is not named test_*.py on purpose, pytest never collects it.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BACKEND_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_FOLDER)
+
+from src.image_processing import ImageProcessor  # noqa: E402
+
+
+# Square texture sizes benchmarked by default
+DEFAULT_SIZES = (512, 1024, 2048, 4096)
+
+# Timed runs per stage, the median is compared. One extra traced run measures the peak memory
+DEFAULT_REPEAT = 5
+
+# Allowed slowdown and peak memory growth against the baseline before a stage counts as a regression
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+
+# Memory differences below this many MiB are noise from small temporaries, never a regression
+MEMORY_SLACK_MIB = 1.0
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.json')
+
+# Preferences sent to /upload, the processing page defaults with every map enabled
+UPLOAD_PREFERENCES = {
+    "naming_convention": "T_texturename_Roughness",
+    "manual_material_selection": "Brick",
+    "export_format": "PNG",
+    "specular_workflow": "PBR Rough/Metallic Workflow",
+    "normal_bump_workflow": "Tangent Normal Map (OpenGL)",
+    "generate_roughness": True,
+    "generate_metallic": True,
+    "generate_normal": True,
+    "make_tiling": True,
+}
+
+
+def synthetic_texture(size: int,
+                      seed: int = 0) -> np.ndarray:
+    """
+    Generate a size x size RGB texture: smooth colour variation with fine grain on top, like a photo scan.
+    """
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(size // 32, 2), max(size // 32, 2), 3), dtype=np.uint8)
+    texture = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+    texture += rng.normal(0, 8, texture.shape).astype(np.float32)
+    return np.clip(texture, 0, 255).astype(np.uint8)
+
+
+def measure(function,
+            repeat: int) -> dict:
+    """
+    Time a function and record its traced peak memory.
+    The traced run doubles as warm-up, the timed runs are not traced so tracing never skews the timings.
+
+    Returns:
+        dict: {"median_ms", "min_ms", "peak_mib"}
+    """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "peak_mib": round(peak / (1024 * 1024), 2),
+    }
+
+
+def stage_benchmarks(size: int,
+                     output_folder: str) -> dict:
+    """
+    Build the ImageProcessor stages of the pipeline for one texture size, in pipeline order.
+    Every stage gets the output the previous stage would hand it, computed once up front.
+
+    Returns:
+        dict: Stage name mapped to a function that runs the stage once.
+    """
+    image = synthetic_texture(size)
+    # Upload the texture the way users do, a JPEG scan comfortably below the 15 MB limit
+    encoded = cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    roughness = ImageProcessor.greyscale_adjust(image, roughness=50)
+    normal = ImageProcessor.generate_tangent_normal_map(image)
+
+    return {
+        "pre_process_check": lambda: ImageProcessor.pre_process_check(encoded, "texture.jpg"),
+        # Same size in and out, what /upload runs when the export resolution matches the scan
+        "resize_and_crop": lambda: ImageProcessor.resize_and_crop(image, target_size=(size, size)),
+        "greyscale_adjust": lambda: ImageProcessor.greyscale_adjust(image, roughness=50),
+        "generate_normal_map": lambda: ImageProcessor.generate_normal_map(image, "Normal Map"),
+        "generate_tangent_normal_map": lambda: ImageProcessor.generate_tangent_normal_map(image),
+        "make_tiling": lambda: ImageProcessor.make_tiling(image),
+        "make_tiling_seams": lambda: ImageProcessor.make_tiling_seams(roughness),
+        # The maps are encoded once when they are saved, encode_image replaced convert_image_format
+        "encode_image_png": lambda: ImageProcessor.encode_image(normal, ".png"),
+        "encode_image_dds": lambda: ImageProcessor.encode_image(normal, ".dds", {"dds_compression": "BC5"}),
+        "save_output_image": lambda: ImageProcessor.save_output_image(output_folder, [], "texture_Roughness.png",
+                                                                      roughness),
+        "save_preview_image": lambda: ImageProcessor.save_preview_image(output_folder, "texture_Normal.png", normal),
+    }
+
+
+def upload_benchmark(client,
+                     size: int):
+    """
+    Build a function that posts one synthetic texture to /upload and checks the response.
+    """
+    image = synthetic_texture(size, seed=1)
+    encoded = cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    preferences = json.dumps(dict(UPLOAD_PREFERENCES, target_export_resolution=f"{size}x{size}"))
+
+    def upload():
+        response = client.post('/upload', data={"preferences": preferences, "file": (io.BytesIO(encoded), "texture.jpg")},
+                               content_type='multipart/form-data')
+        if response.status_code != 200 or response.get_json()["errors"]:
+            raise RuntimeError(f"/upload failed at {size}x{size}: {response.get_data(as_text=True)}")
+
+    return upload
+
+
+def create_test_client(working_folder: str):
+    """
+    Import the Flask app inside a scratch folder and return its test client.
+    Files are processed in the request thread so the traced memory covers the whole pipeline,
+    and the result cache is off so every upload is really processed.
+    """
+    os.environ['MAPMORPH_WORKERS'] = '1'
+    os.environ['MAPMORPH_CACHE_BYTES'] = '0'
+    os.chdir(working_folder)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    return app.test_client()
+
+
+def run(sizes: list,
+        repeat: int,
+        stages: list = None) -> dict:
+    """
+    Run every benchmark at every size.
+
+    Returns:
+        dict: "stage@size" mapped to the measurement, with the stage, size and throughput added.
+    """
+    results = {}
+    original_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as working_folder:
+        client = create_test_client(working_folder)
+
+        for size in sizes:
+            benchmarks = stage_benchmarks(size, working_folder)
+            benchmarks["upload"] = upload_benchmark(client, size)
+
+            for stage, function in benchmarks.items():
+                if stages and stage not in stages:
+                    continue
+                # The pipeline logs every step, keep the report readable
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    measurement = measure(function, repeat)
+                megapixels = size * size / 1e6
+                measurement.update(stage=stage, size=size,
+                                   megapixels_per_s=round(megapixels / (measurement["median_ms"] / 1000), 2))
+                results[f"{stage}@{size}"] = measurement
+                print(f"{stage:>28} {size:>5}px  {measurement['median_ms']:>10.2f} ms  "
+                      f"{measurement['megapixels_per_s']:>8.2f} MP/s  {measurement['peak_mib']:>8.2f} MiB")
+
+        os.chdir(original_folder)
+
+    return results
+
+
+def environment() -> dict:
+    """
+    Describe the machine and library versions, timings are only comparable on the same setup.
+    """
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(results: dict,
+            baseline: dict,
+            time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+            memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE) -> list:
+    """
+    Compare results against a baseline.
+
+    Parameters:
+        results (dict): Results of run().
+        baseline (dict): Results of an earlier run, as saved in baseline.json.
+        time_tolerance (float): Allowed relative slowdown of the median time.
+        memory_tolerance (float): Allowed relative growth of the peak memory.
+
+    Returns:
+        list: One message per regression, empty when everything is within tolerance.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            print(f"{key}: not in the baseline, skipped")
+            continue
+
+        time_ratio = current["median_ms"] / max(previous["median_ms"], 1e-6)
+        if time_ratio > 1 + time_tolerance:
+            regressions.append(f"{key}: {current['median_ms']:.2f} ms, baseline {previous['median_ms']:.2f} ms "
+                               f"({time_ratio:.2f}x)")
+
+        memory_limit = previous["peak_mib"] * (1 + memory_tolerance) + MEMORY_SLACK_MIB
+        if current["peak_mib"] > memory_limit:
+            regressions.append(f"{key}: peak {current['peak_mib']:.2f} MiB, baseline {previous['peak_mib']:.2f} MiB")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ImageProcessor stages and the /upload pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Square texture sizes.")
+    parser.add_argument('--stages', nargs='+', help="Only run these stages, e.g. greyscale_adjust upload.")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed runs per stage.")
+    parser.add_argument('--output', default=RESULTS_PATH, help="Where to save the results JSON.")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON to compare against.")
+    parser.add_argument('--update-baseline', action='store_true', help="Save the results as the new baseline.")
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    arguments = parser.parse_args()
+
+    output_path = os.path.abspath(arguments.output)
+    baseline_path = os.path.abspath(arguments.baseline)
+
+    results = run(arguments.sizes, arguments.repeat, arguments.stages)
+    report = {"environment": environment(), "repeat": arguments.repeat, "results": results}
+
+    with open(output_path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print("Results saved to", output_path)
+
+    if arguments.update_baseline:
+        with open(baseline_path, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+        print("Baseline updated", baseline_path)
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print("No baseline found, run with --update-baseline to record one.")
+        return 0
+
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    if baseline.get("environment") != report["environment"]:
+        print("Warning: the baseline was recorded on a different machine or library versions, timings may not compare.")
+
+    regressions = compare(results, baseline["results"], arguments.time_tolerance, arguments.memory_tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} REGRESSION(S) against {baseline_path}:")
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+
+    print("No regressions against", baseline_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# Keeps the backend folder on sys.path so tests can import `app` and `src.*` the same way app.py does.
@@ -0,0 +1,17 @@
+# Gunicorn settings for running MapMorph with several web workers:
+#     gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get('MAPMORPH_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('MAPMORPH_WEB_WORKERS', 2))
+timeout = int(os.environ.get('MAPMORPH_REQUEST_TIMEOUT', 300))
+
+# Import the app once in the master process instead of once per worker
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked: load OpenCV, NumPy, the processing modules and the presets
+    # here so the workers share them copy-on-write and their first upload does not pay for the imports
+    from app import preload
+    preload()
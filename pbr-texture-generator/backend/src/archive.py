@@ -0,0 +1,82 @@
+import io
+import os
+import time
+import zipfile
+
+
+# Formats that are already compressed, deflating them again costs CPU for next to no size gain
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Size of the pieces each file is read and emitted in
+CHUNK_SIZE = 1024 * 1024
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable buffer that zipfile writes into and stream_zip drains after every write.
+    Because it cannot seek, zipfile writes data descriptors after each entry instead of patching local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(file_paths: list):
+    """
+    Build a ZIP archive of the given files on the fly, without writing the archive to disk.
+    Already compressed images are stored as they are, everything else is deflated.
+
+    Parameters:
+        file_paths (list): Paths of the files to add, each one is stored under its base name.
+
+    Yields:
+        bytes: The next piece of the archive, as soon as it is available.
+    """
+    buffer = _StreamBuffer()
+
+    with zipfile.ZipFile(buffer, mode='w') as zipf:
+        for file_path in file_paths:
+            arcname = os.path.basename(file_path)
+            stat = os.stat(file_path)
+
+            zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+            zinfo.file_size = stat.st_size
+            if arcname.lower().endswith(STORED_EXTENSIONS):
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(file_path, 'rb') as source, zipf.open(zinfo, mode='w') as entry:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            # Local header of empty files and the data descriptor of the finished entry
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # Central directory, written when the ZipFile closes
+    yield buffer.drain()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# fcntl is POSIX only, without it the cache is only safe for the threads of a single process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Temporary entries older than this are left over from a crashed put, younger ones may still be written by another worker
+STALE_TEMPORARY_SECONDS = 3600
+
+
+class ResultCache:
+    """
+    ResultCache keeps previously generated maps on disk, keyed by a hash of the input image
+    bytes plus the normalized preferences that produced them.
+    Entries are evicted least recently used first once the cache grows past its disk budget.
+    The cache folder is the source of truth and may be shared by every web worker process: lookups read it
+    directly, recency is the modification time of each entry's meta.json, and puts account for the size of the
+    whole folder and evict under a lock file, so the budget holds across all workers together.
+
+    Methods:
+        make_key(upload, normalized_preferences: dict) -> str:
+            Build the cache key for an upload and its preferences.
+
+        get(key: str) -> list:
+            Return the cached maps for a key, or None on a miss.
+
+        put(key: str, maps: list) -> None:
+            Store generated maps under a key.
+
+        stats() -> dict:
+            Return hit/miss counters and the cache size as of the last scan of the folder.
+    """
+
+    def __init__(self,
+                 cache_directory: str,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Parameters:
+            cache_directory (str): Folder the cached maps are stored in.
+            max_bytes (int): Disk budget of the cache, shared by every process using the folder.
+                Least recently used entries are evicted beyond it.
+        """
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = 0
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_directory, exist_ok=True)
+        with self._folder_lock():
+            self._scan_and_evict()
+
+    @staticmethod
+    def make_key(upload,
+                 normalized_preferences: dict) -> str:
+        """
+        Build the cache key for an upload and the preferences it is processed with.
+
+        Parameters:
+            upload (str or bytes): Path to the uploaded image, or its contents.
+            normalized_preferences (dict): Preferences that affect the generated maps, with defaults filled in.
+
+        Returns:
+            str: Hex digest identifying the generated maps.
+        """
+        digest = hashlib.sha256()
+
+        if isinstance(upload, str):
+            with open(upload, 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        else:
+            digest.update(upload)
+
+        digest.update(json.dumps(normalized_preferences, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> list:
+        """
+        Return the cached maps for a key and mark the entry as recently used.
+        Entries stored by any process sharing the cache folder are found.
+
+        Parameters:
+            key (str): Key from make_key.
+
+        Returns:
+            list: [{"map_type": ..., "path": ...}] of the cached files, or None on a miss.
+                  Maps stored with a preview also carry its "preview_path".
+        """
+        entry_path = os.path.join(self.cache_directory, key)
+        try:
+            with open(os.path.join(entry_path, 'meta.json')) as file:
+                maps = json.load(file)["maps"]
+            # Refresh the access time, the LRU order every process evicts by
+            self._touch(os.path.join(entry_path, 'meta.json'))
+        except (OSError, ValueError, KeyError):
+            # Never stored, evicted, or damaged
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+
+        restored = []
+        for cached in maps:
+            entry = {"map_type": cached["map_type"], "path": os.path.join(entry_path, cached["filename"])}
+            if cached.get("preview"):
+                entry["preview_path"] = os.path.join(entry_path, cached["preview"])
+            restored.append(entry)
+        return restored
+
+    def put(self,
+            key: str,
+            maps: list) -> None:
+        """
+        Store generated maps under a key, evicting old entries if the disk budget is exceeded.
+        If another process stored the same key first, its entry is kept.
+
+        Parameters:
+            key (str): Key from make_key.
+            maps (list): [{"map_type": ..., "path": ...}] of the generated files to copy into the cache,
+                optionally with the "preview_path" of each map's preview.
+        """
+        if self.max_bytes <= 0 or not maps:
+            return
+
+        entry_path = os.path.join(self.cache_directory, key)
+        if os.path.exists(os.path.join(entry_path, 'meta.json')):
+            return
+
+        # Build the entry in a temporary folder and move it into place in one step
+        temporary_path = os.path.join(self.cache_directory, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(temporary_path)
+        try:
+            meta = []
+            for cached in maps:
+                filename = cached["map_type"] + os.path.splitext(cached["path"])[1]
+                shutil.copyfile(cached["path"], os.path.join(temporary_path, filename))
+                entry = {"map_type": cached["map_type"], "filename": filename}
+
+                if cached.get("preview_path"):
+                    entry["preview"] = cached["map_type"] + '.preview' + os.path.splitext(cached["preview_path"])[1]
+                    shutil.copyfile(cached["preview_path"], os.path.join(temporary_path, entry["preview"]))
+                meta.append(entry)
+
+            with open(os.path.join(temporary_path, 'meta.json'), 'w') as file:
+                json.dump({"maps": meta}, file)
+            self._touch(os.path.join(temporary_path, 'meta.json'))
+        except OSError as e:
+            # The disk is full or the source maps are gone. The cache is best effort
+            print(f'Failed to cache result {key}. Reason: {e}')
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            return
+
+        with self._folder_lock():
+            try:
+                os.replace(temporary_path, entry_path)
+            except OSError:
+                # Another process stored the same key first, the maps are identical so its entry serves as well
+                shutil.rmtree(temporary_path, ignore_errors=True)
+                if not os.path.exists(os.path.join(entry_path, 'meta.json')):
+                    print(f'Failed to cache result {key}.')
+            self._scan_and_evict()
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters of this process, and the entries and bytes of the whole cache folder
+        as of its last scan, which every put and the start of the cache run.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        """
+        Set the modification time of a file to now at full precision. Implicit file times come from a coarse clock
+        and would tie for entries used within the same few milliseconds.
+        """
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    @contextmanager
+    def _folder_lock(self):
+        """
+        Hold the cache folder's lock file, shared with the other processes using the folder.
+        The threads of this process take turns first, flock locks belong to the open file, not the thread.
+        """
+        with self._lock:
+            with open(os.path.join(self.cache_directory, '.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan_and_evict(self) -> None:
+        """
+        Measure every entry in the cache folder and remove least recently used entries until the folder fits its
+        disk budget. Temporary entries abandoned by a crashed put are removed too. Called with the folder lock held.
+        """
+        now = time.time()
+        entries = []
+        for key in os.listdir(self.cache_directory):
+            entry_path = os.path.join(self.cache_directory, key)
+            try:
+                if key.startswith('.tmp-'):
+                    if os.path.getmtime(entry_path) < now - STALE_TEMPORARY_SECONDS:
+                        shutil.rmtree(entry_path, ignore_errors=True)
+                    continue
+                meta_path = os.path.join(entry_path, 'meta.json')
+                if not os.path.exists(meta_path):
+                    continue
+                size = sum(os.path.getsize(os.path.join(entry_path, filename))
+                           for filename in os.listdir(entry_path) if filename != 'meta.json')
+                entries.append((os.stat(meta_path).st_mtime_ns, key, size))
+            except OSError:
+                # Removed while scanning
+                continue
+
+        entries.sort()
+        total_bytes = sum(size for _, _, size in entries)
+        while total_bytes > self.max_bytes and entries:
+            _, key, size = entries.pop(0)
+            shutil.rmtree(os.path.join(self.cache_directory, key), ignore_errors=True)
+            total_bytes -= size
+
+        self._entries = len(entries)
+        self._total_bytes = total_bytes
@@ -0,0 +1,309 @@
+import io
+import struct
+import tempfile
+
+import cv2
+import numpy as np
+
+
+# Block compressed formats and the legacy FourCC each one is stored with. Every reader that knows DDS knows these
+DDS_FOURCC = {
+    "BC1": b'DXT1',
+    "BC3": b'DXT5',
+    "BC4": b'ATI1',
+    "BC5": b'ATI2',
+}
+
+# Bytes per 4x4 block
+BLOCK_BYTES = {"BC1": 8, "BC3": 16, "BC4": 8, "BC5": 16}
+
+# Block rows compressed at once, bounds the temporary arrays to a strip of the image
+BLOCK_ROWS_PER_CHUNK = 64
+
+# DDS header flags
+DDSD_CAPS, DDSD_HEIGHT, DDSD_WIDTH, DDSD_PIXELFORMAT = 0x1, 0x2, 0x4, 0x1000
+DDSD_MIPMAPCOUNT, DDSD_LINEARSIZE = 0x20000, 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_COMPLEX, DDSCAPS_TEXTURE, DDSCAPS_MIPMAP = 0x8, 0x1000, 0x400000
+
+
+def default_compression(image: np.ndarray) -> str:
+    """
+    Pick the block compression for an image from its channel count: BC4 for scalar maps,
+    BC1 for colour and BC3 when there is an alpha channel. Normal maps should ask for BC5 explicitly.
+    """
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    return {1: "BC4", 3: "BC1", 4: "BC3"}.get(channels, "BC4")
+
+
+def _to_blocks(image: np.ndarray) -> np.ndarray:
+    """
+    Split an H x W x C image into 4x4 blocks, repeating the edge pixels when a side is not a multiple of 4.
+
+    Returns:
+        np.ndarray: 16 x C x (block rows * block columns) array. Pixel-major, so every per-block
+        operation works on long contiguous rows of blocks.
+    """
+    height, width, channels = image.shape
+    pad_y, pad_x = -height % 4, -width % 4
+    if pad_y or pad_x:
+        image = np.pad(image, ((0, pad_y), (0, pad_x), (0, 0)), mode='edge')
+
+    block_rows, block_columns = image.shape[0] // 4, image.shape[1] // 4
+    blocks = image.reshape(block_rows, 4, block_columns, 4, channels).transpose(1, 3, 4, 0, 2)
+    return np.ascontiguousarray(blocks).reshape(16, channels, block_rows * block_columns)
+
+
+def _pack_indices(indices: np.ndarray,
+                  bits: int) -> np.ndarray:
+    """
+    Pack 16 x N block indices of the given bit width into little-endian bytes, first pixel in the lowest bits.
+
+    Returns:
+        np.ndarray: N x (2 * bits) uint8 array.
+    """
+    indices = indices.astype(np.uint32)
+    # 3 bit indices go in two 24 bit groups, 2 bit indices in one 32 bit group, so each group fits a uint32
+    group_size = 8 if bits == 3 else 16
+    group_bytes = group_size * bits // 8
+
+    groups = []
+    for start in range(0, 16, group_size):
+        packed = np.zeros(indices.shape[1], dtype=np.uint32)
+        for offset in range(group_size):
+            packed |= indices[start + offset] << (offset * bits)
+        groups.append(packed.astype('<u4').view(np.uint8).reshape(-1, 4)[:, :group_bytes])
+    return np.concatenate(groups, axis=1)
+
+
+def compress_bc4_blocks(values: np.ndarray) -> np.ndarray:
+    """
+    Compress single-channel 4x4 blocks to BC4, the same layout BC3 and BC5 use for their scalar channels.
+    Every block uses the 8 value mode between its own minimum and maximum.
+
+    Parameters:
+        values (np.ndarray): 16 x N uint8 block values.
+
+    Returns:
+        np.ndarray: N x 8 uint8 compressed blocks.
+    """
+    high = values.max(axis=0)
+    low = values.min(axis=0)
+    scale = (7 / np.maximum(high.astype(np.int32) - low, 1)).astype(np.float32)
+
+    # Position of every value on the 8 step ramp from high (0) to low (7)
+    steps = np.rint((high - values.astype(np.float32)) * scale).astype(np.int32)
+    # Index 0 and 1 are the endpoints themselves, 2 to 7 the values in between
+    indices = np.where(steps == 0, 0, np.where(steps == 7, 1, steps + 1))
+
+    blocks = np.empty((values.shape[1], 8), dtype=np.uint8)
+    blocks[:, 0] = high
+    blocks[:, 1] = low
+    blocks[:, 2:] = _pack_indices(indices, 3)
+    return blocks
+
+
+def _rgb565(colors: np.ndarray) -> np.ndarray:
+    """
+    Quantize 3 x N RGB colours to packed 5:6:5 values.
+    """
+    colors = colors.astype(np.int32)
+    red = (colors[0] * 31 + 127) // 255
+    green = (colors[1] * 63 + 127) // 255
+    blue = (colors[2] * 31 + 127) // 255
+    return (red << 11) | (green << 5) | blue
+
+
+def _expand_rgb565(packed: np.ndarray) -> np.ndarray:
+    """
+    Expand packed 5:6:5 values back to 3 x N RGB, the colours a GPU decodes.
+    """
+    red, green, blue = (packed >> 11) & 31, (packed >> 5) & 63, packed & 31
+    return np.stack([(red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)])
+
+
+def compress_bc1_blocks(colors: np.ndarray) -> np.ndarray:
+    """
+    Compress RGB 4x4 blocks to BC1 in four colour mode.
+    The endpoints span the bounding box of the block. The diagonal is picked from the sign of each channel's
+    covariance with the channel that varies most, so anti-correlated channels still get a usable colour line.
+
+    Parameters:
+        colors (np.ndarray): 16 x 3 x N uint8 RGB block colours.
+
+    Returns:
+        np.ndarray: N x 8 uint8 compressed blocks.
+    """
+    low, high = colors.min(axis=0), colors.max(axis=0)
+
+    # Sign of the covariance in integers: 16 * sum(c * p) - sum(c) * sum(p), with p the principal channel
+    pixels = colors.astype(np.int32)
+    sums = pixels.sum(axis=0)
+    principal_channel = np.argmax(high.astype(np.int32) - low, axis=0)
+    principal = np.take_along_axis(pixels, principal_channel[None, None], axis=1)
+    covariance = 16 * (pixels * principal).sum(axis=0) - sums * np.take_along_axis(sums, principal_channel[None], axis=0)
+    flip = covariance < 0
+    color0, color1 = _rgb565(np.where(flip, low, high)), _rgb565(np.where(flip, high, low))
+
+    # Four colour mode needs color0 > color1
+    swap = color0 < color1
+    color0, color1 = np.where(swap, color1, color0), np.where(swap, color0, color1)
+
+    endpoint0, endpoint1 = _expand_rgb565(color0), _expand_rgb565(color1)
+    axis = endpoint0 - endpoint1
+    scale = (3 / np.maximum((axis * axis).sum(axis=0), 1)).astype(np.float32)
+    position = ((pixels - endpoint1) * axis).sum(axis=1)
+    steps = np.clip(np.rint(position * scale), 0, 3).astype(np.intp)
+
+    # Ramp step 3 is color0 (index 0), 0 is color1 (index 1), 2 and 1 are the blends (index 2 and 3)
+    indices = np.array([1, 3, 2, 0], dtype=np.uint32)[steps]
+    indices[:, color0 == color1] = 0
+
+    blocks = np.empty((colors.shape[2], 8), dtype=np.uint8)
+    blocks[:, 0:2] = color0.astype('<u2').view(np.uint8).reshape(-1, 2)
+    blocks[:, 2:4] = color1.astype('<u2').view(np.uint8).reshape(-1, 2)
+    blocks[:, 4:8] = _pack_indices(indices, 2)
+    return blocks
+
+
+def _select_channels(image: np.ndarray,
+                     compression: str) -> np.ndarray:
+    """
+    Pick the channels a format stores from an OpenCV ordered image, in the order the format stores them.
+    """
+    if image.ndim == 2:
+        image = image[..., None]
+    channels = image.shape[2]
+
+    if compression == "BC4":
+        return image[..., :1]
+    if compression == "BC5":
+        # Normal X and Y live in red and green, which OpenCV keeps at index 2 and 1
+        return image[..., [2, 1]] if channels >= 3 else np.repeat(image, 2, axis=2)
+
+    rgb = image[..., [2, 1, 0]] if channels >= 3 else np.repeat(image[..., :1], 3, axis=2)
+    if compression == "BC1":
+        return rgb
+    alpha = image[..., 3:4] if channels == 4 else np.full(image.shape[:2] + (1,), 255, dtype=np.uint8)
+    return np.concatenate([rgb, alpha], axis=2)
+
+
+def compress_strip(image: np.ndarray,
+                   compression: str) -> np.ndarray:
+    """
+    Block compress a strip of an image, a multiple of 4 rows high unless it is the last strip.
+
+    Parameters:
+        image (np.ndarray): uint8 image in OpenCV channel order (BGR or BGRA), or a single-channel map.
+        compression (str): "BC1", "BC3", "BC4" or "BC5".
+
+    Returns:
+        np.ndarray: N x block bytes array of the compressed blocks, row by row.
+    """
+    blocks = _to_blocks(_select_channels(image, compression))
+
+    if compression == "BC4":
+        return compress_bc4_blocks(blocks[:, 0])
+    if compression == "BC5":
+        return np.concatenate([compress_bc4_blocks(blocks[:, 0]), compress_bc4_blocks(blocks[:, 1])], axis=1)
+    if compression == "BC1":
+        return compress_bc1_blocks(blocks)
+    # BC3 is a BC4 style alpha block followed by a BC1 colour block
+    return np.concatenate([compress_bc4_blocks(blocks[:, 3]), compress_bc1_blocks(blocks[:, :3])], axis=1)
+
+
+def dds_header(width: int,
+               height: int,
+               mip_count: int,
+               compression: str) -> bytes:
+    """
+    Build the magic number and 124 byte header of a block compressed DDS file.
+    """
+    top_level_size = max((width + 3) // 4, 1) * max((height + 3) // 4, 1) * BLOCK_BYTES[compression]
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_MIPMAPCOUNT | DDSD_LINEARSIZE
+    caps = DDSCAPS_TEXTURE | (DDSCAPS_COMPLEX | DDSCAPS_MIPMAP if mip_count > 1 else 0)
+
+    pixel_format = struct.pack('<II4sIIIII', 32, DDPF_FOURCC, DDS_FOURCC[compression], 0, 0, 0, 0, 0)
+    header = struct.pack('<IIIIIII', 124, flags, height, width, top_level_size, 0, mip_count)
+    header += b'\0' * 44 + pixel_format + struct.pack('<IIIII', caps, 0, 0, 0, 0)
+    return b'DDS ' + header
+
+
+def _level_buffer(shape: tuple,
+                  scratch_directory: str = None) -> np.ndarray:
+    """
+    Allocate a mip level, in memory or memory mapped from an anonymous temporary file in scratch_directory.
+    """
+    if scratch_directory is None:
+        return np.empty(shape, dtype=np.uint8)
+    # The mapping keeps the unlinked file alive after it is closed
+    with tempfile.TemporaryFile(dir=scratch_directory) as scratch:
+        return np.memmap(scratch, dtype=np.uint8, mode='w+', shape=shape)
+
+
+def write_dds(file,
+              image: np.ndarray,
+              compression: str = None,
+              mipmaps: bool = True,
+              scratch_directory: str = None) -> None:
+    """
+    Encode an image as a block compressed DDS file straight into an open file, a strip of block rows at a time.
+    Every mip level is halved with an area filter from the strips of the level above while they are compressed,
+    so besides one strip only the next level is held. Levels with an odd number of rows blend their last row
+    within the last strip only.
+
+    Parameters:
+        file (file-like): Binary file the DDS is written to.
+        image (np.ndarray): uint8 image in OpenCV channel order, or a single-channel map. May be memory mapped.
+        compression (str): "BC1", "BC3", "BC4" or "BC5". None picks one from the channel count, see default_compression.
+        mipmaps (bool): Store the full mip chain down to 1x1.
+        scratch_directory (str): Keep the mip levels in temporary files in this folder instead of in memory.
+    """
+    compression = compression or default_compression(image)
+    if compression not in DDS_FOURCC:
+        raise ValueError(f"Unsupported DDS compression {compression}. Choose BC1, BC3, BC4 or BC5.")
+
+    height, width = image.shape[:2]
+    # Halving down to 1x1 takes one level per bit of the longest side
+    mip_count = max(height, width).bit_length() if mipmaps else 1
+    file.write(dds_header(width, height, mip_count, compression))
+
+    level = image
+    for index in range(mip_count):
+        height, width = level.shape[:2]
+        next_level = None
+        if index < mip_count - 1:
+            next_level = _level_buffer((max(height // 2, 1), max(width // 2, 1)) + level.shape[2:], scratch_directory)
+
+        for top in range(0, height, BLOCK_ROWS_PER_CHUNK * 4):
+            bottom = min(top + BLOCK_ROWS_PER_CHUNK * 4, height)
+            strip = np.ascontiguousarray(level[top:bottom])
+            file.write(compress_strip(strip, compression).tobytes())
+
+            if next_level is not None:
+                # Strips hold an even number of rows, so each one halves on its own
+                next_top = top // 2
+                next_bottom = next_level.shape[0] if bottom == height else bottom // 2
+                if next_bottom > next_top:
+                    halved = cv2.resize(strip, (next_level.shape[1], next_bottom - next_top), interpolation=cv2.INTER_AREA)
+                    next_level[next_top:next_bottom] = halved.reshape(next_level[next_top:next_bottom].shape)
+        level = next_level
+
+
+def encode_dds(image: np.ndarray,
+               compression: str = None,
+               mipmaps: bool = True) -> bytes:
+    """
+    Encode an image as a block compressed DDS file, see write_dds.
+
+    Parameters:
+        image (np.ndarray): uint8 image in OpenCV channel order, or a single-channel map.
+        compression (str): "BC1", "BC3", "BC4" or "BC5". None picks one from the channel count, see default_compression.
+        mipmaps (bool): Store the full mip chain down to 1x1.
+
+    Returns:
+        bytes: The DDS file contents.
+    """
+    buffer = io.BytesIO()
+    write_dds(buffer, image, compression, mipmaps)
+    return buffer.getvalue()
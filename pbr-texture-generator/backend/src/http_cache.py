@@ -0,0 +1,261 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+
+from flask import Response, send_from_directory
+
+# Brotli is optional, without it only gzip variants are built
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Cache-Control of responses whose URL changes whenever their content does
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Cache-Control of the outputs of a finished submission, they never change but belong to a single user
+PRIVATE_IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+# Query parameter carrying the content hash in static asset URLs, e.g. /static/styles.css?v=3f2a9c0d1e7b4a65
+STATIC_VERSION_PARAMETER = 'v'
+
+# Formats that are compressed already, gzip or brotli would only cost CPU
+COMPRESSED_EXTENSIONS = {'.gif', '.png', '.jpg', '.jpeg', '.webp', '.avif', '.woff', '.woff2', '.zip', '.gz', '.br',
+                         '.dds', '.mp4'}
+
+# A compressed variant is only kept when it is at most this fraction of the original size
+MAX_COMPRESSED_RATIO = 0.9
+
+# Compression levels, the variants are built once so the slowest and smallest settings are used
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Short hex digest of some content, used for ETags and static asset versions.
+    """
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def file_content_hash(path: str) -> str:
+    """
+    content_hash of a file, read in chunks so large maps are never held in memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def compressed_variants(data: bytes) -> dict:
+    """
+    Compress content with brotli (when installed) and gzip.
+
+    Parameters:
+        data (bytes): Content to compress.
+
+    Returns:
+        dict: Content-Encoding mapped to the compressed bytes, best encoding first.
+              Encodings that do not make the content meaningfully smaller are left out.
+    """
+    variants = {}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the gzip bytes, and with them the ETag, the same across restarts
+    variants["gzip"] = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    return {encoding: compressed for encoding, compressed in variants.items()
+            if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO}
+
+
+def negotiate_encoding(variants: dict,
+                       request) -> str:
+    """
+    Pick the first compressed variant the client accepts.
+
+    Returns:
+        str: A key of variants, or None to send the uncompressed content.
+    """
+    for encoding in variants:
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def set_cache_control(response: Response,
+                      immutable: bool) -> None:
+    """
+    Cache for a year without revalidating when the URL changes with the content, otherwise revalidate every time.
+    """
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.public = True
+
+
+def cached_response(request,
+                    content: bytes,
+                    etag: str,
+                    mimetype: str,
+                    last_modified: float,
+                    encoding: str = None,
+                    negotiated: bool = False,
+                    immutable: bool = False) -> Response:
+    """
+    Build a response for content held in memory, answered with 304 when the client's copy is still current.
+
+    Parameters:
+        request: The current request.
+        content (bytes): Content to send, compressed with encoding if one is given.
+        etag (str): Strong ETag of the uncompressed content, a compressed variant gets its own ETag derived from it.
+        mimetype (str): Mimetype of the uncompressed content.
+        last_modified (float): Timestamp sent as Last-Modified.
+        encoding (str): Content-Encoding of the content, None if it is not compressed.
+        negotiated (bool): The encoding was picked from Accept-Encoding, caches must vary on it.
+        immutable (bool): See set_cache_control.
+
+    Returns:
+        Response: The response, made conditional on the request's validators.
+    """
+    response = Response(content, mimetype=mimetype)
+    if encoding:
+        response.content_encoding = encoding
+        response.set_etag(f'{etag}-{encoding}')
+    else:
+        response.set_etag(etag)
+    if negotiated:
+        response.vary.add('Accept-Encoding')
+    response.last_modified = last_modified
+    set_cache_control(response, immutable)
+
+    return response.make_conditional(request)
+
+
+class PageCache:
+    """
+    PageCache keeps the rendered HTML of pages that look the same for every visitor, together with their
+    compressed variants, so each page is rendered once per process and repeat visits are answered with 304.
+
+    Methods:
+        response(request, key: str, render) -> Response:
+            Return the cached page for a key, rendering it with render() on first use.
+    """
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def response(self,
+                 request,
+                 key: str,
+                 render) -> Response:
+        """
+        Parameters:
+            request: The current request.
+            key (str): Identifies the page, e.g. its template name.
+            render (callable): Returns the page as a string, only called when the page is not cached yet.
+
+        Returns:
+            Response: The page with ETag, Last-Modified and Cache-Control: no-cache, or a 304.
+        """
+        page = self._pages.get(key)
+        if page is None:
+            body = render().encode()
+            page = {"body": body, "etag": content_hash(body), "variants": compressed_variants(body),
+                    "last_modified": time.time()}
+            with self._lock:
+                page = self._pages.setdefault(key, page)
+
+        encoding = negotiate_encoding(page["variants"], request)
+        content = page["variants"][encoding] if encoding else page["body"]
+        return cached_response(request, content, page["etag"], 'text/html', page["last_modified"], encoding,
+                               negotiated=bool(page["variants"]))
+
+
+class StaticAssets:
+    """
+    StaticAssets hashes every file of the static folder once and builds compressed variants of the
+    compressible ones, so asset URLs can carry their content hash and be cached by browsers forever.
+    Compressed variants are kept in memory, uncompressed files are still streamed from disk.
+
+    Methods:
+        version(filename: str) -> str:
+            Return the content hash of a static file, for its URL.
+
+        response(request, filename: str) -> Response:
+            Serve a static file, compressed and immutable where possible.
+    """
+
+    def __init__(self, static_folder: str):
+        """
+        Parameters:
+            static_folder (str): Folder the static files are served from.
+        """
+        self.static_folder = static_folder
+        self._assets = {}
+
+        for folder, _, filenames in os.walk(static_folder):
+            for name in filenames:
+                path = os.path.join(folder, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as file:
+                    data = file.read()
+
+                compressible = os.path.splitext(name)[1].lower() not in COMPRESSED_EXTENSIONS
+                self._assets[filename] = {
+                    "etag": content_hash(data),
+                    "variants": compressed_variants(data) if compressible else {},
+                    "mimetype": mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                    "last_modified": os.path.getmtime(path),
+                }
+
+        print(f"Static assets hashed: {len(self._assets)} files, "
+              f"{sum(1 for asset in self._assets.values() if asset['variants'])} with compressed variants.")
+
+    def version(self, filename: str) -> str:
+        """
+        Return the content hash of a static file, or None for files that were not there at startup.
+        """
+        asset = self._assets.get(filename)
+        return asset["etag"] if asset else None
+
+    def response(self,
+                 request,
+                 filename: str) -> Response:
+        """
+        Serve a static file. Requests whose version parameter matches the file's content hash are cached for a year,
+        anything else is revalidated with the ETag, so an outdated URL never pins old content.
+
+        Parameters:
+            request: The current request.
+            filename (str): Path of the file inside the static folder.
+
+        Returns:
+            Response: The file, compressed if the client accepts it, or a 304.
+        """
+        asset = self._assets.get(filename)
+        if asset is None:
+            # Added after startup or missing, let Flask serve it or answer 404
+            return send_from_directory(self.static_folder, filename)
+
+        immutable = request.args.get(STATIC_VERSION_PARAMETER) == asset["etag"]
+
+        encoding = negotiate_encoding(asset["variants"], request)
+        if encoding:
+            return cached_response(request, asset["variants"][encoding], asset["etag"], asset["mimetype"],
+                                   asset["last_modified"], encoding, negotiated=True, immutable=immutable)
+
+        # Uncompressed files are streamed from disk, send_from_directory handles Range requests as well
+        response = send_from_directory(self.static_folder, filename, etag=asset["etag"],
+                                       last_modified=asset["last_modified"])
+        if asset["variants"]:
+            response.vary.add('Accept-Encoding')
+        set_cache_control(response, immutable)
+        return response
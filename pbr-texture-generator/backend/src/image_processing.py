@@ -1,24 +1,65 @@
 import cv2
 import os
+import time
 import numpy as np
-from PIL import Image
-import csv
-import io
 from werkzeug.datastructures import FileStorage
 
+from src.dds import encode_dds
+from src.maps import ConstantMap
+from src.presets import PresetRegistry, get_preset_registry
+
+
+# Encoder settings used for the generated maps, a deployment can override any of them
+ENCODER_DEFAULTS = {
+    "png_compression": 3,       # zlib level 0-9, higher is smaller and slower
+    "png_strategy": "default",  # see PNG_STRATEGIES
+    "jpeg_quality": 95,
+    "jpeg_progressive": False,
+    "webp_quality": 90,         # only used when webp_lossless is off
+    "webp_lossless": True,
+    "dds_compression": None,    # BC1, BC3, BC4 or BC5, None picks one from the channel count
+    "dds_mipmaps": True,        # store the full mip chain in DDS files
+    "preview_format": "webp",   # webp or jpg, previews shown on the processing page instead of the full maps
+    "preview_quality": 80,      # lossy quality of the previews
+    "preview_size": 256,        # longest side of the previews in pixels
+}
+
+# Channel packed outputs, the channel each map is stored in, in RGB(A) order.
+# ORM is the Unreal Engine and glTF layout, MaskMap is Unity's HDRP mask map.
+CHANNEL_PACKING_LAYOUTS = {
+    "ORM": ("Occlusion", "Roughness", "Metallic"),
+    "ORMH": ("Occlusion", "Roughness", "Metallic", "Height"),
+    "MaskMap": ("Metallic", "Occlusion", "DetailMask", "Smoothness"),
+}
+PACKED_MAP_TYPES = tuple(CHANNEL_PACKING_LAYOUTS)
+
+PNG_STRATEGIES = {
+    "default": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+    "filtered": cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+    "huffman_only": cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+    "rle": cv2.IMWRITE_PNG_STRATEGY_RLE,
+    "fixed": cv2.IMWRITE_PNG_STRATEGY_FIXED,
+}
+
 
 class ImageProcessor:
     """
     ImageProcessor class provides various static methods for image processing tasks.
 
     Methods:
-        pre_process_check(filepath: str) -> None:
-            Perform pre-processing checks on the given image file.
+        pre_process_check(source, filename: str = None) -> np.ndarray:
+            Perform pre-processing checks on an image path, bytes or stream and return the decoded image.
+
+        decode_image(encoded_image: bytes) -> np.ndarray:
+            Decode an encoded image buffer once and validate the result.
         
-        load_presets(presets_directory: str) -> dict:
-            Load all preset CSV files from the specified directory.
+        load_presets(presets_directory: str = None) -> dict:
+            Load the material presets through the shared preset registry.
         
-        greyscale_adjust(img: np.ndarray, intensity_factor: float = 1.0, grey_factor: float = 0.5) -> np.ndarray:
+        build_point_lut(minimum: int, maximum: int, intensity_factor: float = 1.0, grey_factor: float = 0.5, roughness: int = None) -> np.ndarray:
+            Compose the greyscale point operations into one 256 entry lookup table.
+
+        greyscale_adjust(img: np.ndarray, intensity_factor: float = 1.0, grey_factor: float = 0.5, roughness: int = None) -> np.ndarray:
             Process an image by normalizing it to grayscale and adjusting its intensity towards 50% greyscale.
         
         standardize_pbr(image: np.ndarray, material_preset=None) -> np.ndarray:
@@ -27,11 +68,32 @@ class ImageProcessor:
         apply_roughness_to_image(image: np.ndarray, roughness: int = 50) -> np.ndarray:
             Apply roughness to the image by adjusting the intensity.
         
-        resize_and_crop(image_path: str, target_size=(512, 512)) -> np.ndarray:
+        resize_and_crop(image: np.ndarray, target_size=(512, 512)) -> np.ndarray:
             Resize and crop the image to the target size and return as a numpy array.
+
+        crop_box(width: int, height: int, target_size: tuple) -> tuple:
+            Return the part of an image resize_and_crop keeps for a target size.
+
+        make_proxy(image: np.ndarray, target_size: tuple, max_side: int = 256) -> np.ndarray:
+            Downscale what resize_and_crop would produce into a small proxy for quick previews.
         
         generate_normal_map(image: np.ndarray, normal_configuration: str) -> np.ndarray:
             Generate a normal map from the input image using the Sobel operator.
+
+        build_height_map(image: np.ndarray, height_levels: int = 0) -> np.ndarray:
+            Derive a height map from the luminance, optionally blended with a blurred pyramid.
+
+        generate_tangent_normal_map(image: np.ndarray, strength: float = 2.0, height_levels: int = 0, flip_green: bool = False) -> np.ndarray:
+            Generate a tangent space normal map with unit length normals in bounded memory.
+
+        greyscale_adjust_batch(images: np.ndarray, intensity_factor: float = 1.0, grey_factor: float = 0.5) -> np.ndarray:
+            Batched greyscale_adjust for an N x H x W x 3 stack of same-sized images.
+
+        apply_roughness_to_batch(images: np.ndarray, roughness: int = 50) -> np.ndarray:
+            Batched apply_roughness_to_image for a stack of same-sized images.
+
+        generate_normal_map_batch(images: np.ndarray, normal_configuration: str) -> np.ndarray:
+            Batched generate_normal_map for an N x H x W x 3 stack of same-sized images.
         
         apply_segmentation(image: np.ndarray) -> np.ndarray:
             Apply AI segmentation to detect multiple materials.
@@ -54,116 +116,190 @@ class ImageProcessor:
         make_tiling(img: np.ndarray) -> np.ndarray:
             Make texture tiling for game engines using image processing.
         
+        make_tiling_seams(img: np.ndarray, band_width: int = 32, keep_uint8: bool = True) -> np.ndarray:
+            Make a texture tileable by blending only a band around the seams.
+
+        blend_seam_band(swapped: np.ndarray, original: np.ndarray, row_weights: np.ndarray, column_weights: np.ndarray, keep_uint8: bool = True) -> np.ndarray:
+            Cross-fade a quadrant swapped image towards the original inside the seam bands.
+
         force_square(img: np.ndarray) -> np.ndarray:
             Force resolution to square by cropping the image to the smallest dimension.
         
-        generate_metallic(input_image: np.ndarray, is_metallic: int = 0) -> np.ndarray:
+        generate_metallic(input_image: np.ndarray, is_metallic: int = 0) -> ConstantMap:
             Generate a basic metallic map for the image.
         
-        convert_image(input_image: np.ndarray, target_format: str = "Don't Convert") -> np.ndarray:
-            Convert an image to a different format and return the image in the target format.
+        pack_channels(channels: list) -> np.ndarray:
+            Pack single-channel maps into the channels of one texture.
+
+        encoder_parameters(extension: str, encoder_settings: dict = None) -> list:
+            Translate encoder settings into OpenCV parameters for a file format.
+
+        encode_image(image: np.ndarray, extension: str, encoder_settings: dict = None) -> bytes:
+            Encode an image to a file format exactly once.
+
+        make_preview(image: np.ndarray, max_side: int = 256) -> np.ndarray:
+            Downscale a map for its preview, keeping the aspect ratio.
+
+        save_preview_image(preview_folder: str, processed_filename: str, image: np.ndarray, encoder_settings: dict = None) -> str:
+            Save a small lossy preview of a map and return its filename.
     """
     
     @staticmethod
-    def pre_process_check(filepath: str) -> None:
+    def pre_process_check(source,
+                          filename: str = None) -> np.ndarray:
         """
-        Perform pre-processing checks on the given image file.
+        Perform pre-processing checks on the given image and return the decoded image.
+        The image is read and decoded exactly once, every later stage works on the returned array.
         This function checks the following:
         1. File extension: Ensures the file has a valid image extension (.png, .jpg, .jpeg, .bmp).
-        2. File size: Ensures the file is not empty and does not exceed 10 MB.
-        3. Image dimensions: Ensures the image dimensions are at least 256x256 pixels.
-        4. Image readability: Ensures the image can be read successfully.
+        2. File size: Ensures the file is not empty and does not exceed 15 MB.
+        3. Image readability: Ensures the image can be decoded successfully.
+        4. Image channels and dimensions: Ensures the image has 3 channels and is at least 256x256 pixels.
         Parameters:
-        filepath (str): The path to the image file to be checked.
+        source (str, bytes or stream): Path to the image file, the encoded image bytes, or a readable stream
+            such as the FileStorage of an upload.
+        filename (str): Name used for the extension check. Required when source is not a path.
+        Returns:
+        np.ndarray: The decoded image in RGB channel order.
         Raises:
         ValueError: If any of the checks fail, a ValueError is raised with an appropriate error message.
         """
+        if isinstance(source, str):
+            filename = filename or source
 
-        image: np.ndarray = cv2.imread(filepath)
-        
         # Check file extension
         valid_extensions = ('.png', '.jpg', '.jpeg', '.bmp')
-        if not filepath.lower().endswith(valid_extensions):
+        if not filename or not filename.lower().endswith(valid_extensions):
             raise ValueError("Invalid file extension. Only .png, .jpg, .jpeg, and .bmp are allowed.")
 
-        # Check if the image has 3 channels (RGB)
-        if image is None:
-            raise ValueError("Failed to read the image. The file may be corrupted or not a valid image.")
-        if image.shape[2] != 3:
-            raise ValueError("Image does not have 3 channels (RGB).")
-        
+        if isinstance(source, str):
+            # Check file size before reading anything into memory
+            file_size = os.path.getsize(source)
+            encoded_image = None
+        else:
+            # Uploads decoded straight from memory never touch the disk
+            encoded_image = source.read() if hasattr(source, 'read') else source
+            file_size = len(encoded_image)
+
         # Check file size
-        file_size = os.path.getsize(filepath)
         if file_size == 0:
             raise ValueError("File size is 0. The file may be corrupted.")
         if file_size > 15 * 1024 * 1024:  # 15 MB limit
             raise ValueError("File size is too large. Maximum allowed size is 15 MB.")
 
-        # Check image dimensions
-        image = cv2.imread(filepath)
+        if encoded_image is None:
+            with open(source, 'rb') as file:
+                encoded_image = file.read()
+
+        image = ImageProcessor.decode_image(encoded_image)
+
+        print("==========pre_process_check passed successfully.==========")
+
+        return image
+
+    @staticmethod
+    def decode_image(encoded_image: bytes) -> np.ndarray:
+        """
+        Decode an encoded image buffer once and validate the result.
+
+        Parameters:
+            encoded_image (bytes): The encoded image file contents, any bytes-like object works.
+
+        Returns:
+            np.ndarray: The decoded 8-bit image in RGB channel order.
+
+        Raises:
+            ValueError: If the image is corrupted, does not have 3 channels or is smaller than 256x256 pixels.
+        """
+        # Decode straight from memory, a corrupted or unsupported file comes back as None.
+        # EXIF orientation is ignored, the pixels are used as stored like the PIL based loader did
+        image = cv2.imdecode(np.frombuffer(encoded_image, dtype=np.uint8),
+                             cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
         if image is None:
             raise ValueError("Failed to read the image. The file may be corrupted or not a valid image.")
+
+        # Check if the image has 3 channels (RGB)
+        if image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError("Image does not have 3 channels (RGB).")
+
+        # Check image dimensions
         height, width = image.shape[:2]
         if height < 256 or width < 256:
             raise ValueError("Image dimensions are too small. Minimum size is 256x256 pixels.")
 
-        try:
-            img = Image.open(filepath)
-            img.verify()  # Verify if the image is corrupted
-        except (IOError, SyntaxError) as e:
-            raise ValueError(f"Image is corrupted: {e}")
-        
-        print("==========pre_process_check passed successfully.==========")
+        # OpenCV decodes to BGR, the rest of the pipeline expects RGB. Swap in place to avoid a second buffer
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
 
-        # Additional checks can be added here
+        return image
 
     @staticmethod
-    def load_presets(presets_directory:str) -> dict:
+    def load_presets(presets_directory: str = None) -> dict:
         """
-        Load all preset CSV files from the specified directory.
+        Load the material presets from the preset CSV files.
+        The shared preset registry is used, so the CSVs are only parsed again when they change.
 
         Parameters:
-            presets_directory (str): Directory containing preset CSV files.
+            presets_directory (str): Directory containing preset CSV files. Defaults to the backend presets/ folder.
 
         Returns:
             presets (dict): A dictionary of materials with their properties.
         """
-        presets = {}
+        if presets_directory is None:
+            return get_preset_registry().materials()
+
+        return PresetRegistry(presets_directory).materials()
+
+    @staticmethod
+    def build_point_lut(minimum: int,
+                        maximum: int,
+                        intensity_factor: float = 1.0,
+                        grey_factor: float = 0.5,
+                        roughness: int = None) -> np.ndarray:
+        """
+        Compose the greyscale point operations into one 256 entry lookup table.
+        The chain normalize -> intensity -> shift towards 50% grey -> roughness only depends on the grey value
+        of each pixel, so it is evaluated once on the 256 possible values with the same OpenCV operations the
+        per-pixel version used. Applying the table with cv2.LUT gives bit-identical results in a single uint8 pass.
+
+        Parameters:
+            minimum (int): Darkest grey value of the image.
+            maximum (int): Brightest grey value of the image.
+            intensity_factor (float): Factor by which the intensity will be adjusted, see greyscale_adjust.
+            grey_factor (float): Factor to control the shift towards 50% greyscale (0 to 1).
+            roughness (int): Optional preset roughness (0 to 100) to fold in, see apply_roughness_to_image.
 
-        # Use the absolute path based on the current working directory
-        absolute_presets_directory = os.path.join(os.path.dirname(__file__), presets_directory)
+        Returns:
+            np.ndarray: 1 x 256 uint8 lookup table for cv2.LUT.
+        """
+        # Clipping the ramp to the image range gives cv2.normalize the same min and max as the image
+        ramp = np.clip(np.arange(256, dtype=np.float32).reshape(1, 256), minimum, maximum)
+        lut = cv2.normalize(ramp, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
 
-        # Loop through all CSV files in the /presets directory
-        for filename in os.listdir(absolute_presets_directory):
-            if filename.endswith('.csv'):
-                with open(os.path.join(absolute_presets_directory, filename), mode='r') as file:
-                    reader = csv.DictReader(file)
-                    for row in reader:
-                        material_name = row["Material"]
-                        base_color = row["BaseColor"]
-                        roughness = int(row["Roughness"])
-                        is_metallic = int(row["IsMetallic"])
+        # Adjust intensity and shift towards 50% greyscale
+        lut = cv2.convertScaleAbs(lut * intensity_factor)
+        lut = cv2.addWeighted(lut, 1 - grey_factor, np.full_like(lut, 128), grey_factor, 0)
 
-                        presets[material_name] = {
-                            "BaseColor": base_color,
-                            "Roughness": roughness,
-                            "IsMetallic": is_metallic
-                        }
-        print("Presets loaded successfully from CSV files.", absolute_presets_directory)
+        # Fold in the PBR roughness so standardizing costs no extra pass over the image
+        if roughness is not None:
+            lut = cv2.convertScaleAbs(lut * (roughness / 100.0))
 
-        return presets
+        return lut
 
     @staticmethod
     def greyscale_adjust(img:np.ndarray,
                          intensity_factor:float = 1.0,
-                         grey_factor:float = 0.5) -> np.ndarray:
+                         grey_factor:float = 0.5,
+                         roughness:int = None) -> np.ndarray:
         """
         Main process function, process an image by converting it to grayscale, normalizing it, and adjusting its intensity towards 50% greyscale.
+        All adjustments after the greyscale conversion are applied as one lookup table, see build_point_lut.
 
         Parameters:
             img (np.ndarray): Input image.
             intensity_factor (float): Factor by which the intensity will be adjusted. 0 means black image, 1 means no change, 2 means double intensity.
             grey_factor (float): Factor to control the shift towards 50% greyscale (0 to 1).
+            roughness (int): Optional PBR preset roughness (0 to 100). Gives the same result as calling
+                apply_roughness_to_image on the output, without the extra pass.
 
         Returns:
             np.ndarray: The processed image in grayscale with normalized intensity.
@@ -171,27 +307,12 @@ class ImageProcessor:
         # Convert to grayscale
         img_greyscale = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-        # Ensure img_greyscale is of type ndarray and is in float32
-        img_greyscale = img_greyscale.astype(np.float32)
-
-        # Create an empty destination image (same shape but 8-bit unsigned int)
-        img_normalized = np.zeros(img_greyscale.shape, dtype=np.uint8)
-        
-        # Normalize the image
-        cv2.normalize(
-            src = img_greyscale,                    # Convert to float32 for normalization
-            dst = img_normalized,                   # No destination image provided (it's created internally)
-            alpha = 0,                              # Min value for normalization
-            beta = 255,                             # Max value for normalization
-            norm_type = cv2.NORM_MINMAX,            # Normalization type
-            dtype = cv2.CV_8U                       # Output type (8-bit unsigned int)
-        )
+        # Find the grey range in one pass, it is all the normalization needs to know about the image
+        minimum, maximum, _, _ = cv2.minMaxLoc(img_greyscale)
 
-        # Adjust intensity by multiplying with intensity_factor
-        img_normalized = cv2.convertScaleAbs(img_normalized * intensity_factor)
-
-        # Shift towards 50% greyscale to get rid of extreme value variations
-        img_grey_shifted = cv2.addWeighted(img_normalized, 1 - grey_factor, np.full_like(img_normalized, 128), grey_factor, 0)
+        # Normalize, adjust intensity, shift towards 50% greyscale (and apply roughness) in a single uint8 pass
+        lut = ImageProcessor.build_point_lut(minimum, maximum, intensity_factor, grey_factor, roughness)
+        img_grey_shifted = cv2.LUT(img_greyscale, lut)
 
         return img_grey_shifted
 
@@ -212,7 +333,14 @@ class ImageProcessor:
         # For simplicity, assume roughness directly influences the brightness of the image
         # The higher the roughness, the more diffuse the image becomes.
         roughness_factor = roughness / 100.0  # Convert to a factor between 0 and 1
-        adjusted_image = cv2.convertScaleAbs(image * roughness_factor)
+
+        if image.dtype != np.uint8:
+            return cv2.convertScaleAbs(image * roughness_factor)
+
+        # 8-bit images only have 256 possible values, scale those and look the pixels up instead of
+        # multiplying a full float copy of the image
+        lut = cv2.convertScaleAbs(np.arange(256, dtype=np.uint8).reshape(1, 256) * roughness_factor)
+        adjusted_image = cv2.LUT(image, lut)
         return adjusted_image
 
     @staticmethod
@@ -229,32 +357,91 @@ class ImageProcessor:
         return img_grey_shifted
 
     @staticmethod
-    def resize_and_crop(image_path: str,
+    def resize_and_crop(image,
                         target_size=(512, 512)) -> np.ndarray:
         """
         Resize and crop the image to the target size and return as a numpy array.
         If the current size is larger than the target size, crop it.
         If the size is smaller than or equal to the target size, scale it up to fill the entire texture.
+
+        Parameters:
+            image (np.ndarray or str): Decoded RGB image from pre_process_check, or a path to decode it from.
+            target_size (tuple): Target (width, height).
+
+        Returns:
+            np.ndarray: The resized and cropped RGB image.
         """
-        
-        with Image.open(image_path) as img:
-            img = img.convert("RGB")
-            width, height = img.size
+        if not isinstance(image, np.ndarray):
+            image = ImageProcessor.pre_process_check(image)
+
+        height, width = image.shape[:2]
+        box = ImageProcessor.crop_box(width, height, target_size)
+
+        if box is not None:
+            # Slicing is a view, so cropping does not copy the source image
+            left, top, right, bottom = box
+            cropped_img = image[top:bottom, left:right]
+            resized_img = cv2.resize(cropped_img, target_size, interpolation=cv2.INTER_LANCZOS4)
+        else:
+            # Scale the image up
+            resized_img = cv2.resize(image, target_size, interpolation=cv2.INTER_LANCZOS4)
+
+        return resized_img
+
+    @staticmethod
+    def crop_box(width: int,
+                 height: int,
+                 target_size: tuple) -> tuple:
+        """
+        Return the part of an image resize_and_crop keeps for a target size.
 
-            if width > target_size[0] and height > target_size[1]:
-                # Crop the image
-                left = (width - target_size[0]) / 2
-                top = (height - target_size[1]) / 2
-                right = (width + target_size[0]) / 2
-                bottom = (height + target_size[1]) / 2
+        Parameters:
+            width (int): Width of the source image.
+            height (int): Height of the source image.
+            target_size (tuple): Target (width, height).
+
+        Returns:
+            tuple: (left, top, right, bottom) of the centered crop, or None when the image is not larger than the
+                   target in both directions and is scaled up whole instead.
+        """
+        if width > target_size[0] and height > target_size[1]:
+            # Round the box the same way PIL's crop does
+            left = int(round((width - target_size[0]) / 2))
+            top = int(round((height - target_size[1]) / 2))
+            right = int(round((width + target_size[0]) / 2))
+            bottom = int(round((height + target_size[1]) / 2))
+            return left, top, right, bottom
+        return None
+
+    @staticmethod
+    def make_proxy(image: np.ndarray,
+                   target_size: tuple,
+                   max_side: int = ENCODER_DEFAULTS["preview_size"]) -> np.ndarray:
+        """
+        Downscale what resize_and_crop would produce for target_size into a small proxy, so the remaining stages can
+        be previewed on a few thousand pixels instead of the full export resolution.
+        The full resolution image is never built, the kept region is scaled straight to the proxy size.
+
+        Parameters:
+            image (np.ndarray): Decoded RGB image from pre_process_check.
+            target_size (tuple): Target (width, height) of the full resolution export.
+            max_side (int): Longest side of the proxy in pixels. Smaller targets keep their size.
+
+        Returns:
+            np.ndarray: The proxy, with the aspect ratio of target_size.
+        """
+        height, width = image.shape[:2]
+        box = ImageProcessor.crop_box(width, height, target_size)
+        if box is not None:
+            left, top, right, bottom = box
+            image = image[top:bottom, left:right]
 
-                cropped_img = img.crop((left, top, right, bottom))
-                resized_img = cv2.resize(np.array(cropped_img), target_size, interpolation=cv2.INTER_LANCZOS4)
-            else:
-                # Scale the image up
-                resized_img = cv2.resize(np.array(img), target_size, interpolation=cv2.INTER_LANCZOS4)
+        scale = min(1.0, max_side / max(target_size))
+        size = (max(1, round(target_size[0] * scale)), max(1, round(target_size[1] * scale)))
 
-            return np.array(resized_img)
+        # INTER_AREA when shrinking, like make_preview, and the same filter as resize_and_crop when enlarging
+        shrinking = size[0] < image.shape[1] and size[1] < image.shape[0]
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4)
 
     @staticmethod
     def generate_normal_map(image: np.ndarray,
@@ -299,6 +486,206 @@ class ImageProcessor:
 
         return normal_map
 
+    @staticmethod
+    def build_height_map(image: np.ndarray,
+                         height_levels: int = 0) -> np.ndarray:
+        """
+        Derive a height map from the luminance of an image.
+        With height_levels > 0 the luminance is averaged with blurred copies from a Gaussian pyramid,
+        so large shapes contribute to the height and not only the fine surface detail.
+
+        Parameters:
+            image (np.ndarray): RGB image, or an already greyscale image.
+            height_levels (int): Number of pyramid levels blended into the height. 0 uses the luminance as is.
+
+        Returns:
+            np.ndarray: uint8 luminance when height_levels is 0, otherwise a float32 height in the 0-255 range.
+        """
+        height_map = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        if height_levels <= 0:
+            return height_map
+
+        pyramid = [height_map.astype(np.float32)]
+        for _ in range(height_levels):
+            if min(pyramid[-1].shape) < 2:
+                break
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+        # Collapse from the coarsest level up, so every upsampling step runs at the size of the next level
+        accumulated = pyramid.pop()
+        levels_used = 1
+        while pyramid:
+            level = pyramid.pop()
+            accumulated = cv2.pyrUp(accumulated, dstsize=(level.shape[1], level.shape[0]))
+            accumulated += level
+            levels_used += 1
+
+        accumulated *= 1.0 / levels_used
+        return accumulated
+
+    @staticmethod
+    def generate_tangent_normal_map(image: np.ndarray,
+                                    strength: float = 2.0,
+                                    height_levels: int = 0,
+                                    flip_green: bool = False,
+                                    strip_rows: int = 256) -> np.ndarray:
+        """
+        Generate a tangent space normal map with unit length normals from the luminance of an image.
+        Unlike generate_normal_map the gradients are not min-max stretched per axis, so the result only
+        depends on the surface slope and the strength, not on the contrast of the image.
+        Gradients are computed in float32 strips with a one row halo, so apart from the height map
+        the working memory is bounded by strip_rows instead of the image size.
+
+        Parameters:
+            image (np.ndarray): RGB image to derive the height from.
+            strength (float): Slope multiplier. At 1.0 a full black to white step across one pixel gives a slope of 0.5,
+                tilting the normal by about 26.6 degrees, since Sobel's central difference spans two pixels. The default
+                2.0 tilts it by 45 degrees.
+            height_levels (int): Blurred pyramid levels blended into the height, see build_height_map.
+            flip_green (bool): Point green down (DirectX convention) instead of up (OpenGL convention).
+            strip_rows (int): Rows processed at once.
+
+        Returns:
+            np.ndarray: uint8 normal map with channels ordered for cv2.imwrite, red = X, green = Y, blue = Z.
+        """
+        height_map = ImageProcessor.build_height_map(image, height_levels)
+        height, width = height_map.shape
+
+        # Sobel sums 4 weighted differences of the 0-255 height, scale it to a slope of the 0-1 height
+        scale = strength / (8.0 * 255.0)
+        green_sign = -1.0 if flip_green else 1.0
+
+        normal_map = np.empty((height, width, 3), dtype=np.uint8)
+        for top in range(0, height, strip_rows):
+            bottom = min(top + strip_rows, height)
+            # One extra row on each side, so the strip sees the same neighbours as the full image
+            halo_top = max(top - 1, 0)
+            halo_bottom = min(bottom + 1, height)
+            strip = height_map[halo_top:halo_bottom]
+
+            grad_x = cv2.Sobel(strip, cv2.CV_32F, 1, 0, ksize=3, scale=-scale)
+            grad_y = cv2.Sobel(strip, cv2.CV_32F, 0, 1, ksize=3, scale=green_sign * scale)
+            grad_x = grad_x[top - halo_top:bottom - halo_top]
+            grad_y = grad_y[top - halo_top:bottom - halo_top]
+
+            # Normalize (grad_x, grad_y, 1) and map [-1, 1] to [0, 255]
+            inverse_length = cv2.magnitude(grad_x, grad_y)
+            cv2.multiply(inverse_length, inverse_length, dst=inverse_length)
+            inverse_length += 1.0
+            cv2.sqrt(inverse_length, dst=inverse_length)
+            cv2.divide(127.5, inverse_length, dst=inverse_length)
+
+            output = normal_map[top:bottom]
+            cv2.multiply(grad_x, inverse_length, dst=grad_x)
+            cv2.multiply(grad_y, inverse_length, dst=grad_y)
+            # Components stay within [-127.5, 127.5], so the absolute value never changes them
+            output[..., 2] = cv2.convertScaleAbs(grad_x, beta=127.5)
+            output[..., 1] = cv2.convertScaleAbs(grad_y, beta=127.5)
+            output[..., 0] = cv2.convertScaleAbs(inverse_length, beta=127.5)
+
+        return normal_map
+
+    @staticmethod
+    def greyscale_adjust_batch(images: np.ndarray,
+                               intensity_factor: float = 1.0,
+                               grey_factor: float = 0.5) -> np.ndarray:
+        """
+        Batched greyscale_adjust for a stack of images that share the same size.
+        The greyscale conversion and the min/max search run once over the whole stack,
+        then every image is adjusted with its own lookup table from build_point_lut.
+
+        Parameters:
+            images (np.ndarray): N x H x W x 3 stack of uint8 images.
+            intensity_factor (float): Factor by which the intensity will be adjusted, see greyscale_adjust.
+            grey_factor (float): Factor to control the shift towards 50% greyscale (0 to 1).
+
+        Returns:
+            np.ndarray: N x H x W stack of processed greyscale images, identical to calling greyscale_adjust per image.
+        """
+        count, height, width = images.shape[:3]
+
+        # One colour conversion for the whole stack, the images are laid out as one tall image
+        greyscale = cv2.cvtColor(images.reshape(count * height, width, 3), cv2.COLOR_BGR2GRAY)
+        greyscale = greyscale.reshape(count, height, width)
+
+        # Min and max of every image in one reduction over the stack
+        flat = greyscale.reshape(count, -1)
+        minimums = flat.min(axis=1)
+        maximums = flat.max(axis=1)
+
+        # Every image gets its own lookup table for its grey range, applied in a single uint8 pass
+        adjusted = np.empty_like(greyscale)
+        for index in range(count):
+            lut = ImageProcessor.build_point_lut(minimums[index], maximums[index], intensity_factor, grey_factor)
+            adjusted[index] = cv2.LUT(greyscale[index], lut)
+
+        return adjusted
+
+    @staticmethod
+    def apply_roughness_to_batch(images: np.ndarray,
+                                 roughness: int = 50) -> np.ndarray:
+        """
+        Batched apply_roughness_to_image for a stack of images that share the same size.
+
+        Parameters:
+            images (np.ndarray): N x H x W (x C) stack of images.
+            roughness (int): The roughness value (0 to 100).
+
+        Returns:
+            np.ndarray: The stack with roughness applied, same shape as the input.
+        """
+        roughness_factor = roughness / 100.0
+
+        if images.dtype != np.uint8:
+            return cv2.convertScaleAbs(images * roughness_factor)
+
+        # Same table as apply_roughness_to_image, applied to the whole stack in a single lookup
+        lut = cv2.convertScaleAbs(np.arange(256, dtype=np.uint8).reshape(1, 256) * roughness_factor)
+        count, height = images.shape[:2]
+        flat = images.reshape((count * height,) + images.shape[2:])
+        return cv2.LUT(flat, lut).reshape(images.shape)
+
+    @staticmethod
+    def generate_normal_map_batch(images: np.ndarray,
+                                  normal_configuration: str) -> np.ndarray:
+        """
+        Batched generate_normal_map for a stack of images that share the same size.
+        The greyscale conversion and both Sobel passes run once over the whole stack. Every image is padded
+        with one reflected row above and below, so gradients never leak from one image into the next.
+        The gradients of 8-bit images are exact integers, so they are computed in 16-bit instead of 64-bit floats.
+
+        Parameters:
+            images (np.ndarray): N x H x W x 3 stack of uint8 images.
+            normal_configuration (str): "Normal Map" or "Bump Map", see generate_normal_map.
+
+        Returns:
+            np.ndarray: N x H x W x 3 stack of normal maps, identical to calling generate_normal_map per image.
+        """
+        count, height, width = images.shape[:3]
+
+        gray_images = cv2.cvtColor(images.reshape(count * height, width, 3), cv2.COLOR_BGR2GRAY)
+        gray_images = gray_images.reshape(count, height, width)
+
+        # Reflect one row at the top and bottom of every image, the same border Sobel uses on a single image
+        padded = np.pad(gray_images, ((0, 0), (1, 1), (0, 0)), mode='reflect').reshape(count * (height + 2), width)
+
+        grad_x = cv2.Sobel(padded, cv2.CV_16S, 1, 0, ksize=3).reshape(count, height + 2, width)
+        grad_y = cv2.Sobel(padded, cv2.CV_16S, 0, 1, ksize=3).reshape(count, height + 2, width)
+
+        normal_maps = np.empty((count, height, width, 3), dtype=np.uint8)
+        normal_maps[..., 2] = 127
+        for index in range(count):
+            # Every image is normalized with its own gradient range, like generate_normal_map does
+            normal_maps[index, ..., 0] = cv2.normalize(grad_x[index, 1:-1], None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            normal_maps[index, ..., 1] = cv2.normalize(grad_y[index, 1:-1], None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+
+        if normal_configuration == "Bump Map":
+            flat = normal_maps.reshape(count * height, width, 3)
+            gray_normal_maps = cv2.cvtColor(flat, cv2.COLOR_BGR2GRAY)
+            normal_maps = cv2.applyColorMap(gray_normal_maps, cv2.COLORMAP_JET).reshape(count, height, width, 3)
+
+        return normal_maps
+
     @staticmethod
     def apply_segmentation(image: np.ndarray) -> np.ndarray:
         """
@@ -382,7 +769,7 @@ class ImageProcessor:
         Make texture tiling for game engines using image processing.
         
         Parameters:
-            img (numpy.ndarray): The input image to be tiled.
+            img (numpy.ndarray): The input image to be tiled, greyscale (H x W) or color (H x W x C).
         
         Returns:
             process_image (numpy.ndarray): The tiling texture image.
@@ -390,21 +777,11 @@ class ImageProcessor:
         # Ensure image is in float32 for blending
         img = img.astype(np.float32) / 255.0
         
-        # Split the image into four quadrants and swap them
-        h, w, c = img.shape
+        # Swap the four quadrants. Rolling by half the size does that for greyscale and color images,
+        # and odd sizes keep their shape
+        h, w = img.shape[:2]
         half_h, half_w = h // 2, w // 2
-        
-        top_left = img[:half_h, :half_w]
-        top_right = img[:half_h, half_w:]
-        bottom_left = img[half_h:, :half_w]
-        bottom_right = img[half_h:, half_w:]
-        
-        # Swap quadrants
-        blended = np.zeros_like(img)
-        blended[:half_h, :half_w] = bottom_right
-        blended[:half_h, half_w:] = bottom_left
-        blended[half_h:, :half_w] = top_right
-        blended[half_h:, half_w:] = top_left
+        blended = np.roll(img, (-half_h, -half_w), axis=(0, 1))
         
         # Apply Gaussian blur to smooth the seams
         blended = cv2.GaussianBlur(blended, (31, 31), 0)
@@ -414,6 +791,101 @@ class ImageProcessor:
         
         return blended
 
+    @staticmethod
+    def seam_weights(length: int,
+                     band_width: int) -> np.ndarray:
+        """
+        Feather weights across the seam make_tiling_seams creates, 1 at the seam falling smoothly to 0 at the edge of the band.
+
+        Parameters:
+            length (int): Height or width of the image.
+            band_width (int): Pixels on each side of the seam that are blended, limited to what fits in the image.
+
+        Returns:
+            np.ndarray: float32 weight for every row or column, 0 outside the band.
+        """
+        # After the quadrant swap the old border lies between rows (or columns) seam - 1 and seam
+        seam = length - length // 2
+        band_width = min(band_width, seam, length - seam)
+        if band_width <= 0:
+            return np.zeros(length, dtype=np.float32)
+
+        distance = np.abs(np.arange(length, dtype=np.float32) - seam + 0.5)
+        weights = np.clip(1.0 - distance / band_width, 0.0, 1.0)
+        # Smoothstep, so the blend starts and ends without a visible edge
+        return weights * weights * (3.0 - 2.0 * weights)
+
+    @staticmethod
+    def blend_seam_band(swapped: np.ndarray,
+                        original: np.ndarray,
+                        row_weights: np.ndarray,
+                        column_weights: np.ndarray,
+                        keep_uint8: bool = True) -> np.ndarray:
+        """
+        Cross-fade the quadrant swapped image towards the original inside the seam bands, in place.
+        Only rows and columns with a non-zero weight are read or written.
+
+        Parameters:
+            swapped (np.ndarray): Quadrant swapped uint8 image, or a range of its rows. Modified in place.
+            original (np.ndarray): The same rows of the image before the swap.
+            row_weights (np.ndarray): Weight of every row of swapped, see seam_weights.
+            column_weights (np.ndarray): Weight of every column, see seam_weights.
+            keep_uint8 (bool): Blend with cv2.blendLinear on the uint8 pixels instead of converting the band to float32.
+
+        Returns:
+            np.ndarray: swapped, for convenience.
+        """
+        def blend(target, source, weights):
+            weights = np.ascontiguousarray(np.broadcast_to(weights, target.shape[:2]), dtype=np.float32)
+            if keep_uint8:
+                return cv2.blendLinear(np.ascontiguousarray(target), np.ascontiguousarray(source), 1.0 - weights, weights)
+            if target.ndim == 3:
+                weights = weights[..., None]
+            blended = target.astype(np.float32) * (1.0 - weights) + source.astype(np.float32) * weights
+            return np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+
+        # Horizontal seam first. Where the bands cross, the vertical seam then blends that result further
+        rows = np.flatnonzero(row_weights)
+        if len(rows):
+            top, bottom = rows[0], rows[-1] + 1
+            swapped[top:bottom] = blend(swapped[top:bottom], original[top:bottom], row_weights[top:bottom, None])
+
+        columns = np.flatnonzero(column_weights)
+        if len(columns):
+            left, right = columns[0], columns[-1] + 1
+            swapped[:, left:right] = blend(swapped[:, left:right], original[:, left:right], column_weights[None, left:right])
+
+        return swapped
+
+    @staticmethod
+    def make_tiling_seams(img: np.ndarray,
+                          band_width: int = 32,
+                          keep_uint8: bool = True) -> np.ndarray:
+        """
+        Make a texture tileable by swapping its quadrants and cross-fading only a band around the new seams.
+        Inside the band the swapped image is blended with the original image, which is continuous where the seams are.
+        Pixels outside the band keep their detail, and the cost grows with the seam area instead of the image area.
+        Works on greyscale and colour images of any size.
+
+        Parameters:
+            img (np.ndarray): uint8 image to make tileable, greyscale or with channels.
+            band_width (int): Pixels on each side of a seam that are blended.
+            keep_uint8 (bool): Blend with cv2.blendLinear on the uint8 pixels instead of converting the band to float32.
+
+        Returns:
+            np.ndarray: The tileable image, same shape and dtype as the input.
+        """
+        height, width = img.shape[:2]
+
+        # Swapping the quadrants moves the old borders to the middle, the seams the band is blended over
+        tiled = np.roll(img, (-(height // 2), -(width // 2)), axis=(0, 1))
+
+        return ImageProcessor.blend_seam_band(tiled,
+                                              img,
+                                              ImageProcessor.seam_weights(height, band_width),
+                                              ImageProcessor.seam_weights(width, band_width),
+                                              keep_uint8)
+
     @staticmethod
     def force_square(img: np.ndarray) -> np.ndarray:
         """
@@ -445,65 +917,171 @@ class ImageProcessor:
 
     @staticmethod
     def generate_metallic(input_image: np.ndarray,
-                          is_metallic:int = 0) -> np.ndarray:
+                          is_metallic:int = 0) -> ConstantMap:
         """
         Generate a basic metallic map for the image.
+        The map is a single value, so it is returned as a ConstantMap instead of a full resolution pixel buffer.
         
         Parameters:
-            image_path (str): Path to the input image.
-            material_preset (dict): Dictionary containing material properties.
+            input_image (numpy.ndarray): Image the metallic map is generated for, only its size is used.
+            is_metallic (int): IsMetallic value of the material preset.
         
         Returns:
-            process_image (numpy.ndarray): The generated metallic map.
+            ConstantMap: Full white for metallic materials, full black otherwise.
         """
-        
-        # Create a metallic map based on the is_metallic value
-        if is_metallic:
-            metallic_texture = np.full_like(input_image, 255)  # Full white for metallic
-        else:
-            metallic_texture = np.full_like(input_image, 0)  # Full black for non-metallic
-        
-        return metallic_texture
+        return ConstantMap(input_image.shape[:2], 255 if is_metallic else 0)
 
     @staticmethod
-    def convert_image_format(input_image: np.ndarray,
-                             target_format: str = "Don't Convert") -> np.ndarray:
+    def pack_channels(channels: list) -> np.ndarray:
         """
-        Convert an image to a different format and return the image in the target format.
-        
+        Pack single-channel maps into one texture, so they are encoded, stored and sampled as one file.
+
         Parameters:
-            input_image (numpy.ndarray): The input image to be converted.
-            target_format (str): The target format to convert the image to. Choices are 'PNG', 'JPG', 'BMP', or no conversion.
-        
+            channels (list): 3 or 4 maps in RGB(A) order. Each is an H x W uint8 array, a ConstantMap or an int.
+
         Returns:
-            converted_image (numpy.ndarray): The converted image in the target format.
+            np.ndarray: H x W x 3 (or 4) uint8 texture with channels ordered for cv2.imwrite, BGR(A).
         """
-        
-        # Ensure the target format is uppercase for Pillow library
-        PILformat = target_format.upper()
-        
-        # Convert the input NumPy array to a Pillow Image so we can do conversion
-        img = Image.fromarray(input_image)
-        
-        # Create an in-memory bytes buffer
-        img_byte_arr = io.BytesIO()
-        
-        # Save the image to the bytes buffer in the desired format
-        img.save(img_byte_arr, format=PILformat)
-        
-        # Retrieve the byte data of the image
-        img_byte_arr.seek(0)  # Ensure we are at the beginning of the byte buffer
-        
-        # Open the image from the byte array (Pillow automatically detects the format)
-        img = Image.open(img_byte_arr)
-        
-        # Convert the Pillow Image back to a NumPy array
-        image_array_result = np.array(img)
+        shape = next(channel.shape[:2] for channel in channels if not isinstance(channel, int))
+        packed = np.empty(shape + (len(channels),), dtype=np.uint8)
+
+        # OpenCV stores blue first, alpha stays last
+        for index, channel in zip((2, 1, 0, 3), channels):
+            if isinstance(channel, ConstantMap):
+                channel = channel.value
+            packed[..., index] = channel
+
+        return packed
+
+    @staticmethod
+    def encoder_parameters(extension: str,
+                           encoder_settings: dict = None) -> list:
+        """
+        Translate encoder settings into the cv2.imwrite / cv2.imencode parameters of a file format.
+
+        Parameters:
+            extension (str): Target file extension, e.g. ".png" or "JPG".
+            encoder_settings (dict): Overrides for ENCODER_DEFAULTS. Unknown keys are ignored.
+
+        Returns:
+            list: Flat [flag, value, ...] parameter list for OpenCV.
+        """
+        settings = dict(ENCODER_DEFAULTS, **(encoder_settings or {}))
+        extension = extension.lower().lstrip('.')
+
+        if extension == 'png':
+            return [cv2.IMWRITE_PNG_COMPRESSION, int(settings["png_compression"]),
+                    cv2.IMWRITE_PNG_STRATEGY, PNG_STRATEGIES[settings["png_strategy"]]]
+        if extension in ('jpg', 'jpeg'):
+            return [cv2.IMWRITE_JPEG_QUALITY, int(settings["jpeg_quality"]),
+                    cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(settings["jpeg_progressive"]))]
+        if extension == 'webp':
+            # OpenCV switches WebP to lossless for any quality above 100
+            quality = 101 if settings["webp_lossless"] else int(settings["webp_quality"])
+            return [cv2.IMWRITE_WEBP_QUALITY, quality]
+        return []
+
+    @staticmethod
+    def encode_image(image: np.ndarray,
+                     extension: str,
+                     encoder_settings: dict = None) -> bytes:
+        """
+        Encode an image to a file format exactly once.
+        DDS files are block compressed by src.dds, every other format goes through cv2.imencode.
+
+        Parameters:
+            image (np.ndarray or ConstantMap): Image to encode.
+            extension (str): Target file extension, e.g. ".png" or "JPG".
+            encoder_settings (dict): Overrides for ENCODER_DEFAULTS.
+
+        Returns:
+            bytes: The encoded file contents.
+        """
+        extension = '.' + extension.lower().lstrip('.')
+        parameters = ImageProcessor.encoder_parameters(extension, encoder_settings)
+
+        if extension == '.dds':
+            settings = dict(ENCODER_DEFAULTS, **(encoder_settings or {}))
+            if isinstance(image, ConstantMap) and settings["dds_mipmaps"]:
+                return image.encode(extension)
+            if isinstance(image, ConstantMap):
+                image = np.ascontiguousarray(image.to_array())
+            return encode_dds(image, settings["dds_compression"], settings["dds_mipmaps"])
+
+        if isinstance(image, ConstantMap):
+            # Constant maps are encoded once per size, value and settings, later saves reuse the cached bytes
+            return image.encode(extension, parameters)
+
+        if image.ndim == 3 and image.shape[2] == 1:
+            # Scalar maps are written as single-channel images
+            image = image[..., 0]
+        if image.ndim == 3 and image.shape[2] == 4 and extension in ('.jpg', '.jpeg'):
+            raise ValueError("JPG cannot store a fourth channel, export channel packed maps with alpha as PNG, WEBP or BMP.")
+
+        success, encoded = cv2.imencode(extension, image, parameters)
+        if not success:
+            raise ValueError(f"Failed to encode the image as {extension}.")
+        return encoded.tobytes()
+
+    @staticmethod
+    def make_preview(image: np.ndarray,
+                     max_side: int = ENCODER_DEFAULTS["preview_size"]) -> np.ndarray:
+        """
+        Downscale a map for its preview on the processing page, keeping the aspect ratio.
+
+        Parameters:
+            image (np.ndarray or ConstantMap): The map as it is saved, memory mapped maps work too.
+            max_side (int): Longest side of the preview in pixels. Smaller maps keep their size.
+
+        Returns:
+            np.ndarray: H x W or H x W x 3 uint8 preview. A fourth channel is dropped, in channel packed maps
+                        it holds a map rather than transparency.
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, max_side / max(height, width))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        if isinstance(image, ConstantMap):
+            return np.full((size[1], size[0]), image.value, dtype=np.uint8)
+
+        if image.ndim == 3 and image.shape[2] == 1:
+            image = image[..., 0]
+        # INTER_AREA averages every source pixel, so fine detail turns into the right average instead of aliasing
+        preview = cv2.resize(image, size, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+        if preview.ndim == 3 and preview.shape[2] == 4:
+            preview = preview[..., :3]
+        return np.ascontiguousarray(preview)
+
+    @staticmethod
+    def save_preview_image(preview_folder: str,
+                           processed_filename: str,
+                           image: np.ndarray,
+                           encoder_settings: dict = None) -> str:
+        """
+        Save a small lossy preview of a map, made from the array that was just saved so nothing is decoded again.
+
+        Parameters:
+            preview_folder (str): Folder the preview is saved in.
+            processed_filename (str): Filename of the full resolution map, the preview gets the same name.
+            image (np.ndarray or ConstantMap): The full resolution map.
+            encoder_settings (dict): Overrides for ENCODER_DEFAULTS, the preview_ settings apply.
+
+        Returns:
+            str: Filename of the preview inside preview_folder.
+        """
+        settings = dict(ENCODER_DEFAULTS, **(encoder_settings or {}))
+        extension = '.' + settings["preview_format"].lower().lstrip('.')
+        quality = int(settings["preview_quality"])
+
+        preview = ImageProcessor.make_preview(image, int(settings["preview_size"]))
+        encoded = ImageProcessor.encode_image(preview, extension,
+                                              {"webp_lossless": False, "webp_quality": quality, "jpeg_quality": quality})
+
+        preview_filename = os.path.splitext(processed_filename)[0] + extension
+        with open(os.path.join(preview_folder, preview_filename), 'wb') as file:
+            file.write(encoded)
+        return preview_filename
 
-        # Return the resulting NumPy array
-        return image_array_result
-    
-    
     @staticmethod
     def rename_output_image(file: FileStorage,
                             naming_convention:str,
@@ -537,6 +1115,8 @@ class ImageProcessor:
             map_type = "_Roughness"
         elif target_map_type == "Metallic":
             map_type = "_Metallic"
+        elif target_map_type in PACKED_MAP_TYPES:
+            map_type = "_" + target_map_type
             
         print(target_map_type) 
             
@@ -545,8 +1125,9 @@ class ImageProcessor:
         elif naming_convention == "T_texturename_Roughness":
             processed_filename = "T_" + os.path.splitext(file.filename)[0] + map_type + "." + desired_extension
         else:
-            # short map type naming convention
-            processed_filename = "T_" + os.path.splitext(file.filename)[0] + map_type[:2] + "." + desired_extension
+            # short map type naming convention, channel packed maps already have short names
+            short_map_type = map_type if target_map_type in PACKED_MAP_TYPES else map_type[:2]
+            processed_filename = "T_" + os.path.splitext(file.filename)[0] + short_map_type + "." + desired_extension
             
         return processed_filename
 
@@ -556,20 +1137,30 @@ class ImageProcessor:
                           processed_files: list,
                           processed_filename: str,
                           processed_image: np.ndarray,
-                          ) -> None:
-        """Process the image and save it to the processed folder.
+                          encoder_settings: dict = None
+                          ) -> dict:
+        """Encode the image once in the format of its filename and save it to the processed folder.
 
         Args:
             PROCESSED_FOLDER (str): The folder where the processed image will be saved.
             processed_files (list): Frontend display list to store the names of processed files.
             processed_filename (str): The filename of the processed image.
-            processed_image (np.ndarray): The processed image to be saved.
+            processed_image (np.ndarray or ConstantMap): The processed image to be saved.
+            encoder_settings (dict): Overrides for ENCODER_DEFAULTS.
             
         Returns:
-            None
+            dict: {"bytes": size of the written file, "encode_ms": time spent encoding}
             
         """
         # Process the image and save it to the processed folder
         processed_filepath = os.path.join(PROCESSED_FOLDER, processed_filename)
-        cv2.imwrite(processed_filepath, processed_image)
+
+        start = time.perf_counter()
+        encoded = ImageProcessor.encode_image(processed_image, os.path.splitext(processed_filename)[1], encoder_settings)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        with open(processed_filepath, 'wb') as file:
+            file.write(encoded)
         processed_files.append(processed_filename)
+
+        return {"bytes": len(encoded), "encode_ms": round(encode_ms, 2)}
@@ -0,0 +1,177 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import ResultCache
+
+
+# Job states reported by the status endpoint
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """
+    JobManager runs processing batches in the background and keeps track of their progress.
+    Jobs are kept in memory of the web worker process that accepted the submission. Other workers
+    can only answer for a job if its state is published with on_update, e.g. to its workspace.
+
+    Methods:
+        submit(tasks: list, job_id: str = None, on_finish=None, on_update=None) -> str:
+            Queue a batch of process_texture tasks and return its job ID.
+
+        get(job_id: str) -> dict:
+            Return a snapshot of the job state, or None if the job is unknown.
+    """
+
+    def __init__(self,
+                 processing_workers: int = 1,
+                 max_concurrent_jobs: int = 2,
+                 retention_seconds: int = 3600,
+                 cache: ResultCache = None):
+        """
+        Parameters:
+            processing_workers (int): Worker processes used for the files of each job.
+            max_concurrent_jobs (int): Number of jobs processed at the same time, later jobs stay queued.
+            retention_seconds (int): How long finished jobs are remembered before they are forgotten.
+            cache (ResultCache): Optional result cache shared with the blocking upload route.
+        """
+        self.processing_workers = processing_workers
+        self.retention_seconds = retention_seconds
+        self.cache = cache
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="mapmorph-job")
+
+    def submit(self,
+               tasks: list,
+               job_id: str = None,
+               on_finish=None,
+               on_update=None) -> str:
+        """
+        Queue a batch of process_texture tasks and return immediately.
+
+        Parameters:
+            tasks (list): List of keyword argument dicts for process_texture, one per uploaded file.
+            job_id (str): Optional ID for the job, e.g. the workspace its files live in. A new ID is generated if omitted.
+            on_finish (callable): Optional callback called with the list of results once every file has finished.
+            on_update (callable): Optional callback called with a snapshot of the job, as returned by get, whenever
+                its state changes. Called from the job's thread, one call at a time.
+
+        Returns:
+            str: The ID of the new job.
+        """
+        self._forget_expired_jobs()
+
+        job_id = job_id or uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": QUEUED,
+            "created": time.time(),
+            "finished": None,
+            "files": [
+                {"source": task["original_filename"], "status": QUEUED, "files": [], "maps": [], "error": None}
+                for task in tasks
+            ],
+        }
+
+        with self._lock:
+            self._jobs[job_id] = job
+
+        self._publish(job_id, on_update)
+        self._executor.submit(self._run_job, job, tasks, on_finish, on_update)
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """
+        Return a snapshot of the job state.
+
+        Parameters:
+            job_id (str): ID returned by submit.
+
+        Returns:
+            dict: Job state including per-file progress and outputs, or None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            files = [dict(entry) for entry in job["files"]]
+
+        completed = sum(1 for entry in files if entry["status"] in (DONE, FAILED))
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "progress": {"completed": completed, "total": len(files)},
+            "files": files,
+            "outputs": [filename for entry in files for filename in entry["files"]],
+            "errors": [{"file": entry["source"], "error": entry["error"]} for entry in files if entry["error"]],
+        }
+
+    def _publish(self, job_id: str, on_update=None) -> None:
+        """
+        Hand a snapshot of the job to on_update. A failing callback never fails the job.
+        """
+        if on_update is None:
+            return
+        try:
+            on_update(self.get(job_id))
+        except Exception as e:
+            print(f"Failed to publish the state of job {job_id}. Reason: {e}")
+
+    def _run_job(self, job: dict, tasks: list, on_finish=None, on_update=None) -> None:
+        """
+        Process all files of a job, updating the per-file state as each one finishes.
+        """
+        with self._lock:
+            job["status"] = RUNNING
+            for entry in job["files"]:
+                entry["status"] = RUNNING
+        self._publish(job["job_id"], on_update)
+
+        def on_result(index: int, result: dict) -> None:
+            with self._lock:
+                entry = job["files"][index]
+                entry["files"] = result["files"]
+                entry["maps"] = result.get("maps", [])
+                entry["error"] = result["error"]
+                entry["status"] = FAILED if result["error"] else DONE
+                if result.get("profile"):
+                    entry["profile"] = result["profile"]
+            self._publish(job["job_id"], on_update)
+
+        # Imported here so the web app only loads the imaging stack once a job actually runs
+        from src.pipeline import run_batch
+
+        try:
+            results = run_batch(tasks, max_workers=self.processing_workers, on_result=on_result, cache=self.cache)
+            if on_finish is not None:
+                on_finish(results)
+            status = DONE if any(result["error"] is None for result in results) or not results else FAILED
+        except Exception as e:
+            print(f"Job {job['job_id']} failed. Reason: {e}")
+            status = FAILED
+            with self._lock:
+                for entry in job["files"]:
+                    if entry["status"] == RUNNING:
+                        entry["status"] = FAILED
+                        entry["error"] = str(e)
+
+        with self._lock:
+            job["status"] = status
+            job["finished"] = time.time()
+        self._publish(job["job_id"], on_update)
+
+    def _forget_expired_jobs(self) -> None:
+        """
+        Drop finished jobs older than the retention period so the job table does not grow forever.
+        """
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job["finished"] and job["finished"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
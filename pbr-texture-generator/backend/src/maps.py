@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src.dds import encode_dds
+
+
+# Encoded constant maps kept per process, keyed by size, value and format, least recently used evicted first.
+# PNG and WebP shrink a constant map to a few hundred bytes, but BMP stores every pixel (64 MB at 8K) and BC4 DDS
+# keeps half a byte per pixel plus mips, so the cache is bounded by bytes rather than by entries
+CONSTANT_ENCODE_CACHE_BYTES = 16 * 1024 * 1024
+
+# Encodings larger than this fraction of the budget are not cached, one of them would evict everything else
+CONSTANT_ENCODE_MAX_ENTRY_FRACTION = 0.25
+
+_encoded_constants = OrderedDict()  # (shape, value, extension, parameters) -> encoded bytes
+_encoded_constants_bytes = 0
+_encoded_constants_lock = threading.Lock()
+
+
+class ConstantMap:
+    """
+    ConstantMap stands in for a single-channel map where every pixel has the same value, such as a metallic map.
+    No pixel buffer is allocated. The encoded file is produced once per size, value and format and reused from an
+    in-process cache, so writing the same constant map again costs only the file write.
+
+    Methods:
+        to_array() -> np.ndarray:
+            Return the map as a read-only uint8 array without allocating the pixels.
+
+        encode(extension: str, parameters: list = None) -> bytes:
+            Return the encoded file contents of the map.
+    """
+
+    def __init__(self,
+                 shape: tuple,
+                 value: int):
+        """
+        Parameters:
+            shape (tuple): (height, width) of the map. Extra dimensions, e.g. from an image shape, are ignored.
+            value (int): Value of every pixel, 0 to 255.
+        """
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.value = int(value)
+        self.dtype = np.dtype(np.uint8)
+
+    def __repr__(self) -> str:
+        return f"ConstantMap(shape={self.shape}, value={self.value})"
+
+    def to_array(self) -> np.ndarray:
+        """
+        Return the map as a read-only H x W uint8 array. Every pixel shares the same single byte of memory.
+        """
+        return np.broadcast_to(np.uint8(self.value), self.shape)
+
+    def encode(self,
+               extension: str,
+               parameters: list = None) -> bytes:
+        """
+        Return the encoded file contents of the map.
+
+        Parameters:
+            extension (str): File extension of the target format, e.g. ".png" or "png". ".dds" writes BC4 with mipmaps.
+            parameters (list): cv2.imencode parameters, see ImageProcessor.encoder_parameters.
+
+        Returns:
+            bytes: The encoded single-channel image.
+        """
+        extension = extension.lower()
+        if not extension.startswith('.'):
+            extension = '.' + extension
+        return _encode_constant(self.shape, self.value, extension, tuple(parameters or ()))
+
+
+def _encode_constant(shape: tuple,
+                     value: int,
+                     extension: str,
+                     parameters: tuple) -> bytes:
+    """
+    Encode a constant single-channel image. Cached within CONSTANT_ENCODE_CACHE_BYTES, so every size, value, format
+    and setting that encodes small is encoded once per process.
+    """
+    global _encoded_constants_bytes
+
+    key = (shape, value, extension, parameters)
+    with _encoded_constants_lock:
+        encoded = _encoded_constants.get(key)
+        if encoded is not None:
+            _encoded_constants.move_to_end(key)
+            return encoded
+
+    if extension == '.dds':
+        encoded = encode_dds(np.full(shape, value, dtype=np.uint8))
+    else:
+        success, encoded = cv2.imencode(extension, np.full(shape, value, dtype=np.uint8), list(parameters))
+        if not success:
+            raise ValueError(f"Failed to encode a constant map as {extension}.")
+        encoded = encoded.tobytes()
+
+    if len(encoded) <= CONSTANT_ENCODE_CACHE_BYTES * CONSTANT_ENCODE_MAX_ENTRY_FRACTION:
+        with _encoded_constants_lock:
+            if key not in _encoded_constants:
+                _encoded_constants[key] = encoded
+                _encoded_constants_bytes += len(encoded)
+            while _encoded_constants_bytes > CONSTANT_ENCODE_CACHE_BYTES:
+                _, evicted = _encoded_constants.popitem(last=False)
+                _encoded_constants_bytes -= len(evicted)
+    return encoded
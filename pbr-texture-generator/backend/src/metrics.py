@@ -0,0 +1,288 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds, from a point operation on a small texture up to encoding a 4K map
+STAGE_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets of the whole request, a batch of large textures can take minutes
+REQUEST_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labels: tuple) -> str:
+    """
+    Render sorted (name, value) label pairs as {name="value",...}, escaped as the text format requires.
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Metric is a single counter, gauge or histogram with any number of label combinations.
+    Values live in the process that records them, see MetricsRegistry.
+
+    Methods:
+        inc(value: float = 1, **labels) -> None:
+            Add to a counter or gauge.
+
+        set(value: float, **labels) -> None:
+            Set a gauge.
+
+        observe(value: float, **labels) -> None:
+            Record one observation in a histogram.
+
+        render() -> list:
+            Return the metric in the Prometheus text format, one line per entry.
+    """
+
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 metric_type: str,
+                 buckets: tuple = None,
+                 callback=None):
+        """
+        Parameters:
+            name (str): Metric name, e.g. "mapmorph_files_total".
+            help_text (str): Description shown in the HELP line.
+            metric_type (str): "counter", "gauge" or "histogram".
+            buckets (tuple): Upper bounds of the histogram buckets, +Inf is added automatically.
+            callback (callable): Read the value at scrape time instead of recording it, returns a number
+                or a dict of {label tuple: number}.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.buckets = tuple(buckets or ()) + (float('inf'),) if metric_type == "histogram" else ()
+        self.callback = callback
+        self._values = {}  # sorted label tuple -> value, or [bucket counts, sum, count] for histograms
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts = list(counts)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+
+        if self.callback is not None:
+            values = self.callback()
+            values = values if isinstance(values, dict) else {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+
+        for labels, value in sorted(values.items()):
+            if self.metric_type != "histogram":
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+
+            counts, total, count = value
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels = labels + (("le", _format_value(float(bound))),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry holds the metrics of one web worker process and renders them for the /metrics endpoint.
+    Like the ResultCache index and the jobs, the values are per process: with several web workers every
+    worker reports its own series and the dashboards sum them. Processing pool workers never record
+    anything themselves, their results carry the stage timings back and are recorded here.
+
+    Methods:
+        counter(name: str, help_text: str, callback=None) -> Metric:
+            Register a counter.
+
+        gauge(name: str, help_text: str, callback=None) -> Metric:
+            Register a gauge.
+
+        histogram(name: str, help_text: str, buckets: tuple) -> Metric:
+            Register a histogram.
+
+        render() -> str:
+            Return every metric in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        # Registering the same name again replaces the metric, e.g. when the app module is reloaded
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, callback=None) -> Metric:
+        return self._register(Metric(name, help_text, "counter", callback=callback))
+
+    def gauge(self, name: str, help_text: str, callback=None) -> Metric:
+        return self._register(Metric(name, help_text, "gauge", callback=callback))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple) -> Metric:
+        return self._register(Metric(name, help_text, "histogram", buckets=buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+# Set in the thread of a profiled run by trace_stage_memory. tracemalloc is process wide, so the stage timers
+# of unprofiled requests running next to it must not reset its peak
+_stage_memory = threading.local()
+
+
+@contextmanager
+def trace_stage_memory():
+    """
+    Record the traced peak of every stage timed in this thread while tracemalloc is tracing.
+    """
+    _stage_memory.traced = True
+    try:
+        yield
+    finally:
+        _stage_memory.traced = False
+
+
+class StageTimer:
+    """
+    StageTimer times the stages of one process_texture run and remembers the stage that failed.
+    Inside trace_stage_memory, i.e. in a profiled run, it also records the peak bytes each stage allocated.
+    It runs inside the processing worker and only keeps plain dicts, so the timings travel back to the
+    web worker with the result and are recorded there by record_result.
+
+    Methods:
+        stage(name: str):
+            Context manager that adds the time spent inside it to the named stage.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.memory_peaks = {}
+        self.failed_stage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        # Peaks are measured from the memory in use when the stage starts. Stages are not nested in the pipeline,
+        # a nested stage would reset the peak of the stage around it
+        tracing = getattr(_stage_memory, 'traced', False) and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            # Only the innermost stage is blamed, outer stages see the exception again on the way out
+            if self.failed_stage is None:
+                self.failed_stage = name
+            raise
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - start_memory
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+
+
+# The registry of this process and the pipeline metrics recorded in it
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "mapmorph_stage_duration_seconds", "Time spent in each pipeline stage per file.", STAGE_LATENCY_BUCKETS)
+REQUEST_DURATION = registry.histogram(
+    "mapmorph_request_duration_seconds", "Time to handle a request, by endpoint.", REQUEST_LATENCY_BUCKETS)
+FILES_PROCESSED = registry.counter(
+    "mapmorph_files_total", "Uploaded files by outcome: processed, cached or failed.")
+INPUT_BYTES = registry.counter(
+    "mapmorph_input_bytes_total", "Bytes of uploaded source images that were processed.")
+OUTPUT_BYTES = registry.counter(
+    "mapmorph_output_bytes_total", "Bytes of maps written to the workspaces, by map type.")
+MEGAPIXELS = registry.counter(
+    "mapmorph_megapixels_total", "Megapixels processed, at the resolution the maps are generated at.")
+ERRORS = registry.counter(
+    "mapmorph_errors_total", "Files that failed, by the stage they failed in.")
+
+
+def record_result(result: dict) -> None:
+    """
+    Record the metrics of one process_texture or restore_cached_result result.
+
+    Parameters:
+        result (dict): Result dict with the optional "timings", "megapixels", "input_bytes" and "error_stage" fields.
+    """
+    if result.get("error"):
+        FILES_PROCESSED.inc(outcome="failed")
+        ERRORS.inc(stage=result.get("error_stage") or "pipeline")
+    else:
+        FILES_PROCESSED.inc(outcome="cached" if result.get("cached") else "processed")
+
+    for stage, seconds in result.get("timings", {}).items():
+        STAGE_DURATION.observe(seconds, stage=stage)
+
+    INPUT_BYTES.inc(result.get("input_bytes", 0))
+    MEGAPIXELS.inc(result.get("megapixels", 0.0))
+    for saved in result.get("maps", []):
+        OUTPUT_BYTES.inc(saved.get("bytes", 0), map_type=saved["map_type"])
+
+
+def register_cache_metrics(cache) -> None:
+    """
+    Export the hit, miss and size counters of a ResultCache, read from cache.stats() at scrape time.
+    """
+    registry.counter("mapmorph_cache_hits_total", "Result cache lookups that were served from the cache.",
+                     callback=lambda: cache.stats()["hits"])
+    registry.counter("mapmorph_cache_misses_total", "Result cache lookups that had to be processed.",
+                     callback=lambda: cache.stats()["misses"])
+    registry.gauge("mapmorph_cache_hit_ratio", "Share of result cache lookups served from the cache.",
+                   callback=lambda: cache.stats()["hit_rate"])
+    registry.gauge("mapmorph_cache_entries", "Entries in the result cache.",
+                   callback=lambda: cache.stats()["entries"])
+    registry.gauge("mapmorph_cache_bytes", "Disk space used by the result cache.",
+                   callback=lambda: cache.stats()["bytes"])
+
+
+def timed_iterator(iterable,
+                   metric: Metric,
+                   **labels):
+    """
+    Yield from an iterable and observe the time until it is exhausted, e.g. a streamed response.
+    """
+    start = time.perf_counter()
+    yield from iterable
+    metric.observe(time.perf_counter() - start, **labels)
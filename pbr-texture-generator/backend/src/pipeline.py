@@ -0,0 +1,810 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+from werkzeug.datastructures import FileStorage
+
+from src.cache import ResultCache
+from src.image_processing import CHANNEL_PACKING_LAYOUTS, ImageProcessor
+from src.maps import ConstantMap
+from src.metrics import StageTimer, record_result
+from src.profiling import profile_call
+from src.tiled_processing import (DEFAULT_STRIP_ROWS, TILED_EXPORT_RESOLUTION, create_bmp_output, finish_output,
+                                  open_strip_source, read_proxy, render_normal, render_roughness)
+
+
+# Shared process pool, created on the first batch that needs it and reused by later requests.
+# Request threads and job threads share it, every change to it holds the lock
+_executor: ProcessPoolExecutor = None
+_executor_workers: int = 0
+_executor_lock = threading.Lock()
+
+
+def _init_worker() -> None:
+    """
+    Initialise a pool worker process.
+    Every worker already runs on its own core, so OpenCV's internal thread pool is
+    limited to one thread to avoid oversubscribing the machine.
+    """
+    cv2.setNumThreads(1)
+
+
+def get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Return the shared process pool, (re)creating it if the worker count changed.
+
+    Parameters:
+        max_workers (int): Number of worker processes in the pool.
+
+    Returns:
+        ProcessPoolExecutor: The shared process pool.
+    """
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                # Work already submitted by other batches still finishes
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+            _executor_workers = max_workers
+
+        return _executor
+
+
+def discard_executor(executor: ProcessPoolExecutor) -> None:
+    """
+    Drop a broken process pool so the next batch starts a fresh one.
+    Only that pool is dropped, if another batch has replaced it already the replacement is kept.
+
+    Parameters:
+        executor (ProcessPoolExecutor): The pool that broke, as returned by get_executor.
+    """
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+            _executor_workers = 0
+    executor.shutdown(wait=False)
+
+
+def shutdown_executor() -> None:
+    """
+    Shut down the shared process pool, if one was started.
+    """
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        executor = _executor
+        _executor = None
+        _executor_workers = 0
+
+    # Waited for outside the lock, so other batches can start a new pool meanwhile
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+# Preferences that change the generated pixels, with the defaults process_texture falls back to.
+# Naming preferences are left out on purpose, cached maps are renamed when they are restored.
+OUTPUT_PREFERENCE_DEFAULTS = {
+    "target_export_resolution": "512x512",
+    "export_format": "Don't Convert",
+    "use_ai_segmentation": False,
+    "manual_material_selection": None,
+    "apply_ai_upscale": False,
+    "pbr_standardize": False,
+    "material_type": "Brick",
+    "set_texel_ai": False,
+    "add_grunge": False,
+    "remove_artifacts": False,
+    "make_tiling": False,
+    "tiling_mode": "Seam Band",
+    "tiling_band_width": 32,
+    "force_square": False,
+    "generate_roughness": False,
+    "generate_normal": False,
+    "normal_bump_workflow": "Normal Map",
+    "normal_strength": 2.0,
+    "normal_height_levels": 0,
+    "generate_metallic": False,
+    "channel_packing": "Separate Maps",
+    "pbr_preset": None,
+}
+
+
+# Longest side in pixels of the proxy preview_texture runs the pipeline on
+PROXY_SIZE = 256
+
+
+# Normal workflows rendered by generate_tangent_normal_map, mapped to whether green points down (DirectX)
+TANGENT_NORMAL_WORKFLOWS = {
+    "Tangent Normal Map (OpenGL)": False,
+    "Tangent Normal Map (DirectX)": True,
+}
+
+
+def map_encoder_settings(map_type: str,
+                         normal_workflow: str = None,
+                         encoder_settings: dict = None) -> dict:
+    """
+    Encoder settings of a single map. Tangent space normal maps are stored as BC5 in DDS files,
+    the engine rebuilds Z from the two channels. Every other map keeps the deployment settings.
+
+    Parameters:
+        map_type (str): "Roughness", "Normal", "Metallic" or a channel packed layout.
+        normal_workflow (str): The normal_bump_workflow preference, only used for normal maps.
+        encoder_settings (dict): The deployment's overrides for ImageProcessor's ENCODER_DEFAULTS.
+
+    Returns:
+        dict: Encoder settings to pass to save_output_image.
+    """
+    if map_type == "Normal" and normal_workflow in TANGENT_NORMAL_WORKFLOWS:
+        return dict(encoder_settings or {}, dds_compression="BC5")
+    return encoder_settings
+
+
+# Packed layout each engine preset of the "PBR Material Preset" dropdown gets with the "Engine Default" packing
+ENGINE_PACKING_LAYOUTS = {
+    "Unreal Engine": "ORM",
+    "Unity Engine": "MaskMap",
+}
+
+
+def packing_layout(preferences: dict) -> str:
+    """
+    Resolve the channel packed layout requested by the user.
+
+    Parameters:
+        preferences (dict): User preferences sent along with the upload.
+
+    Returns:
+        str: A key of CHANNEL_PACKING_LAYOUTS, or None to save every map separately.
+    """
+    choice = preferences.get('channel_packing', 'Separate Maps')
+    if choice == 'Engine Default':
+        return ENGINE_PACKING_LAYOUTS.get(preferences.get('pbr_preset'), 'ORM')
+    return choice if choice in CHANNEL_PACKING_LAYOUTS else None
+
+
+def output_naming(original_filename: str,
+                  preferences: dict) -> tuple:
+    """
+    Resolve the naming convention and file extension used for the outputs of an upload.
+
+    Parameters:
+        original_filename (str): Filename as uploaded by the user.
+        preferences (dict): User preferences sent along with the upload.
+
+    Returns:
+        tuple: (naming_convention, desired_extension) to pass to ImageProcessor.rename_output_image.
+    """
+    naming_convention = preferences.get("naming_convention", "Don't Convert")
+    if naming_convention == "Don't Convert":
+        naming_convention = ""
+
+    desired_extension = preferences.get("export_format", "Don't Convert")
+    if desired_extension == "Don't Convert":
+        desired_extension = original_filename.split('.')[-1]  # Default to the original file extension
+
+    return naming_convention, desired_extension
+
+
+def result_cache_key(task: dict) -> str:
+    """
+    Build the result cache key of a process_texture task from its input bytes and normalized preferences.
+
+    Parameters:
+        task (dict): Keyword arguments for process_texture.
+
+    Returns:
+        str: The key under which the generated maps are cached.
+    """
+    preferences = task["preferences"]
+    pbr_presets = task["pbr_presets"]
+
+    normalized = {}
+    for key, default in OUTPUT_PREFERENCE_DEFAULTS.items():
+        value = preferences.get(key, default)
+        normalized[key] = bool(value) if isinstance(default, bool) else value
+
+    # The extension decides the encoder, and the preset values decide the pixels, so editing a CSV invalidates the entry
+    normalized["extension"] = output_naming(task["original_filename"], preferences)[1].lower()
+    normalized["encoder_settings"] = task.get("encoder_settings")
+    normalized["material_preset"] = pbr_presets.get(normalized["material_type"])
+    normalized["metallic_preset"] = pbr_presets.get(preferences.get('manual_material_selection', 'Brick'))
+
+    return ResultCache.make_key(task["upload"], normalized)
+
+
+def restore_cached_result(task: dict,
+                          cached_maps: list) -> dict:
+    """
+    Copy cached maps into the output folder of a task, named as process_texture would have named them.
+
+    Parameters:
+        task (dict): Keyword arguments for process_texture.
+        cached_maps (list): [{"map_type": ..., "path": ...}] returned by ResultCache.get.
+
+    Returns:
+        dict: A result dict in the same format process_texture returns.
+    """
+    original_filename = task["original_filename"]
+    file = FileStorage(filename=original_filename)
+    naming_convention, desired_extension = output_naming(original_filename, task["preferences"])
+
+    result = {"source": original_filename, "files": [], "maps": [], "error": None, "cached": True}
+    for cached in cached_maps:
+        processed_filename = ImageProcessor.rename_output_image(file, naming_convention, desired_extension, target_map_type=cached["map_type"])
+        processed_filepath = os.path.join(task["output_folder"], processed_filename)
+
+        # Hard link when possible, the cached file is never modified in place
+        try:
+            os.link(cached["path"], processed_filepath)
+        except OSError:
+            shutil.copyfile(cached["path"], processed_filepath)
+
+        result["files"].append(processed_filename)
+        # Nothing was encoded, the size is still reported so the entry looks like a fresh one
+        saved = {"map_type": cached["map_type"], "filename": processed_filename,
+                 "bytes": os.path.getsize(processed_filepath), "encode_ms": 0.0}
+
+        if task.get("preview_folder") and cached.get("preview_path"):
+            saved["preview"] = os.path.splitext(processed_filename)[0] + os.path.splitext(cached["preview_path"])[1]
+            shutil.copyfile(cached["preview_path"], os.path.join(task["preview_folder"], saved["preview"]))
+        result["maps"].append(saved)
+
+    print(f"Restored {original_filename} from the result cache.")
+    return result
+
+
+def upload_size(upload) -> int:
+    """
+    Return the size in bytes of an upload given as a path, as its contents or decoded, 0 if it cannot be read.
+    """
+    if isinstance(upload, (bytes, bytearray)):
+        return len(upload)
+    if isinstance(upload, np.ndarray):
+        return upload.nbytes
+    try:
+        return os.path.getsize(upload)
+    except (OSError, TypeError):
+        return 0
+
+
+def process_texture(upload,
+                    original_filename: str,
+                    preferences: dict,
+                    pbr_presets: dict,
+                    output_folder: str,
+                    encoder_settings: dict = None,
+                    profile_folder: str = None,
+                    preview_folder: str = None) -> dict:
+    """
+    Run the full processing pipeline for a single uploaded texture.
+    This is a module level function so it can be sent to a worker process.
+
+    Parameters:
+        upload (str, bytes or np.ndarray): Path to the uploaded image on disk, or the uploaded file contents when kept
+            in memory. An already decoded image, like the proxy of preview_texture, skips the decode stage.
+        original_filename (str): Filename as uploaded by the user, used to name the outputs.
+        preferences (dict): User preferences sent along with the upload.
+        pbr_presets (dict): Material presets loaded from the /presets directory.
+        output_folder (str): Folder where the generated maps are saved. None saves only the previews.
+        encoder_settings (dict): Overrides for ImageProcessor's ENCODER_DEFAULTS, set per deployment.
+        profile_folder (str): Profile this run with cProfile and tracemalloc and save the profile in this folder,
+            see profile_call. The result then carries a "profile" entry.
+        preview_folder (str): Also save a small preview of every map in this folder, made from the map while it is
+            still in memory. The map entries then carry the "preview" filename.
+
+    Returns:
+        dict: {"source": original filename, "files": saved map filenames,
+               "maps": [{"map_type": ..., "filename": ..., "bytes": ..., "encode_ms": ..., "preview": ...}],
+               "error": error message or None,
+               "timings": seconds per pipeline stage, "memory_peaks": traced peak bytes per stage when profiled,
+               "error_stage": stage that failed or None,
+               "input_bytes": size of the upload, "megapixels": resolution the maps were generated at}
+    """
+    if profile_folder is not None:
+        # Profiled in whichever process runs the task, so pool workers are profiled as well
+        return profile_call(process_texture, os.path.join(profile_folder, os.path.basename(original_filename) + '.prof'),
+                            upload=upload, original_filename=original_filename, preferences=preferences,
+                            pbr_presets=pbr_presets, output_folder=output_folder, encoder_settings=encoder_settings,
+                            preview_folder=preview_folder)
+
+    processed_files = []
+    processed_maps = []
+    timer = StageTimer()
+    result = {"source": original_filename, "files": processed_files, "maps": processed_maps, "error": None,
+              "timings": timer.timings, "memory_peaks": timer.memory_peaks, "error_stage": None,
+              "input_bytes": upload_size(upload), "megapixels": 0.0}
+
+    # rename_output_image only needs the filename of the upload
+    file = FileStorage(filename=original_filename)
+    naming_convention, desired_extension = output_naming(original_filename, preferences)
+
+    if preferences.get('target_export_resolution') == TILED_EXPORT_RESOLUTION:
+        return process_texture_tiled(upload, original_filename, preferences, pbr_presets, output_folder,
+                                     encoder_settings, preview_folder=preview_folder)
+
+    try:
+        # Pre-process check, file size, file corruption, extension etc. The file is decoded once here
+        with timer.stage("decode"):
+            if isinstance(upload, np.ndarray):
+                source_image = upload
+            else:
+                source_image = ImageProcessor.pre_process_check(upload, original_filename)
+
+        #########################################################################
+        # Apply user preferences
+        #########################################################################
+
+        # Target resolution, resize the image to fit the new size
+        export_resolution = preferences.get('target_export_resolution', "512x512")
+        width, height = map(int, export_resolution.split('x'))
+        with timer.stage("resize"):
+            resized_cropped_image = ImageProcessor.resize_and_crop(source_image, target_size=(width, height))
+        result["megapixels"] = width * height / 1e6
+
+        # The full resolution source is no longer needed, release it before the heavier stages run
+        del source_image
+
+        # PBR standardization shifts roughness with a point operation, so it is folded into the
+        # greyscale lookup table instead of running as a second pass over the image
+        material_preset = None
+        if preferences.get('pbr_standardize', False):
+            material_preset_name = preferences.get('material_type', 'Brick')  # Default to brick material
+            material_preset = pbr_presets.get(material_preset_name, None)
+        preset_roughness = material_preset.get('Roughness', 50) if material_preset else None
+
+        # base greyscale adjust. change this to work on top of resize, not replace!
+        with timer.stage("greyscale"):
+            processed_image = ImageProcessor.greyscale_adjust(resized_cropped_image, roughness=preset_roughness)
+
+        # Apply AI segmentation if selected
+        if preferences.get('use_ai_segmentation', False):
+            print("AI segmentation feature is in development and will be implemented later.")
+
+        # Apply manual material selection if provided
+        manual_material = preferences.get('manual_material_selection', None)
+        if manual_material:
+            processed_image = ImageProcessor.detect_material(processed_image)
+        else:
+            print("Error, no material selected.")
+
+        # Apply AI upscaling if selected
+        if preferences.get('apply_ai_upscale', False):
+            print("AI Upscaling feature is in development and will be implemented later.")
+            processed_image = ImageProcessor.apply_upscaling(processed_image)
+
+        # Standardize PBR if selected. With a preset the roughness was already applied by greyscale_adjust
+        if preferences.get('pbr_standardize', False) and not material_preset:
+            with timer.stage("pbr_standardize"):
+                processed_image = ImageProcessor.standardize_pbr(processed_image, material_preset)
+
+        # Set texel density if selected
+        if preferences.get('set_texel_ai', False):
+            print("Set Texel Density feature is in development and will be implemented later.")
+            processed_image = ImageProcessor.set_texel_density(processed_image)
+
+        # Add grunge if selected
+        if preferences.get('add_grunge', False):
+            print("Add grunge feature is in development and will be implemented later.")
+            processed_image = ImageProcessor.add_grunge(processed_image)
+
+        # Remove artefacts if selected
+        if preferences.get('remove_artifacts', False):
+            print("Remove artefacts feature is in development and will be implemented later.")
+            processed_image = ImageProcessor.remove_artifacts(processed_image)
+
+        # Make tilig material tiling if selected
+        if preferences.get('make_tiling', False):
+            with timer.stage("tiling"):
+                if preferences.get('tiling_mode', 'Seam Band') == 'Full Blur':
+                    processed_image = ImageProcessor.make_tiling(processed_image)
+                else:
+                    band_width = int(preferences.get('tiling_band_width', 32))
+                    processed_image = ImageProcessor.make_tiling_seams(processed_image, band_width)
+            print("Made tiling image.")
+
+        # Force square if selected
+        if preferences.get('force_square', False):
+            print("Force square feature is in development and will be implemented later.")
+            processed_image = ImageProcessor.force_square(processed_image)
+
+        #########################################################################
+        # Output Maps
+        #########################################################################
+
+        # The export format only decides the encoder, every map is encoded exactly once when it is saved
+        export_preference = preferences.get('export_format', "Don't Convert")
+        if not export_preference == "Don't Convert":
+            print("Exporting image as", export_preference)
+
+        # Helper function to process and save maps
+        def process_and_save_map(map_type, image, preset_name=None, preset_value=None):
+            if map_type == "Roughness":
+                processed_map = image
+            elif map_type == "Normal" and preset_name in TANGENT_NORMAL_WORKFLOWS:
+                with timer.stage("normal"):
+                    processed_map = ImageProcessor.generate_tangent_normal_map(
+                        image,
+                        strength=float(preferences.get('normal_strength', 2.0)),
+                        height_levels=int(preferences.get('normal_height_levels', 0)),
+                        flip_green=TANGENT_NORMAL_WORKFLOWS[preset_name]
+                    )
+            elif map_type == "Normal":
+                with timer.stage("normal"):
+                    processed_map = ImageProcessor.generate_normal_map(image, preset_name)
+            elif map_type == "Metallic":
+                with timer.stage("metallic"):
+                    processed_map = ImageProcessor.generate_metallic(image, preset_value)
+            elif map_type in CHANNEL_PACKING_LAYOUTS:
+                processed_map = image
+            else:
+                return
+
+            processed_filename = ImageProcessor.rename_output_image(
+                file,
+                naming_convention,
+                desired_extension,
+                target_map_type=map_type
+            )
+
+            saved = {"map_type": map_type, "filename": processed_filename}
+            if output_folder is not None:
+                with timer.stage("encode"):
+                    encode_stats = ImageProcessor.save_output_image(
+                        output_folder,
+                        processed_files,
+                        processed_filename,
+                        processed_map,
+                        map_encoder_settings(map_type, preset_name, encoder_settings)
+                    )
+                saved.update(encode_stats)
+                print(f"Processed {map_type.lower()} texture saved as {processed_filename} "
+                      f"({encode_stats['bytes']} bytes, encoded in {encode_stats['encode_ms']} ms)")
+            if preview_folder is not None:
+                with timer.stage("preview"):
+                    saved["preview"] = ImageProcessor.save_preview_image(preview_folder, processed_filename,
+                                                                         processed_map, encoder_settings)
+            processed_maps.append(saved)
+
+        # With channel packing, roughness, metallic and the other scalar maps share one texture
+        layout = packing_layout(preferences)
+        if layout and (preferences.get('generate_roughness', None) or preferences.get('generate_metallic', None)):
+            material_preset = pbr_presets.get(preferences.get('manual_material_selection', 'Brick'), {})
+            channel_sources = {
+                # No occlusion or detail mask is generated yet, white leaves the material unchanged
+                "Occlusion": lambda: ConstantMap(processed_image.shape, 255),
+                "DetailMask": lambda: ConstantMap(processed_image.shape, 255),
+                "Roughness": lambda: processed_image,
+                "Smoothness": lambda: cv2.bitwise_not(processed_image),
+                "Metallic": lambda: ImageProcessor.generate_metallic(processed_image, material_preset.get('IsMetallic', 0)),
+                "Height": lambda: ImageProcessor.build_height_map(resized_cropped_image),
+            }
+            with timer.stage("pack"):
+                packed_image = ImageProcessor.pack_channels([channel_sources[name]() for name in CHANNEL_PACKING_LAYOUTS[layout]])
+            process_and_save_map(layout, packed_image)
+
+        # Generate roughness map if selected
+        if preferences.get('generate_roughness', None) and not layout:
+            process_and_save_map("Roughness", processed_image)
+
+        # Generate normal map if selected
+        if preferences.get('generate_normal', None):
+            normal_preset_name = preferences.get('normal_bump_workflow', 'Normal Map')
+            process_and_save_map("Normal", resized_cropped_image, preset_name=normal_preset_name)
+
+        # Generate metallic map if selected
+        if preferences.get('generate_metallic', None) and not layout:
+            material_preset_name = preferences.get('manual_material_selection', 'Brick')
+            material_preset = pbr_presets.get(material_preset_name, {})
+            metallic_value = material_preset.get('IsMetallic', 0)  # Default to not metallic if not specified
+            process_and_save_map("Metallic", processed_image, preset_value=metallic_value)
+
+    except Exception as e:
+        # Report the error for this file only, the rest of the batch keeps going
+        print(f"Failed to process {original_filename}. Reason: {e}")
+        result["error"] = str(e)
+        result["error_stage"] = timer.failed_stage
+
+    return result
+
+
+def preview_texture(upload,
+                    original_filename: str,
+                    preferences: dict,
+                    pbr_presets: dict,
+                    preview_folder: str,
+                    proxy_folder: str,
+                    encoder_settings: dict = None) -> dict:
+    """
+    Preview the maps process_texture would generate by running the same stages on a proxy of about PROXY_SIZE
+    pixels, and save only the previews.
+    The proxy of every target resolution is kept in proxy_folder, so changing any other setting only reruns the stages
+    on a few thousand pixels. Settings given in pixels are scaled with the image, the previews are a close
+    approximation of the final maps rather than an exact downscaled copy.
+    In the tiled mode the proxy is read with read_proxy, so sources up to the tiled limits can be previewed.
+
+    Parameters:
+        upload (str or bytes): Path to the uploaded image on disk, or its contents when they are still in memory.
+        original_filename (str): Filename as uploaded by the user, used to name the previews.
+        preferences (dict): User preferences to preview.
+        pbr_presets (dict): Material presets loaded from the /presets directory.
+        preview_folder (str): Folder the previews are saved in, created if needed.
+        proxy_folder (str): Folder the proxies are kept in between previews.
+        encoder_settings (dict): Overrides for ImageProcessor's ENCODER_DEFAULTS, the preview_ settings apply.
+
+    Returns:
+        dict: The result of process_texture, its map entries carry only "map_type", "filename" and "preview".
+    """
+    export_resolution = preferences.get('target_export_resolution', "512x512")
+    proxy_key = 'source' if export_resolution == TILED_EXPORT_RESOLUTION else export_resolution
+    proxy_path = os.path.join(proxy_folder, f'{os.path.basename(original_filename)}.{proxy_key}.npz')
+
+    timer = StageTimer()
+    try:
+        if os.path.exists(proxy_path):
+            with np.load(proxy_path) as stored:
+                proxy, target_size = stored["proxy"], tuple(int(side) for side in stored["target_size"])
+        elif proxy_key == 'source':
+            # Tiled exports keep the source resolution, which may be far beyond what pre_process_check accepts.
+            # The proxy is read the way the tiled mode reads the source, without decoding it whole
+            with timer.stage("proxy"):
+                proxy, target_size = read_proxy(upload, original_filename, PROXY_SIZE)
+                os.makedirs(proxy_folder, exist_ok=True)
+                np.savez(proxy_path, proxy=proxy, target_size=np.array(target_size))
+        else:
+            with timer.stage("decode"):
+                source_image = ImageProcessor.pre_process_check(upload, original_filename)
+            with timer.stage("proxy"):
+                target_size = tuple(map(int, export_resolution.split('x')))
+                proxy = ImageProcessor.make_proxy(source_image, target_size, PROXY_SIZE)
+                os.makedirs(proxy_folder, exist_ok=True)
+                np.savez(proxy_path, proxy=proxy, target_size=np.array(target_size))
+    except Exception as e:
+        print(f"Failed to preview {original_filename}. Reason: {e}")
+        return {"source": original_filename, "files": [], "maps": [], "error": str(e),
+                "timings": timer.timings, "memory_peaks": timer.memory_peaks, "error_stage": timer.failed_stage,
+                "input_bytes": upload_size(upload), "megapixels": 0.0}
+
+    scale = proxy.shape[1] / target_size[0]
+    proxy_preferences = dict(preferences,
+                             target_export_resolution=f'{proxy.shape[1]}x{proxy.shape[0]}',
+                             tiling_band_width=max(1, round(int(preferences.get('tiling_band_width', 32)) * scale)))
+    # Previews of proxy sized maps are never scaled down further
+    preview_settings = dict(encoder_settings or {}, preview_size=PROXY_SIZE)
+    os.makedirs(preview_folder, exist_ok=True)
+
+    result = process_texture(proxy, original_filename, proxy_preferences, pbr_presets, None, preview_settings,
+                             preview_folder=preview_folder)
+    # The decode of the upload, when the proxy had to be built, replaces the no-op decode of the proxy
+    result["timings"] = {**result["timings"], **timer.timings}
+    result["input_bytes"] = upload_size(upload)
+    return result
+
+
+def process_texture_tiled(upload,
+                          original_filename: str,
+                          preferences: dict,
+                          pbr_presets: dict,
+                          output_folder: str,
+                          encoder_settings: dict = None,
+                          strip_rows: int = DEFAULT_STRIP_ROWS,
+                          preview_folder: str = None) -> dict:
+    """
+    Tiled counterpart of process_texture for sources too large to hold in memory several times over.
+    The maps keep the source resolution and are written strip by strip into memory mapped BMPs,
+    so peak memory follows strip_rows rather than the image size.
+    The AI stages are placeholders that leave the image unchanged and are skipped here.
+
+    Parameters:
+        upload (str or bytes): Path to the uploaded image on disk, or the uploaded file contents.
+        original_filename (str): Filename as uploaded by the user, used to name the outputs.
+        preferences (dict): User preferences sent along with the upload.
+        pbr_presets (dict): Material presets loaded from the /presets directory.
+        output_folder (str): Folder where the generated maps are saved.
+        encoder_settings (dict): Overrides for ImageProcessor's ENCODER_DEFAULTS.
+        strip_rows (int): Rows processed at once.
+        preview_folder (str): Also save a preview of every map in this folder, see process_texture.
+
+    Returns:
+        dict: Same layout as process_texture.
+    """
+    processed_files = []
+    processed_maps = []
+    timer = StageTimer()
+    result = {"source": original_filename, "files": processed_files, "maps": processed_maps, "error": None,
+              "timings": timer.timings, "memory_peaks": timer.memory_peaks, "error_stage": None,
+              "input_bytes": upload_size(upload), "megapixels": 0.0}
+
+    file = FileStorage(filename=original_filename)
+    naming_convention, desired_extension = output_naming(original_filename, preferences)
+
+    try:
+        with timer.stage("decode"):
+            source = open_strip_source(upload, original_filename)
+        result["megapixels"] = source.width * source.height / 1e6
+        print(f"Processing {original_filename} in tiled mode at {source.width}x{source.height}")
+
+        material_preset = None
+        if preferences.get('pbr_standardize', False):
+            material_preset = pbr_presets.get(preferences.get('material_type', 'Brick'), None)
+        preset_roughness = material_preset.get('Roughness', 50) if material_preset else None
+
+        if packing_layout(preferences):
+            print("Channel packing is not available in tiled mode, the maps are saved separately.")
+
+        normal_workflow = preferences.get('normal_bump_workflow', 'Normal Map')
+        if normal_workflow in TANGENT_NORMAL_WORKFLOWS and int(preferences.get('normal_height_levels', 0)) > 0:
+            print("Height pyramid levels need the whole image and are ignored in tiled mode.")
+
+        metallic_preset = pbr_presets.get(preferences.get('manual_material_selection', 'Brick'), {})
+
+        requested_maps = []
+        tiling_band_width = None
+        if preferences.get('tiling_mode', 'Seam Band') != 'Full Blur':
+            tiling_band_width = int(preferences.get('tiling_band_width', 32))
+
+        # The roughness strips include the tiling blend, so the tiled mode reports it as part of the greyscale stage
+        if preferences.get('generate_roughness', None):
+            requested_maps.append(("Roughness", 1, "greyscale", lambda output: render_roughness(
+                source, output, preset_roughness, bool(preferences.get('make_tiling', False)), tiling_band_width,
+                strip_rows)))
+        if preferences.get('generate_normal', None):
+            requested_maps.append(("Normal", 3, "normal", lambda output: render_normal(
+                source, output, normal_workflow, float(preferences.get('normal_strength', 2.0)),
+                TANGENT_NORMAL_WORKFLOWS.get(normal_workflow), strip_rows)))
+
+        for map_type, channels, stage, render in requested_maps:
+            processed_filename = ImageProcessor.rename_output_image(
+                file,
+                naming_convention,
+                desired_extension,
+                target_map_type=map_type
+            )
+            output_path = os.path.join(output_folder, processed_filename)
+            bmp_path = output_path if output_path.lower().endswith('.bmp') else output_path + '.tmp.bmp'
+
+            output = create_bmp_output(bmp_path, source.height, source.width, channels)
+            with timer.stage(stage):
+                render(output)
+            # The preview is read from the memory mapped map before it is encoded and its BMP removed
+            preview = None
+            if preview_folder is not None:
+                with timer.stage("preview"):
+                    preview = ImageProcessor.save_preview_image(preview_folder, processed_filename, output,
+                                                                encoder_settings)
+            with timer.stage("encode"):
+                encode_stats = finish_output(output, bmp_path, output_path,
+                                             map_encoder_settings(map_type, normal_workflow, encoder_settings))
+            del output
+
+            processed_files.append(processed_filename)
+            saved = {"map_type": map_type, "filename": processed_filename, **encode_stats}
+            if preview:
+                saved["preview"] = preview
+            processed_maps.append(saved)
+            print(f"Processed {map_type.lower()} texture saved as", processed_filename)
+
+        # The metallic map is a single value, it never needs strips or a memory mapped buffer
+        if preferences.get('generate_metallic', None):
+            processed_filename = ImageProcessor.rename_output_image(
+                file,
+                naming_convention,
+                desired_extension,
+                target_map_type="Metallic"
+            )
+            with timer.stage("metallic"):
+                metallic_map = ImageProcessor.generate_metallic(source.pixels, metallic_preset.get('IsMetallic', 0))
+            with timer.stage("encode"):
+                encode_stats = ImageProcessor.save_output_image(output_folder, processed_files, processed_filename,
+                                                                metallic_map, encoder_settings)
+            saved = {"map_type": "Metallic", "filename": processed_filename, **encode_stats}
+            if preview_folder is not None:
+                with timer.stage("preview"):
+                    saved["preview"] = ImageProcessor.save_preview_image(preview_folder, processed_filename,
+                                                                         metallic_map, encoder_settings)
+            processed_maps.append(saved)
+            print("Processed metallic texture saved as", processed_filename)
+
+    except Exception as e:
+        print(f"Failed to process {original_filename}. Reason: {e}")
+        result["error"] = str(e)
+        result["error_stage"] = timer.failed_stage
+
+    return result
+
+
+def run_batch(tasks: list,
+              max_workers: int = 1,
+              on_result=None,
+              cache: ResultCache = None) -> list:
+    """
+    Run process_texture for every task, in parallel when more than one worker is configured.
+
+    Parameters:
+        tasks (list): List of keyword argument dicts for process_texture, one per uploaded file.
+        max_workers (int): Number of worker processes. 1 or less processes the batch in this process.
+        on_result (callable): Optional callback called as on_result(index, result) as soon as each file finishes.
+        cache (ResultCache): Optional result cache. Cached files are restored instead of processed,
+            and newly generated maps are added to it.
+
+    Returns:
+        list: One result dict per task, in the same order as the tasks were submitted.
+    """
+    results = [None] * len(tasks)
+    cache_keys = {}
+
+    def collect(index: int, result: dict) -> None:
+        # Remember freshly generated maps for the next upload of the same image and settings
+        if index in cache_keys and not result["error"]:
+            output_folder = tasks[index]["output_folder"]
+            preview_folder = tasks[index].get("preview_folder")
+            cached_maps = []
+            for processed_map in result["maps"]:
+                cached = {"map_type": processed_map["map_type"],
+                          "path": os.path.join(output_folder, processed_map["filename"])}
+                if preview_folder and processed_map.get("preview"):
+                    cached["preview_path"] = os.path.join(preview_folder, processed_map["preview"])
+                cached_maps.append(cached)
+            cache.put(cache_keys[index], cached_maps)
+
+        record_result(result)
+        results[index] = result
+        if on_result is not None:
+            on_result(index, result)
+
+    # Restore everything the cache already has, only the misses are processed.
+    # Profiled tasks always run, a profile of a cache hit would measure nothing
+    pending = []
+    for index, task in enumerate(tasks):
+        if cache is not None and not task.get("profile_folder"):
+            try:
+                key = result_cache_key(task)
+            except OSError:
+                key = None
+            cached_maps = cache.get(key) if key else None
+            if cached_maps is not None:
+                try:
+                    collect(index, restore_cached_result(task, cached_maps))
+                    continue
+                except OSError as e:
+                    print(f"Failed to restore {task['original_filename']} from the cache. Reason: {e}")
+            if key:
+                cache_keys[index] = key
+        pending.append(index)
+
+    # A pool is not worth its overhead for a single file
+    if max_workers <= 1 or len(pending) <= 1:
+        for index in pending:
+            collect(index, process_texture(**tasks[index]))
+        return results
+
+    executor = get_executor(max_workers)
+    try:
+        futures = {executor.submit(process_texture, **tasks[index]): index for index in pending}
+    except BrokenProcessPool:
+        # Broken by another batch that has not replaced it yet, its workers never ran any of these tasks
+        discard_executor(executor)
+        executor = get_executor(max_workers)
+        futures = {executor.submit(process_texture, **tasks[index]): index for index in pending}
+
+    for future in as_completed(futures):
+        index = futures[future]
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory), start a fresh pool for the next batch
+            discard_executor(executor)
+            result = {"source": tasks[index]["original_filename"], "files": [], "maps": [], "error": f"Worker process failed: {e}"}
+        except Exception as e:
+            result = {"source": tasks[index]["original_filename"], "files": [], "maps": [], "error": str(e)}
+        collect(index, result)
+
+    return results
@@ -0,0 +1,177 @@
+import csv
+import hashlib
+import os
+import threading
+
+
+# Folder holding the preset CSV files, next to app.py
+PRESETS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'presets')
+
+# Names of the presets in the "PBR Material Preset" dropdown and the CSV file each one is read from
+PRESET_SOURCES = {
+    "Physically Based Database": "preset_physically_based.csv",
+    "Unreal Engine": "preset_unreal.csv",
+    "Unity Engine": "preset_unity.csv",
+}
+
+
+def parse_preset_row(row: dict) -> dict:
+    """
+    Parse one CSV row into a material preset with its numeric values precomputed.
+
+    Parameters:
+        row (dict): Row read by csv.DictReader with Material, BaseColor, Roughness and IsMetallic columns.
+
+    Returns:
+        dict: The preset. BaseColor, Roughness and IsMetallic keep their CSV meaning,
+              BaseColorRGB, RoughnessFactor and Metallic are ready to use in processing.
+    """
+    base_color = row["BaseColor"].strip()
+    roughness = int(row["Roughness"])
+    is_metallic = int(row["IsMetallic"])
+
+    hex_color = base_color.lstrip('#')
+    base_color_rgb = [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)]
+
+    return {
+        "BaseColor": base_color,
+        "Roughness": roughness,
+        "IsMetallic": is_metallic,
+        "BaseColorRGB": base_color_rgb,
+        "RoughnessFactor": roughness / 100.0,
+        "Metallic": bool(is_metallic),
+    }
+
+
+class PresetRegistry:
+    """
+    PresetRegistry loads the material preset CSVs once and keeps them in memory.
+    The CSVs are re-read only when one of them is added, removed or modified.
+
+    Methods:
+        materials(source: str = None) -> dict:
+            Return the materials of one preset source, or of all sources merged.
+
+        get(material_name: str, source: str = None) -> dict:
+            Return a single material preset.
+
+        to_dict() -> dict:
+            Return every preset source, for the presets API.
+    """
+
+    def __init__(self, presets_directory: str = PRESETS_DIRECTORY):
+        """
+        Parameters:
+            presets_directory (str): Directory containing preset CSV files.
+        """
+        self.presets_directory = presets_directory
+        self.etag = None
+        self._signature = None
+        self._by_file = {}
+        self._merged = {}
+        self._lock = threading.Lock()
+        self.reload_if_changed()
+
+    def _current_signature(self) -> tuple:
+        """
+        Name, modification time and size of every CSV, used to detect changes without reading the files.
+        """
+        signature = []
+        for filename in sorted(os.listdir(self.presets_directory)):
+            if filename.endswith('.csv'):
+                stat = os.stat(os.path.join(self.presets_directory, filename))
+                signature.append((filename, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-read the preset CSVs if any of them changed since they were last loaded.
+
+        Returns:
+            bool: True if the presets were reloaded.
+        """
+        signature = self._current_signature()
+        if signature == self._signature:
+            return False
+
+        with self._lock:
+            if signature == self._signature:
+                return False
+
+            by_file = {}
+            merged = {}
+            for filename, _, _ in signature:
+                with open(os.path.join(self.presets_directory, filename), mode='r') as file:
+                    reader = csv.DictReader(file)
+                    presets = {row["Material"]: parse_preset_row(row) for row in reader}
+                by_file[filename] = presets
+                merged.update(presets)
+
+            self._by_file = by_file
+            self._merged = merged
+            self._signature = signature
+            self.etag = hashlib.sha1(repr(signature).encode()).hexdigest()
+
+        print("Presets loaded successfully from CSV files.", self.presets_directory)
+        return True
+
+    def materials(self, source: str = None) -> dict:
+        """
+        Return the materials of one preset source, or of all sources merged.
+
+        Parameters:
+            source (str): A name from PRESET_SOURCES (e.g. "Unreal Engine") or a CSV filename.
+                Unknown or missing sources return all presets merged.
+
+        Returns:
+            dict: Material name -> preset dict. The dict is shared, do not modify it.
+        """
+        self.reload_if_changed()
+
+        filename = PRESET_SOURCES.get(source, source)
+        return self._by_file.get(filename, self._merged)
+
+    def get(self,
+            material_name: str,
+            source: str = None) -> dict:
+        """
+        Return a single material preset.
+
+        Parameters:
+            material_name (str): Name of the material, e.g. "Brick".
+            source (str): Optional preset source, see materials().
+
+        Returns:
+            dict: The preset, or None if the material is unknown.
+        """
+        return self.materials(source).get(material_name)
+
+    def to_dict(self) -> dict:
+        """
+        Return every preset source keyed by its display name, for the presets API.
+        """
+        self.reload_if_changed()
+
+        sources = {}
+        for filename, presets in self._by_file.items():
+            name = next((name for name, source_file in PRESET_SOURCES.items() if source_file == filename), filename)
+            sources[name] = presets
+        return {"sources": sources}
+
+
+# Registry shared by the whole process
+_registry: PresetRegistry = None
+_registry_lock = threading.Lock()
+
+
+def get_preset_registry() -> PresetRegistry:
+    """
+    Return the process wide preset registry, loading it on first use.
+    """
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PresetRegistry()
+    return _registry
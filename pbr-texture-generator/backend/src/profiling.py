@@ -0,0 +1,102 @@
+import cProfile
+import hmac
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+from src.metrics import trace_stage_memory
+
+
+# Request header and query parameter that turn profiling on for one request, their value must be the admin token
+PROFILE_HEADER = 'X-MapMorph-Profile'
+PROFILE_QUERY_PARAMETER = 'profile'
+
+# Functions listed in the text summary written next to each profile
+PROFILE_SUMMARY_LINES = 40
+
+# tracemalloc and its peak are process wide, so profiled runs in the same process take turns.
+# Runs in pool workers each have their own process and never wait for each other
+_profile_lock = threading.Lock()
+
+
+def profiling_requested(headers,
+                        args,
+                        admin_token: str) -> bool:
+    """
+    Check whether a request asks to be profiled with the right admin token.
+    Without a configured admin token profiling can never be turned on.
+
+    Parameters:
+        headers: Request headers.
+        args: Query parameters of the request.
+        admin_token (str): The MAPMORPH_ADMIN_TOKEN of the deployment.
+
+    Returns:
+        bool: True if the request carries the admin token in the profile header or query parameter.
+    """
+    supplied = headers.get(PROFILE_HEADER) or args.get(PROFILE_QUERY_PARAMETER)
+    if not admin_token or not supplied:
+        return False
+    return hmac.compare_digest(supplied.encode(), admin_token.encode())
+
+
+def profile_call(function,
+                 profile_path: str,
+                 **kwargs) -> dict:
+    """
+    Run process_texture, or anything returning a result dict, under cProfile with tracemalloc tracing.
+    The binary profile is saved at profile_path for snakeviz or pstats, and a text summary with the
+    slowest functions and the peak allocation of every stage is saved next to it.
+    Tracing slows the run down several times, so this is only for requests an admin asked to profile.
+    Profiled runs of one process are serialized. Unprofiled requests running in other threads of the same process are
+    slowed down by the tracing too, and their allocations count towards the traced peaks.
+
+    Parameters:
+        function (callable): Function to profile, called as function(**kwargs).
+        profile_path (str): Where to save the .prof file. The summary gets the same name ending in .txt.
+
+    Returns:
+        dict: The result of the function with a "profile" entry: {"profile", "summary", "seconds",
+              "peak_bytes", "memory_peaks"}, where memory_peaks holds the peak bytes allocated per stage.
+    """
+    with _profile_lock:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with trace_stage_memory():
+                result = profiler.runcall(function, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            if not already_tracing:
+                tracemalloc.stop()
+
+    # The stage timers reset the traced peak at every stage, the run peaked in whichever stage peaked highest
+    memory_peaks = result.get("memory_peaks", {})
+    peak_bytes = max([peak_bytes] + list(memory_peaks.values()))
+    profiler.dump_stats(profile_path)
+
+    summary_path = os.path.splitext(profile_path)[0] + '.txt'
+    with open(summary_path, 'w') as file:
+        file.write(f"{result.get('source')}: {seconds:.3f} s, peak traced memory {peak_bytes / 2 ** 20:.1f} MiB\n\n")
+        file.write("Peak traced memory per stage:\n")
+        for stage, stage_bytes in sorted(memory_peaks.items(), key=lambda item: -item[1]):
+            file.write(f"  {stage:<16} {stage_bytes / 2 ** 20:10.2f} MiB\n")
+        file.write("\n")
+        pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(PROFILE_SUMMARY_LINES)
+
+    result["profile"] = {
+        "profile": os.path.basename(profile_path),
+        "summary": os.path.basename(summary_path),
+        "seconds": round(seconds, 3),
+        "peak_bytes": peak_bytes,
+        "memory_peaks": memory_peaks,
+    }
+    print(f"Profile of {result.get('source')} saved as {profile_path}")
+    return result
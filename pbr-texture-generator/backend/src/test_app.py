@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from io import BytesIO
 import json
@@ -58,3 +62,84 @@ def test_upload_image(client):
     # Assert the response status code and message
     assert response.status_code == 200
     assert 'Images processed' in response.json['message']
+
+
+# Importing the real app must stay cheap: run it in a fresh interpreter so modules loaded by other tests do not count
+STARTUP_SCRIPT = """
+import os, sys
+import app
+assert 'cv2' not in sys.modules and 'numpy' not in sys.modules, 'imaging stack imported at startup'
+assert os.listdir('.') == [], 'folders created at startup: %s' % os.listdir('.')
+assert app.app.test_client().get('/faqs').status_code == 200
+assert 'cv2' not in sys.modules, 'imaging stack imported by a documentation page'
+app.preload()
+assert 'cv2' in sys.modules and 'src.pipeline' in sys.modules
+"""
+
+
+def test_app_import_is_lazy_until_preload(tmp_path):
+    backend_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONPATH=backend_folder, MAPMORPH_PRELOAD='0')
+
+    completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=tmp_path, env=environment,
+                               capture_output=True, text=True)
+
+    assert completed.returncode == 0, completed.stderr
+
+
+def test_preview_then_accept_renders_the_previewed_uploads(tmp_path, monkeypatch):
+    import cv2
+    import numpy as np
+    from app import app as real_app
+
+    monkeypatch.chdir(tmp_path)
+    client = real_app.test_client()
+    image = cv2.imencode('.png', np.random.randint(0, 256, (300, 320, 3), dtype=np.uint8))[1].tobytes()
+    preferences = {"naming_convention": "Don't Convert", "target_export_resolution": "512x512",
+                   "generate_roughness": True, "generate_normal": True}
+
+    first = client.post('/preview', data={'file': (BytesIO(image), 'brick.png'), 'preferences': json.dumps(preferences)},
+                        content_type='multipart/form-data')
+    assert first.status_code == 200
+    preview_id = first.json["preview_id"]
+    assert [saved["map_type"] for saved in first.json["files"][0]["maps"]] == ["Roughness", "Normal"]
+
+    # Changed settings are previewed without uploading again, under new URLs
+    second = client.post('/preview', data={'preview_id': preview_id,
+                                           'preferences': json.dumps(dict(preferences, generate_normal=False))})
+    assert second.json["preview_id"] == preview_id
+    preview_url = second.json["files"][0]["maps"][0]["preview_url"]
+    assert preview_url != first.json["files"][0]["maps"][0]["preview_url"]
+    assert client.get(preview_url).status_code == 200
+
+    accepted = client.post('/upload', data={'preview_id': preview_id, 'preferences': json.dumps(preferences)})
+    assert accepted.status_code == 200
+    assert accepted.json["job_id"] != preview_id
+    assert [saved["map_type"] for saved in accepted.json["maps"]] == ["Roughness", "Normal"]
+    assert client.get(f'/processed/{accepted.json["job_id"]}/{accepted.json["files"][0]}').status_code == 200
+
+    assert client.post('/preview', data={'preview_id': "0" * 32, 'preferences': '{}'}).status_code == 404
+    # The workspace of a job is not a preview, accepting it would render an empty batch
+    for endpoint in ('/preview', '/jobs'):
+        rejected = client.post(endpoint, data={'preview_id': accepted.json["job_id"], 'preferences': json.dumps(preferences)})
+        assert rejected.status_code == 400
+
+
+def test_job_status_is_answered_from_the_workspace_by_other_workers(tmp_path, monkeypatch):
+    from app import WORKSPACE_FOLDER, app as real_app
+    from src.workspace import create_workspace, write_job_status
+
+    monkeypatch.chdir(tmp_path)
+    client = real_app.test_client()
+    # A job accepted by another web worker is only known through its workspace
+    job_id, workspace_path = create_workspace(WORKSPACE_FOLDER)
+    job = {"job_id": job_id, "status": "running", "progress": {"completed": 0, "total": 1}, "files": [],
+           "outputs": [], "errors": []}
+    write_job_status(workspace_path, job)
+
+    assert client.get(f'/jobs/{job_id}').json == job
+    assert client.get(f'/jobs/{job_id}/result').status_code == 409
+
+    write_job_status(workspace_path, dict(job, status="done", outputs=["T_brick_R.png"]))
+    assert client.get(f'/jobs/{job_id}/result').json["files"] == ["T_brick_R.png"]
+    assert client.get(f'/jobs/{"0" * 32}').status_code == 404
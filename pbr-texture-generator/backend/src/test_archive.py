@@ -0,0 +1,38 @@
+import io
+import zipfile
+
+from src.archive import stream_zip
+
+
+def test_stream_zip_builds_a_valid_archive(tmp_path):
+    png_path = tmp_path / "T_brick_Normal.png"
+    png_path.write_bytes(b"\x89PNG" + bytes(range(256)) * 64)
+    bmp_path = tmp_path / "T_brick_Roughness.bmp"
+    bmp_path.write_bytes(b"BM" + b"\x00" * 50000)
+    empty_path = tmp_path / "empty.png"
+    empty_path.write_bytes(b"")
+
+    archive = b"".join(stream_zip([str(png_path), str(bmp_path), str(empty_path)]))
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == ["T_brick_Normal.png", "T_brick_Roughness.bmp", "empty.png"]
+        assert zipf.read("T_brick_Normal.png") == png_path.read_bytes()
+        assert zipf.read("T_brick_Roughness.bmp") == bmp_path.read_bytes()
+
+        # Already compressed images are stored, everything else is deflated
+        assert zipf.getinfo("T_brick_Normal.png").compress_type == zipfile.ZIP_STORED
+        assert zipf.getinfo("T_brick_Roughness.bmp").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_stream_zip_yields_before_the_archive_is_complete(tmp_path):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"map_{index}.png"
+        path.write_bytes(b"x" * 1000)
+        paths.append(str(path))
+
+    chunks = stream_zip(paths)
+
+    # The first entry is emitted before the later files are even read
+    assert next(chunks).startswith(b"PK\x03\x04")
@@ -0,0 +1,124 @@
+import os
+
+import cv2
+import numpy as np
+
+from src.cache import ResultCache
+from src.pipeline import run_batch
+
+
+PREFERENCES = {
+    "manual_material_selection": "Aluminum",
+    "target_export_resolution": "256x256",
+    "generate_roughness": True,
+    "generate_metallic": True,
+}
+
+
+def write_map(path, size):
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_cache_hits_misses_and_lru_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    first = write_map(tmp_path / "first.png", 100)
+    second = write_map(tmp_path / "second.png", 100)
+    third = write_map(tmp_path / "third.png", 100)
+
+    assert cache.get("a") is None
+    cache.put("a", [{"map_type": "Roughness", "path": first}])
+    cache.put("b", [{"map_type": "Roughness", "path": second}])
+
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a")[0]["map_type"] == "Roughness"
+    cache.put("c", [{"map_type": "Normal", "path": third}])
+
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["bytes"] == 200
+
+
+def test_cache_index_survives_a_restart(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache.put("a", [{"map_type": "Metallic", "path": write_map(tmp_path / "metal.png", 10)}])
+
+    reopened = ResultCache(str(tmp_path / "cache"))
+
+    assert reopened.get("a")[0]["path"].endswith("Metallic.png")
+
+
+def test_caches_sharing_a_folder_share_entries_and_budget(tmp_path):
+    # Two web workers with their own ResultCache over the same folder
+    first_worker = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    second_worker = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+
+    first_worker.put("a", [{"map_type": "Roughness", "path": write_map(tmp_path / "a.png", 100)}])
+    assert second_worker.get("a")[0]["path"].endswith("Roughness.png")
+
+    # Storing a key another worker already stored keeps its entry
+    second_worker.put("a", [{"map_type": "Roughness", "path": write_map(tmp_path / "a2.png", 100)}])
+    second_worker.put("b", [{"map_type": "Roughness", "path": write_map(tmp_path / "b.png", 100)}])
+    first_worker.put("c", [{"map_type": "Roughness", "path": write_map(tmp_path / "c.png", 100)}])
+
+    # The budget holds for the folder, not per worker
+    assert first_worker.get("a") is None
+    assert second_worker.get("b") is not None
+    assert first_worker.stats()["bytes"] == 200
+    assert len([name for name in (tmp_path / "cache").iterdir() if not name.name.startswith('.')]) == 2
+
+
+def test_cache_only_removes_abandoned_temporary_entries(tmp_path):
+    (tmp_path / "cache").mkdir()
+    in_progress = tmp_path / "cache" / ".tmp-writing"
+    abandoned = tmp_path / "cache" / ".tmp-crashed"
+    in_progress.mkdir()
+    abandoned.mkdir()
+    os.utime(abandoned, (0, 0))
+
+    ResultCache(str(tmp_path / "cache"))
+
+    assert in_progress.exists()
+    assert not abandoned.exists()
+
+
+def test_run_batch_restores_repeated_uploads_from_cache(tmp_path):
+    upload = cv2.imencode('.png', np.random.randint(0, 256, (300, 300, 3), dtype=np.uint8))[1].tobytes()
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    def make_task(folder_name, filename):
+        output_folder = tmp_path / folder_name
+        output_folder.mkdir()
+        return {"upload": upload, "original_filename": filename, "preferences": PREFERENCES,
+                "pbr_presets": {}, "output_folder": str(output_folder)}
+
+    first = run_batch([make_task("first", "stone.png")], cache=cache)[0]
+    second = run_batch([make_task("second", "renamed.png")], cache=cache)[0]
+
+    assert "cached" not in first
+    assert second["cached"] is True
+    assert second["files"] == ["T_renamed_R.png", "T_renamed_M.png"]
+    assert (tmp_path / "second" / "T_renamed_R.png").read_bytes() == (tmp_path / "first" / "T_stone_R.png").read_bytes()
+    assert cache.stats()["hits"] == 1
+
+
+def test_run_batch_restores_previews_from_cache(tmp_path):
+    upload = cv2.imencode('.png', np.random.randint(0, 256, (300, 300, 3), dtype=np.uint8))[1].tobytes()
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    def make_task(folder_name):
+        output_folder = tmp_path / folder_name
+        (output_folder / "previews").mkdir(parents=True)
+        return {"upload": upload, "original_filename": "stone.png", "preferences": PREFERENCES, "pbr_presets": {},
+                "output_folder": str(output_folder), "preview_folder": str(output_folder / "previews")}
+
+    first = run_batch([make_task("first")], cache=cache)[0]
+    second = run_batch([make_task("second")], cache=cache)[0]
+
+    assert second["cached"] is True
+    assert [saved["preview"] for saved in second["maps"]] == ["T_stone_R.webp", "T_stone_M.webp"]
+    for saved in first["maps"]:
+        first_preview = (tmp_path / "first" / "previews" / saved["preview"]).read_bytes()
+        assert (tmp_path / "second" / "previews" / saved["preview"]).read_bytes() == first_preview
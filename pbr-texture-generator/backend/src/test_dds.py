@@ -0,0 +1,154 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from src.dds import BLOCK_BYTES, encode_dds
+from src.image_processing import ImageProcessor
+from src.maps import ConstantMap
+from src.pipeline import process_texture
+from src.tiled_processing import TILED_EXPORT_RESOLUTION
+
+
+def read_header(data):
+    height, width, linear_size, _, mip_count = struct.unpack_from('<IIIII', data, 12)
+    return {"magic": data[:4], "size": struct.unpack_from('<I', data, 4)[0], "width": width, "height": height,
+            "linear_size": linear_size, "mip_count": mip_count, "fourcc": data[84:88]}
+
+
+def decode_bc4(blocks):
+    # Reference decoder of the 8 value mode, returns N x 16 values
+    high, low = blocks[:, 0].astype(float), blocks[:, 1].astype(float)
+    palette = np.stack([high, low] + [((7 - i) * high + i * low) / 7 for i in range(1, 7)], axis=1)
+    bits = sum(blocks[:, 2 + i].astype(np.uint64) << np.uint64(8 * i) for i in range(6))
+    indices = (bits[:, None] >> (np.arange(16, dtype=np.uint64) * np.uint64(3))) & np.uint64(7)
+    return np.take_along_axis(palette, indices.astype(int), axis=1)
+
+
+def decode_bc1(blocks):
+    # Reference decoder of the four colour mode, returns N x 16 x 3 RGB
+    def expand(packed):
+        red, green, blue = (packed >> 11) & 31, (packed >> 5) & 63, packed & 31
+        return np.stack([(red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)], 1)
+
+    color0 = expand(blocks[:, 0:2].copy().view('<u2')[:, 0].astype(int)).astype(float)
+    color1 = expand(blocks[:, 2:4].copy().view('<u2')[:, 0].astype(int)).astype(float)
+    palette = np.stack([color0, color1, (2 * color0 + color1) / 3, (color0 + 2 * color1) / 3], axis=1)
+    bits = blocks[:, 4:8].copy().view('<u4')[:, 0]
+    indices = (bits[:, None] >> (np.arange(16, dtype=np.uint32) * 2)) & 3
+    return np.take_along_axis(palette, indices.astype(int)[..., None].repeat(3, axis=2), axis=1)
+
+
+def top_level_blocks(data, width, height, compression):
+    count = ((width + 3) // 4) * ((height + 3) // 4)
+    size = BLOCK_BYTES[compression]
+    return np.frombuffer(data, dtype=np.uint8, count=count * size, offset=128).reshape(count, size)
+
+
+def image_blocks(image):
+    # N x 16 (x C) view of the 4x4 blocks, for sides that are multiples of 4
+    height, width = image.shape[:2]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    blocks = image.reshape(height // 4, 4, width // 4, 4, channels).transpose(0, 2, 1, 3, 4).reshape(-1, 16, channels)
+    return blocks if image.ndim == 3 else blocks[..., 0]
+
+
+@pytest.fixture
+def smooth_image():
+    rng = np.random.default_rng(3)
+    return cv2.GaussianBlur(rng.integers(0, 256, (64, 96, 3), dtype=np.uint8), (9, 9), 0)
+
+
+@pytest.mark.parametrize("width, height, mip_count", [(96, 64, 7), (257, 300, 9), (1, 1, 1)])
+def test_header_and_mip_chain_sizes(width, height, mip_count):
+    image = np.zeros((height, width), dtype=np.uint8)
+
+    data = encode_dds(image)
+    header = read_header(data)
+
+    assert header["magic"] == b'DDS ' and header["size"] == 124
+    assert (header["width"], header["height"], header["mip_count"]) == (width, height, mip_count)
+    assert header["fourcc"] == b'ATI1'
+
+    expected_size = 0
+    for level in range(mip_count):
+        level_width, level_height = max(width >> level, 1), max(height >> level, 1)
+        expected_size += ((level_width + 3) // 4) * ((level_height + 3) // 4) * BLOCK_BYTES["BC4"]
+    assert header["linear_size"] == ((width + 3) // 4) * ((height + 3) // 4) * 8
+    assert len(data) == 128 + expected_size
+
+
+def test_bc4_stays_within_one_palette_step(smooth_image):
+    values = smooth_image[..., 1]
+
+    decoded = decode_bc4(top_level_blocks(encode_dds(values, "BC4"), 96, 64, "BC4"))
+    blocks = image_blocks(values).astype(float)
+
+    block_range = blocks.max(axis=1, keepdims=True) - blocks.min(axis=1, keepdims=True)
+    assert (np.abs(decoded - blocks) <= block_range / 14 + 0.5).all()
+
+
+def test_bc1_error_is_bounded(smooth_image):
+    decoded = decode_bc1(top_level_blocks(encode_dds(smooth_image, "BC1"), 96, 64, "BC1"))
+    # Blocks are stored as RGB, OpenCV keeps BGR
+    blocks = image_blocks(smooth_image[..., ::-1].copy()).astype(float)
+
+    assert np.sqrt(((decoded - blocks) ** 2).mean()) < 8
+    assert np.abs(decoded - blocks).max() < 48
+
+
+def test_bc1_keeps_flat_colours_exact_to_565():
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    image[:] = (24, 200, 96)
+
+    decoded = decode_bc1(top_level_blocks(encode_dds(image, "BC1", mipmaps=False), 8, 8, "BC1"))
+
+    assert np.abs(decoded - [96, 200, 24]).max() <= 4
+
+
+def test_bc5_stores_red_and_green(smooth_image):
+    data = encode_dds(smooth_image, "BC5", mipmaps=False)
+    blocks = top_level_blocks(data, 96, 64, "BC5")
+
+    assert read_header(data)["fourcc"] == b'ATI2'
+    for half, channel in ((slice(0, 8), 2), (slice(8, 16), 1)):
+        expected = image_blocks(smooth_image[..., channel].copy()).astype(float)
+        assert np.abs(decode_bc4(blocks[:, half]) - expected).max() <= 255 / 14 + 0.5
+
+
+def test_encode_image_picks_dds_formats(smooth_image):
+    bgra = np.dstack([smooth_image, smooth_image[..., 0]])
+
+    assert read_header(ImageProcessor.encode_image(smooth_image, ".dds"))["fourcc"] == b'DXT1'
+    assert read_header(ImageProcessor.encode_image(bgra, "DDS"))["fourcc"] == b'DXT5'
+    assert read_header(ImageProcessor.encode_image(smooth_image, ".dds", {"dds_compression": "BC5"}))["fourcc"] == b'ATI2'
+    assert read_header(ImageProcessor.encode_image(smooth_image, ".dds", {"dds_mipmaps": False}))["mip_count"] == 1
+
+    constant = ConstantMap((64, 96), 255)
+    assert ImageProcessor.encode_image(constant, ".dds") == encode_dds(np.full((64, 96), 255, dtype=np.uint8))
+    assert read_header(ImageProcessor.encode_image(constant, ".dds", {"dds_mipmaps": False}))["mip_count"] == 1
+
+
+@pytest.mark.parametrize("target_export_resolution", ["256x256", TILED_EXPORT_RESOLUTION])
+def test_process_texture_exports_dds(tmp_path, target_export_resolution):
+    image = np.random.default_rng(4).integers(0, 256, (300, 320, 3), dtype=np.uint8)
+    path = tmp_path / "brick.bmp"
+    cv2.imwrite(str(path), image)
+    preferences = {
+        "naming_convention": "Don't Convert",
+        "export_format": "DDS",
+        "target_export_resolution": target_export_resolution,
+        "normal_bump_workflow": "Tangent Normal Map (OpenGL)",
+        "generate_roughness": True,
+        "generate_normal": True,
+        "generate_metallic": True,
+    }
+
+    result = process_texture(str(path), "brick.bmp", preferences, {}, str(tmp_path))
+
+    assert result["error"] is None
+    fourccs = {saved["map_type"]: read_header((tmp_path / saved["filename"]).read_bytes())["fourcc"]
+               for saved in result["maps"]}
+    assert fourccs == {"Roughness": b'ATI1', "Normal": b'ATI2', "Metallic": b'ATI1'}
+    assert not list(tmp_path.glob("*.tmp.bmp"))
@@ -0,0 +1,127 @@
+import gzip
+
+import pytest
+from flask import Flask, request
+
+from src.http_cache import (IMMUTABLE_CACHE_CONTROL, PRIVATE_IMMUTABLE_CACHE_CONTROL, PageCache, StaticAssets,
+                            content_hash)
+from src.workspace import create_workspace, processed_folder, write_manifest
+
+
+@pytest.fixture
+def static_app(tmp_path):
+    static_folder = tmp_path / "static"
+    static_folder.mkdir()
+    (static_folder / "styles.css").write_text("body { color: #333; }\n" * 200)
+    (static_folder / "background.gif").write_bytes(b"GIF89a" + bytes(range(256)) * 64)
+
+    app = Flask(__name__)
+    assets = StaticAssets(str(static_folder))
+    pages = PageCache()
+    renders = []
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        return assets.response(request, filename)
+
+    @app.route('/page')
+    def page():
+        def render():
+            renders.append(1)
+            return "<html>" + "documentation " * 500 + "</html>"
+        return pages.response(request, "page", render)
+
+    return app.test_client(), assets, renders
+
+
+def test_pages_render_once_and_revalidate(static_app):
+    client, _, renders = static_app
+
+    first = client.get('/page')
+    assert first.status_code == 200
+    assert 'no-cache' in first.headers['Cache-Control']
+    assert first.headers['Last-Modified']
+
+    repeat = client.get('/page', headers={"If-None-Match": first.headers['ETag']})
+    assert repeat.status_code == 304
+    assert len(renders) == 1
+
+
+def test_pages_are_sent_gzipped_when_accepted(static_app):
+    client, _, _ = static_app
+
+    plain = client.get('/page')
+    compressed = client.get('/page', headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+
+
+def test_static_files_are_immutable_only_at_their_current_version(static_app):
+    client, assets, _ = static_app
+    version = assets.version("styles.css")
+
+    current = client.get(f'/assets/styles.css?v={version}', headers={"Accept-Encoding": "gzip"})
+    outdated = client.get('/assets/styles.css?v=0000', headers={"Accept-Encoding": "gzip"})
+
+    assert current.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert current.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(current.data) == b"body { color: #333; }\n" * 200
+    assert 'immutable' not in outdated.headers['Cache-Control']
+
+
+def test_compressed_formats_stream_from_disk_with_content_etag(static_app):
+    client, assets, _ = static_app
+    version = assets.version("background.gif")
+
+    response = client.get(f'/assets/background.gif?v={version}', headers={"Accept-Encoding": "gzip"})
+    repeat = client.get('/assets/background.gif', headers={"If-None-Match": f'"{version}"'})
+    partial = client.get('/assets/background.gif', headers={"Range": "bytes=0-5"})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == f'"{version}"'
+    assert version == content_hash(response.data)
+    assert repeat.status_code == 304
+    assert partial.status_code == 206 and partial.data == b"GIF89a"
+
+
+def test_app_serves_cached_pages_and_hashed_static_urls():
+    from app import app
+
+    client = app.test_client()
+    page = client.get('/faqs')
+    assert page.status_code == 200
+    assert b"/static/styles.css?v=" in page.data
+    assert client.get('/faqs', headers={"If-None-Match": page.headers['ETag']}).status_code == 304
+
+
+def test_processed_maps_are_immutable_once_the_manifest_is_written(tmp_path, monkeypatch):
+    from app import WORKSPACE_FOLDER, app
+
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    workspace_id, workspace_path = create_workspace(WORKSPACE_FOLDER)
+    content = bytes(range(256)) * 1024
+    with open(f"{processed_folder(workspace_path)}/brick_Normal.dds", 'wb') as file:
+        file.write(content)
+    url = f'/processed/{workspace_id}/brick_Normal.dds'
+
+    processing = client.get(url)
+    assert 'no-cache' in processing.headers['Cache-Control']
+
+    write_manifest(workspace_path, [{"source": "brick.png", "error": None,
+                                     "maps": [{"map_type": "Normal", "filename": "brick_Normal.dds"}]}])
+
+    final = client.get(url)
+    assert final.headers['ETag'] == f'"{content_hash(content)}"'
+    assert final.headers['Cache-Control'] == PRIVATE_IMMUTABLE_CACHE_CONTROL
+    assert final.data == content
+
+    assert client.get(url, headers={"If-None-Match": final.headers['ETag']}).status_code == 304
+
+    partial = client.get(url, headers={"Range": "bytes=1024-2047"})
+    assert partial.status_code == 206
+    assert partial.data == content[1024:2048]
+    assert partial.headers['Content-Range'] == f"bytes 1024-2047/{len(content)}"
@@ -0,0 +1,271 @@
+import io
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from src.image_processing import ImageProcessor
+from src.maps import ConstantMap
+
+
+def encode(image: np.ndarray, extension: str = '.png') -> bytes:
+    return cv2.imencode(extension, image)[1].tobytes()
+
+
+def test_pre_process_check_returns_rgb_image(tmp_path):
+    bgr_image = np.zeros((300, 300, 3), dtype=np.uint8)
+    bgr_image[..., 0] = 255  # pure blue in OpenCV's BGR order
+    path = tmp_path / "blue.png"
+    path.write_bytes(encode(bgr_image))
+
+    image = ImageProcessor.pre_process_check(str(path))
+
+    assert image.shape == (300, 300, 3)
+    assert image[0, 0].tolist() == [0, 0, 255]
+
+
+def test_pre_process_check_rejects_bad_files(tmp_path):
+    wrong_extension = tmp_path / "texture.gif"
+    wrong_extension.write_bytes(b"GIF89a")
+    with pytest.raises(ValueError, match="Invalid file extension"):
+        ImageProcessor.pre_process_check(str(wrong_extension))
+
+    empty = tmp_path / "empty.png"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError, match="File size is 0"):
+        ImageProcessor.pre_process_check(str(empty))
+
+
+def test_decode_image_validation():
+    with pytest.raises(ValueError, match="Failed to read the image"):
+        ImageProcessor.decode_image(b"definitely not an image")
+
+    with pytest.raises(ValueError, match="too small"):
+        ImageProcessor.decode_image(encode(np.zeros((100, 300, 3), dtype=np.uint8)))
+
+
+def test_decode_image_ignores_exif_orientation():
+    image = np.random.randint(0, 256, (500, 300, 3), dtype=np.uint8)
+    jpeg = encode(image, ".jpg")
+    # EXIF segment with orientation 6 (rotate 90 degrees clockwise), inserted right after the SOI marker
+    tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1) + struct.pack("<HHIHH", 0x0112, 3, 1, 6, 0) + b"\x00" * 4
+    exif = b"Exif\x00\x00" + tiff
+    rotated_jpeg = jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif + jpeg[2:]
+    assert cv2.imdecode(np.frombuffer(rotated_jpeg, dtype=np.uint8), cv2.IMREAD_COLOR).shape[:2] == (300, 500)
+
+    decoded = ImageProcessor.decode_image(rotated_jpeg)
+
+    assert decoded.shape == (500, 300, 3)
+
+
+def test_resize_and_crop_center_crops_large_images():
+    image = np.zeros((600, 600, 3), dtype=np.uint8)
+    image[44:556, 44:556] = 200  # centre 512x512 block
+
+    resized = ImageProcessor.resize_and_crop(image, target_size=(512, 512))
+
+    assert resized.shape == (512, 512, 3)
+    assert (resized == 200).all()
+
+
+def test_resize_and_crop_scales_small_images_up():
+    image = np.random.randint(0, 256, (300, 280, 3), dtype=np.uint8)
+
+    resized = ImageProcessor.resize_and_crop(image, target_size=(1024, 512))
+
+    assert resized.shape == (512, 1024, 3)
+
+
+def test_make_proxy_matches_a_downscaled_resize_and_crop():
+    image = np.zeros((1200, 1600, 3), dtype=np.uint8)
+    image[:, 800:] = 255  # right half white, the 1024x512 centre crop is split down the middle
+
+    proxy = ImageProcessor.make_proxy(image, target_size=(1024, 512), max_side=256)
+    full = cv2.resize(ImageProcessor.resize_and_crop(image, target_size=(1024, 512)), (256, 128),
+                      interpolation=cv2.INTER_AREA)
+
+    assert proxy.shape == (128, 256, 3)
+    assert np.abs(proxy.astype(int) - full.astype(int)).max() <= 1
+    assert ImageProcessor.make_proxy(image, target_size=(128, 128), max_side=256).shape == (128, 128, 3)
+
+
+def test_pre_process_check_accepts_bytes_and_streams():
+    encoded = encode(np.random.randint(0, 256, (300, 300, 3), dtype=np.uint8))
+
+    from_bytes = ImageProcessor.pre_process_check(encoded, filename="stone.png")
+    from_stream = ImageProcessor.pre_process_check(io.BytesIO(encoded), filename="stone.png")
+
+    assert np.array_equal(from_bytes, from_stream)
+    with pytest.raises(ValueError, match="Invalid file extension"):
+        ImageProcessor.pre_process_check(encoded)
+
+
+@pytest.fixture
+def image_stack():
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 256, (4, 64, 80, 3), dtype=np.uint8)
+    stack[1] = 90  # flat image, zero range
+    stack[2] = stack[2] // 4 + 60  # narrow range
+    return stack
+
+
+@pytest.mark.parametrize("intensity_factor", [1.0, 1.3])
+def test_greyscale_adjust_batch_matches_single_image(image_stack, intensity_factor):
+    expected = np.stack([ImageProcessor.greyscale_adjust(image, intensity_factor) for image in image_stack])
+
+    assert np.array_equal(ImageProcessor.greyscale_adjust_batch(image_stack, intensity_factor), expected)
+
+
+def test_apply_roughness_to_batch_matches_single_image(image_stack):
+    greyscale = ImageProcessor.greyscale_adjust_batch(image_stack)
+    expected = np.stack([ImageProcessor.apply_roughness_to_image(image, 30) for image in greyscale])
+
+    assert np.array_equal(ImageProcessor.apply_roughness_to_batch(greyscale, 30), expected)
+
+
+@pytest.mark.parametrize("normal_configuration", ["Normal Map", "Bump Map"])
+def test_generate_normal_map_batch_matches_single_image(image_stack, normal_configuration):
+    expected = np.stack([ImageProcessor.generate_normal_map(image, normal_configuration) for image in image_stack])
+
+    assert np.array_equal(ImageProcessor.generate_normal_map_batch(image_stack, normal_configuration), expected)
+
+
+def reference_greyscale_adjust(image, intensity_factor=1.0, grey_factor=0.5):
+    # The original float implementation the lookup table has to reproduce
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    grey = cv2.normalize(grey.astype(np.float32), None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+    grey = cv2.convertScaleAbs(grey * intensity_factor)
+    return cv2.addWeighted(grey, 1 - grey_factor, np.full_like(grey, 128), grey_factor, 0)
+
+
+@pytest.mark.parametrize("intensity_factor", [0.5, 1.0, 1.3])
+def test_greyscale_adjust_lookup_table_matches_reference(image_stack, intensity_factor):
+    for image in image_stack:
+        expected = reference_greyscale_adjust(image, intensity_factor)
+        assert np.array_equal(ImageProcessor.greyscale_adjust(image, intensity_factor), expected)
+
+
+def test_greyscale_adjust_folds_in_roughness(image_stack):
+    for image in image_stack:
+        expected = ImageProcessor.apply_roughness_to_image(ImageProcessor.greyscale_adjust(image), 35)
+        assert np.array_equal(ImageProcessor.greyscale_adjust(image, roughness=35), expected)
+
+
+def test_tangent_normal_map_is_flat_for_flat_images():
+    flat = np.full((300, 300, 3), 90, dtype=np.uint8)
+
+    normal_map = ImageProcessor.generate_tangent_normal_map(flat, strength=5.0)
+
+    # Straight up: X and Y at the midpoint, Z at full length (blue, red and green in cv2.imwrite order)
+    assert (normal_map == [255, 128, 128]).all()
+
+
+def test_tangent_normal_map_has_unit_normals_and_respects_strength():
+    # Brightness ramp rising to the right, so the surface tilts towards -X
+    ramp = np.tile(np.linspace(0, 255, 256, dtype=np.float32), (64, 1)).astype(np.uint8)
+    image = np.dstack([ramp] * 3)
+
+    weak = ImageProcessor.generate_tangent_normal_map(image, strength=1.0)
+    strong = ImageProcessor.generate_tangent_normal_map(image, strength=50.0)
+
+    for normal_map in (weak, strong):
+        vectors = (normal_map.astype(np.float32) - 127.5) / 127.5
+        assert np.allclose(np.linalg.norm(vectors, axis=2), 1.0, atol=0.01)
+    assert strong[32, 128, 2] < weak[32, 128, 2] < 128
+    assert strong[32, 128, 0] < weak[32, 128, 0]
+
+
+def test_tangent_normal_map_strips_match_a_single_pass(image_stack):
+    image = np.concatenate(list(image_stack))
+
+    single_pass = ImageProcessor.generate_tangent_normal_map(image, height_levels=2, strip_rows=image.shape[0])
+    stripped = ImageProcessor.generate_tangent_normal_map(image, height_levels=2, strip_rows=7)
+
+    assert np.array_equal(stripped, single_pass)
+
+
+@pytest.mark.parametrize("shape", [(64, 80), (63, 81)])
+def test_make_tiling_handles_greyscale_images(shape):
+    image = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+
+    tiled = ImageProcessor.make_tiling(image)
+    tiled_color = ImageProcessor.make_tiling(np.dstack([image] * 3))
+
+    assert tiled.shape == image.shape and tiled.dtype == np.uint8
+    assert np.array_equal(tiled, tiled_color[..., 0])
+
+
+@pytest.mark.parametrize("keep_uint8", [True, False])
+def test_make_tiling_seams_only_blends_the_band(keep_uint8):
+    rng = np.random.default_rng(1)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (301, 258, 3), dtype=np.uint8), (9, 9), 0)
+    swapped = np.roll(image, (-150, -129), axis=(0, 1))
+
+    tiled = ImageProcessor.make_tiling_seams(image, band_width=16, keep_uint8=keep_uint8)
+
+    assert tiled.shape == image.shape and tiled.dtype == np.uint8
+    # Outside the bands the swapped image is left untouched
+    assert np.array_equal(tiled[:135, :113], swapped[:135, :113])
+    assert np.array_equal(tiled[167:, 145:], swapped[167:, 145:])
+    # On the seams the original, continuous image shows through
+    assert np.abs(tiled[151].astype(int) - tiled[150]).mean() < np.abs(swapped[151].astype(int) - swapped[150]).mean() / 3
+    assert np.abs(tiled[:, 129].astype(int) - tiled[:, 128]).mean() < np.abs(swapped[:, 129].astype(int) - swapped[:, 128]).mean() / 3
+
+
+@pytest.mark.parametrize("extension, encoder_settings", [
+    (".png", {"png_compression": 9, "png_strategy": "rle"}),
+    (".webp", {"webp_lossless": True}),
+])
+def test_encode_image_lossless_formats_round_trip(extension, encoder_settings):
+    image = np.random.default_rng(2).integers(0, 256, (64, 80), dtype=np.uint8)
+
+    encoded = ImageProcessor.encode_image(image[..., None], extension, encoder_settings)
+
+    # WebP has no greyscale mode, so compare the decoded luminance
+    assert np.array_equal(cv2.imdecode(np.frombuffer(encoded, dtype=np.uint8), cv2.IMREAD_GRAYSCALE), image)
+
+
+def test_encoder_parameters_apply_settings():
+    jpeg = ImageProcessor.encoder_parameters("JPG", {"jpeg_quality": 70, "jpeg_progressive": True})
+    lossy_webp = ImageProcessor.encoder_parameters(".webp", {"webp_lossless": False, "webp_quality": 80})
+
+    assert jpeg == [cv2.IMWRITE_JPEG_QUALITY, 70, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+    assert lossy_webp == [cv2.IMWRITE_WEBP_QUALITY, 80]
+    assert ImageProcessor.encoder_parameters(".bmp") == []
+
+
+def test_pack_channels_orders_channels_for_opencv():
+    roughness = np.full((260, 270), 90, dtype=np.uint8)
+    metallic = ImageProcessor.generate_metallic(roughness, is_metallic=1)
+
+    packed = ImageProcessor.pack_channels([255, roughness, metallic, roughness // 2])
+
+    assert packed.shape == (260, 270, 4)
+    # Red = occlusion, green = roughness, blue = metallic, stored blue first
+    assert packed[0, 0].tolist() == [255, 90, 255, 45]
+
+
+def test_make_preview_keeps_aspect_ratio_and_drops_packed_alpha():
+    packed = np.random.default_rng(7).integers(0, 256, (1000, 2000, 4), dtype=np.uint8)
+
+    preview = ImageProcessor.make_preview(packed, max_side=256)
+
+    assert preview.shape == (128, 256, 3)
+    assert preview.flags.c_contiguous
+    assert ImageProcessor.make_preview(np.zeros((100, 60), dtype=np.uint8)).shape == (100, 60)
+    assert ImageProcessor.make_preview(ConstantMap((4096, 2048), 255), max_side=64).tolist() == [[255] * 32] * 64
+
+
+@pytest.mark.parametrize("preview_format", ["webp", "jpg"])
+def test_save_preview_image_writes_a_small_lossy_preview(tmp_path, preview_format):
+    normal = cv2.GaussianBlur(np.random.default_rng(8).integers(0, 256, (1024, 1024, 3), dtype=np.uint8), (5, 5), 0)
+
+    preview_filename = ImageProcessor.save_preview_image(str(tmp_path), "T_brick_N.dds", normal,
+                                                         {"preview_format": preview_format})
+
+    assert preview_filename == f"T_brick_N.{preview_format}"
+    data = (tmp_path / preview_filename).read_bytes()
+    decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    assert decoded.shape == (256, 256, 3)
+    assert len(data) < 256 * 256 * 3 / 4
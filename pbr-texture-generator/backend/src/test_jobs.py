@@ -0,0 +1,86 @@
+import time
+
+import cv2
+import numpy as np
+
+from src.jobs import JobManager
+
+
+PREFERENCES = {
+    "manual_material_selection": "Aluminum",
+    "target_export_resolution": "256x256",
+    "generate_roughness": True,
+    "generate_metallic": True,
+}
+
+
+def wait_for_job(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("Job did not finish in time")
+
+
+def make_task(filepath, filename, output_folder):
+    return {
+        "upload": str(filepath),
+        "original_filename": filename,
+        "preferences": PREFERENCES,
+        "pbr_presets": {},
+        "output_folder": str(output_folder)
+    }
+
+
+def test_job_reports_per_file_progress(tmp_path):
+    good_path = tmp_path / "stone.png"
+    cv2.imwrite(str(good_path), np.random.randint(0, 256, (300, 300, 3), dtype=np.uint8))
+    bad_path = tmp_path / "broken.png"
+    bad_path.write_bytes(b"not an image")
+
+    manager = JobManager(processing_workers=1)
+    job_id = manager.submit([
+        make_task(good_path, "stone.png", tmp_path),
+        make_task(bad_path, "broken.png", tmp_path),
+    ])
+
+    job = wait_for_job(manager, job_id)
+
+    assert job["status"] == "done"
+    assert job["progress"] == {"completed": 2, "total": 2}
+    assert [entry["status"] for entry in job["files"]] == ["done", "failed"]
+    assert len(job["outputs"]) == 2
+    assert job["errors"][0]["file"] == "broken.png"
+
+
+def test_job_fails_when_every_file_fails(tmp_path):
+    bad_path = tmp_path / "broken.png"
+    bad_path.write_bytes(b"not an image")
+
+    manager = JobManager(processing_workers=1)
+    job = wait_for_job(manager, manager.submit([make_task(bad_path, "broken.png", tmp_path)]))
+
+    assert job["status"] == "failed"
+
+
+def test_unknown_job():
+    assert JobManager().get("missing") is None
+
+
+def test_job_state_is_published_until_it_finishes(tmp_path):
+    good_path = tmp_path / "stone.png"
+    cv2.imwrite(str(good_path), np.random.randint(0, 256, (300, 300, 3), dtype=np.uint8))
+    updates = []
+
+    manager = JobManager(processing_workers=1)
+    job_id = manager.submit([make_task(good_path, "stone.png", tmp_path)], on_update=updates.append)
+    job = wait_for_job(manager, job_id)
+
+    # The last update is published right after the job finished, what other workers read once the job is done
+    deadline = time.time() + 5
+    while updates[-1]["status"] != "done" and time.time() < deadline:
+        time.sleep(0.05)
+    assert updates[0]["status"] == "queued"
+    assert updates[-1] == job
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from src.image_processing import ImageProcessor
+from src import maps
+from src.maps import ConstantMap
+
+
+def test_constant_map_encodes_once_per_size_and_value():
+    first = ConstantMap((300, 280), 255).encode(".png")
+    again = ConstantMap((300, 280, 3), 255).encode("PNG")
+
+    assert first is again
+    decoded = cv2.imdecode(np.frombuffer(first, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    assert decoded.shape == (300, 280)
+    assert (decoded == 255).all()
+
+
+def test_constant_map_cache_is_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(maps, "CONSTANT_ENCODE_CACHE_BYTES", 1024 * 1024)
+
+    # Uncompressed BMPs of a constant map are as large as the pixels, too large to keep
+    bmp = ConstantMap((1024, 1024), 128).encode(".bmp")
+    assert len(bmp) > 1024 * 1024
+    assert ConstantMap((1024, 1024), 128).encode(".bmp") is not bmp
+
+    small = [ConstantMap((500, 500), value).encode(".bmp") for value in range(6)]
+    assert maps._encoded_constants_bytes <= 1024 * 1024
+    assert ConstantMap((500, 500), 5).encode(".bmp") is small[5]
+    assert ConstantMap((500, 500), 0).encode(".bmp") is not small[0]
+
+
+def test_constant_map_array_view_does_not_allocate_pixels():
+    array = ConstantMap((2048, 2048), 7).to_array()
+
+    assert array.shape == (2048, 2048) and array.dtype == np.uint8
+    assert array.strides == (0, 0)
+    assert (array == 7).all()
+
+
+def test_generate_metallic_saves_a_single_channel_constant(tmp_path):
+    greyscale = np.zeros((260, 300), dtype=np.uint8)
+    saved = []
+
+    metallic = ImageProcessor.generate_metallic(greyscale, is_metallic=1)
+    ImageProcessor.save_output_image(str(tmp_path), saved, "brick_Metallic.jpg", metallic)
+
+    assert isinstance(metallic, ConstantMap)
+    assert saved == ["brick_Metallic.jpg"]
+    written = cv2.imread(str(tmp_path / "brick_Metallic.jpg"), cv2.IMREAD_UNCHANGED)
+    assert written.shape == (260, 300)
+    assert (written == 255).all()
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.metrics import MetricsRegistry, StageTimer, record_result, registry, timed_iterator
+from src.pipeline import process_texture, run_batch
+
+
+def test_histogram_renders_cumulative_buckets():
+    metrics = MetricsRegistry()
+    latency = metrics.histogram("stage_seconds", "Stage latency.", (0.1, 1.0))
+
+    latency.observe(0.05, stage="normal")
+    latency.observe(0.5, stage="normal")
+    latency.observe(2.0, stage="normal")
+
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ["# HELP stage_seconds Stage latency.", "# TYPE stage_seconds histogram"]
+    assert 'stage_seconds_bucket{stage="normal",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="normal",le="1.0"} 2' in lines
+    assert 'stage_seconds_bucket{stage="normal",le="+Inf"} 3' in lines
+    assert 'stage_seconds_sum{stage="normal"} 2.55' in lines
+    assert 'stage_seconds_count{stage="normal"} 3' in lines
+
+
+def test_counters_escape_labels_and_read_callbacks():
+    metrics = MetricsRegistry()
+    metrics.counter("errors_total", "Errors.").inc(stage='say "hi"')
+    metrics.gauge("cache_entries", "Entries.", callback=lambda: 7)
+
+    rendered = metrics.render()
+
+    assert 'errors_total{stage="say \\"hi\\""} 1' in rendered
+    assert "cache_entries 7" in rendered
+
+
+def test_stage_timer_blames_the_innermost_stage():
+    timer = StageTimer()
+
+    with pytest.raises(ValueError):
+        with timer.stage("encode"):
+            with timer.stage("normal"):
+                raise ValueError("broken")
+
+    assert timer.failed_stage == "normal"
+    assert set(timer.timings) == {"encode", "normal"}
+
+
+def test_timed_iterator_observes_after_the_last_item():
+    metrics = MetricsRegistry()
+    latency = metrics.histogram("zip_seconds", "Zip latency.", (1.0,))
+
+    chunks = timed_iterator(iter([b"a", b"b"]), latency, stage="zip")
+    assert next(chunks) == b"a"
+    assert 'zip_seconds_count{stage="zip"}' not in metrics.render()
+
+    assert list(chunks) == [b"b"]
+    assert 'zip_seconds_count{stage="zip"} 1' in metrics.render()
+
+
+def test_process_texture_reports_stage_timings(tmp_path):
+    path = tmp_path / "brick.png"
+    cv2.imwrite(str(path), np.random.default_rng(5).integers(0, 256, (300, 320, 3), dtype=np.uint8))
+    preferences = {"target_export_resolution": "256x256", "make_tiling": True, "generate_roughness": True,
+                   "generate_normal": True, "generate_metallic": True}
+
+    result = process_texture(str(path), "brick.png", preferences, {}, str(tmp_path))
+
+    assert result["error"] is None
+    assert set(result["timings"]) == {"decode", "resize", "greyscale", "tiling", "normal", "metallic", "encode"}
+    assert result["input_bytes"] == path.stat().st_size
+    assert result["megapixels"] == 256 * 256 / 1e6
+
+
+def test_run_batch_records_results_and_error_stages(tmp_path):
+    bad_path = tmp_path / "broken.png"
+    bad_path.write_bytes(b"not an image")
+    before = registry.render()
+
+    results = run_batch([{"upload": str(bad_path), "original_filename": "broken.png", "preferences": {},
+                          "pbr_presets": {}, "output_folder": str(tmp_path)}])
+
+    assert results[0]["error_stage"] == "decode"
+    assert 'mapmorph_errors_total{stage="decode"}' in registry.render()
+    assert registry.render() != before
+
+
+def test_record_result_counts_cached_files_and_output_bytes():
+    record_result({"source": "a.png", "error": None, "cached": True,
+                   "maps": [{"map_type": "Roughness", "filename": "a_Roughness.png", "bytes": 10}]})
+
+    rendered = registry.render()
+    assert 'mapmorph_files_total{outcome="cached"}' in rendered
+    assert 'mapmorph_output_bytes_total{map_type="Roughness"}' in rendered
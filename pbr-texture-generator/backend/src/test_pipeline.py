@@ -0,0 +1,211 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from src.pipeline import (PROXY_SIZE, discard_executor, get_executor, preview_texture, process_texture, run_batch,
+                          shutdown_executor)
+from src.tiled_processing import TILED_EXPORT_RESOLUTION
+
+
+# Preferences matching what processing.html sends for a default batch
+PREFERENCES = {
+    "naming_convention": "Don't Convert",
+    "manual_material_selection": "Aluminum",
+    "export_format": "Don't Convert",
+    "target_export_resolution": "256x256",
+    "specular_workflow": "PBR Rough/Metallic Workflow",
+    "normal_bump_workflow": "Normal Map",
+    "generate_roughness": True,
+    "generate_metallic": True,
+    "generate_normal": True,
+}
+
+PRESETS = {"Aluminum": {"BaseColor": "#E9E9EB", "Roughness": 10, "IsMetallic": 1}}
+
+
+@pytest.fixture
+def texture_path(tmp_path):
+    # Random noise texture, big enough to pass pre_process_check
+    image = np.random.randint(0, 256, (300, 320, 3), dtype=np.uint8)
+    path = tmp_path / "brick.png"
+    cv2.imwrite(str(path), image)
+    return str(path)
+
+
+def make_task(filepath, filename, output_folder):
+    return {
+        "upload": filepath,
+        "original_filename": filename,
+        "preferences": PREFERENCES,
+        "pbr_presets": PRESETS,
+        "output_folder": str(output_folder)
+    }
+
+
+def test_process_texture_saves_all_maps(texture_path, tmp_path):
+    result = process_texture(**make_task(texture_path, "brick.png", tmp_path))
+
+    assert result["error"] is None
+    assert len(result["files"]) == 3
+    for filename in result["files"]:
+        assert (tmp_path / filename).exists()
+
+
+@pytest.mark.parametrize("tiling_mode", ["Seam Band", "Full Blur"])
+def test_process_texture_makes_greyscale_maps_tileable(texture_path, tmp_path, tiling_mode):
+    task = make_task(texture_path, "brick.png", tmp_path)
+    task["preferences"] = dict(PREFERENCES, make_tiling=True, tiling_mode=tiling_mode, tiling_band_width=16)
+
+    result = process_texture(**task)
+
+    assert result["error"] is None
+    assert len(result["files"]) == 3
+
+
+def test_process_texture_reports_encode_stats(texture_path, tmp_path):
+    task = make_task(texture_path, "brick.png", tmp_path)
+    task["preferences"] = dict(PREFERENCES, export_format="JPG")
+    task["encoder_settings"] = {"jpeg_quality": 80}
+
+    result = process_texture(**task)
+
+    assert result["error"] is None
+    for saved in result["maps"]:
+        assert saved["filename"].endswith(".JPG")
+        assert saved["bytes"] == (tmp_path / saved["filename"]).stat().st_size
+        assert saved["encode_ms"] >= 0
+
+
+@pytest.mark.parametrize("channel_packing, pbr_preset, map_type, layout", [
+    ("ORM", None, "ORM", ["Occlusion", "Roughness", "Metallic"]),
+    ("Engine Default", "Unity Engine", "MaskMap", ["Metallic", "Occlusion", "DetailMask", "Smoothness"]),
+])
+def test_process_texture_packs_scalar_maps(texture_path, tmp_path, channel_packing, pbr_preset, map_type, layout):
+    task = make_task(texture_path, "brick.png", tmp_path)
+    task["preferences"] = dict(PREFERENCES, channel_packing=channel_packing, pbr_preset=pbr_preset)
+
+    result = process_texture(**task)
+
+    assert result["error"] is None
+    assert [saved["map_type"] for saved in result["maps"]] == [map_type, "Normal"]
+    packed = cv2.imread(str(tmp_path / result["maps"][0]["filename"]), cv2.IMREAD_UNCHANGED)
+    assert packed.shape == (256, 256, len(layout))
+
+    # Aluminum is metallic, and no occlusion is generated yet
+    channels = dict(zip(layout, cv2.split(packed)[2::-1] + cv2.split(packed)[3:]))
+    assert (channels["Metallic"] == 255).all()
+    assert (channels["Occlusion"] == 255).all()
+
+
+def test_process_texture_reports_error(tmp_path):
+    bad_path = tmp_path / "broken.png"
+    bad_path.write_bytes(b"not an image")
+
+    result = process_texture(**make_task(str(bad_path), "broken.png", tmp_path))
+
+    assert result["files"] == []
+    assert "Failed to read the image" in result["error"]
+
+
+def test_run_batch_keeps_submission_order(texture_path, tmp_path):
+    bad_path = tmp_path / "broken.png"
+    bad_path.write_bytes(b"not an image")
+    tasks = [
+        make_task(texture_path, "first.png", tmp_path),
+        make_task(str(bad_path), "broken.png", tmp_path),
+        make_task(texture_path, "third.png", tmp_path),
+    ]
+
+    try:
+        results = run_batch(tasks, max_workers=2)
+    finally:
+        shutdown_executor()
+
+    assert [result["source"] for result in results] == ["first.png", "broken.png", "third.png"]
+    assert results[0]["error"] is None and results[2]["error"] is None
+    assert results[1]["error"] is not None
+
+
+def test_shared_executor_is_created_once_and_only_the_broken_pool_is_discarded():
+    try:
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            executors = list(threads.map(lambda _: get_executor(2), range(8)))
+        assert all(executor is executors[0] for executor in executors)
+
+        # A batch whose pool broke after another batch replaced it must not drop the replacement
+        discard_executor(executors[0])
+        replacement = get_executor(2)
+        discard_executor(executors[0])
+        assert get_executor(2) is replacement
+    finally:
+        shutdown_executor()
+
+
+@pytest.mark.parametrize("target_export_resolution, preview_shape", [
+    ("256x256", (256, 256)),
+    (TILED_EXPORT_RESOLUTION, (240, 256)),
+])
+def test_process_texture_saves_a_preview_of_every_map(texture_path, tmp_path, target_export_resolution, preview_shape):
+    previews = tmp_path / "previews"
+    previews.mkdir()
+    preferences = dict(PREFERENCES, target_export_resolution=target_export_resolution)
+
+    result = process_texture(texture_path, "brick.png", preferences, PRESETS, str(tmp_path), preview_folder=str(previews))
+
+    assert result["error"] is None
+    assert [saved["preview"] for saved in result["maps"]] == ["T_brick_R.webp", "T_brick_N.webp", "T_brick_M.webp"]
+    for saved in result["maps"]:
+        preview = cv2.imread(str(previews / saved["preview"]), cv2.IMREAD_UNCHANGED)
+        assert preview.shape[:2] == preview_shape
+    assert "preview" in result["timings"]
+
+
+def test_preview_texture_renders_previews_from_a_reused_proxy(texture_path, tmp_path):
+    preferences = dict(PREFERENCES, target_export_resolution="2048x1024", make_tiling=True)
+    proxies = tmp_path / "proxies"
+
+    first = preview_texture(texture_path, "brick.png", preferences, PRESETS, str(tmp_path / "first"), str(proxies))
+    second = preview_texture(texture_path, "brick.png", dict(preferences, normal_bump_workflow="Bump Map"), PRESETS,
+                             str(tmp_path / "second"), str(proxies))
+
+    assert first["error"] is None and second["error"] is None
+    assert "decode" in first["timings"] and "proxy" in first["timings"] and "proxy" not in second["timings"]
+    assert len(list(proxies.iterdir())) == 1
+    assert [saved["map_type"] for saved in second["maps"]] == ["Roughness", "Normal", "Metallic"]
+    for saved in second["maps"]:
+        # Only previews are written, at the proxy size with the aspect ratio of the export
+        assert "bytes" not in saved
+        preview = cv2.imread(str(tmp_path / "second" / saved["preview"]))
+        assert preview.shape[:2] == (PROXY_SIZE // 2, PROXY_SIZE)
+    assert sorted(path.name for path in (tmp_path / "second").iterdir()) == sorted(saved["preview"] for saved in second["maps"])
+
+
+def test_preview_texture_reads_tiled_sources_beyond_the_regular_size_limit(tmp_path):
+    # Over the 15 MB limit of pre_process_check, well within the tiled limits
+    rng = np.random.default_rng(0)
+    path = tmp_path / "scan.bmp"
+    cv2.imwrite(str(path), rng.integers(0, 256, (2400, 2300, 3), dtype=np.uint8))
+    assert path.stat().st_size > 15 * 1024 * 1024
+    preferences = dict(PREFERENCES, target_export_resolution=TILED_EXPORT_RESOLUTION)
+
+    result = preview_texture(str(path), "scan.bmp", preferences, PRESETS, str(tmp_path / "previews"),
+                             str(tmp_path / "proxies"))
+
+    assert result["error"] is None
+    assert [saved["map_type"] for saved in result["maps"]] == ["Roughness", "Normal", "Metallic"]
+    for saved in result["maps"]:
+        preview = cv2.imread(str(tmp_path / "previews" / saved["preview"]))
+        assert preview.shape[:2] == (PROXY_SIZE, round(PROXY_SIZE * 2300 / 2400))
+
+
+def test_preview_texture_reports_error(tmp_path):
+    path = tmp_path / "broken.png"
+    path.write_bytes(b"not an image")
+
+    result = preview_texture(str(path), "broken.png", PREFERENCES, PRESETS, str(tmp_path / "previews"),
+                             str(tmp_path / "proxies"))
+
+    assert result["maps"] == [] and result["error"]
+    assert result["error_stage"] == "decode"
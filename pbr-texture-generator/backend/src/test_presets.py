@@ -0,0 +1,42 @@
+import os
+
+from src.presets import PresetRegistry
+
+
+CSV_HEADER = "Material,BaseColor,Roughness,IsMetallic\n"
+
+
+def write_csv(path, rows, mtime=None):
+    path.write_text(CSV_HEADER + "".join(rows))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_presets_are_parsed_and_indexed(tmp_path):
+    write_csv(tmp_path / "preset_unreal.csv", ["Gold,#FFE29B,20,1\n"])
+    write_csv(tmp_path / "preset_unity.csv", ["Gold,#FFE29B,30,1\n", "Brick,#AA4A44,80,0\n"])
+
+    registry = PresetRegistry(str(tmp_path))
+
+    gold = registry.get("Gold", "Unreal Engine")
+    assert gold["Roughness"] == 20
+    assert gold["RoughnessFactor"] == 0.2
+    assert gold["BaseColorRGB"] == [255, 226, 155]
+    assert gold["Metallic"] is True
+    assert registry.get("Gold", "Unity Engine")["Roughness"] == 30
+    assert registry.get("Brick")["IsMetallic"] == 0
+    assert set(registry.to_dict()["sources"]) == {"Unreal Engine", "Unity Engine"}
+
+
+def test_presets_reload_only_when_a_csv_changes(tmp_path):
+    path = tmp_path / "preset_unreal.csv"
+    write_csv(path, ["Gold,#FFE29B,20,1\n"], mtime=1000)
+    registry = PresetRegistry(str(tmp_path))
+    etag = registry.etag
+
+    assert registry.reload_if_changed() is False
+
+    write_csv(path, ["Gold,#FFE29B,45,1\n"], mtime=2000)
+
+    assert registry.get("Gold")["Roughness"] == 45
+    assert registry.etag != etag
@@ -0,0 +1,95 @@
+import pstats
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from src.cache import ResultCache
+from src.metrics import StageTimer
+from src.pipeline import process_texture, run_batch
+from src.profiling import PROFILE_HEADER, profiling_requested
+
+
+@pytest.fixture
+def texture_path(tmp_path):
+    path = tmp_path / "brick.png"
+    cv2.imwrite(str(path), np.random.default_rng(6).integers(0, 256, (300, 320, 3), dtype=np.uint8))
+    return str(path)
+
+
+@pytest.mark.parametrize("headers, args, admin_token, expected", [
+    ({PROFILE_HEADER: "secret"}, {}, "secret", True),
+    ({}, {"profile": "secret"}, "secret", True),
+    ({PROFILE_HEADER: "guess"}, {}, "secret", False),
+    ({PROFILE_HEADER: ""}, {}, "", False),
+    ({}, {}, "secret", False),
+])
+def test_profiling_needs_the_admin_token(headers, args, admin_token, expected):
+    assert profiling_requested(headers, args, admin_token) is expected
+
+
+def test_process_texture_saves_profile_and_stage_memory(texture_path, tmp_path):
+    profiles = tmp_path / "profiles"
+    profiles.mkdir()
+    preferences = {"target_export_resolution": "256x256", "generate_roughness": True, "generate_normal": True}
+
+    result = process_texture(texture_path, "brick.png", preferences, {}, str(tmp_path), profile_folder=str(profiles))
+
+    assert result["error"] is None
+    profile = result["profile"]
+    assert profile["profile"] == "brick.png.prof" and profile["summary"] == "brick.png.txt"
+    assert {"decode", "resize", "greyscale", "normal", "encode"} <= set(profile["memory_peaks"])
+    # The normal map of a 256x256 texture needs at least its own 3 channel output
+    assert profile["memory_peaks"]["normal"] >= 256 * 256 * 3
+    assert profile["peak_bytes"] >= max(profile["memory_peaks"].values())
+
+    stats = pstats.Stats(str(profiles / "brick.png.prof"))
+    assert any(function == "generate_tangent_normal_map" or function == "generate_normal_map"
+               for _, _, function in stats.stats)
+    assert "Peak traced memory per stage" in (profiles / "brick.png.txt").read_text()
+
+
+def test_concurrent_profiled_runs_keep_their_own_stage_peaks(texture_path, tmp_path):
+    preferences = {"target_export_resolution": "256x256", "generate_roughness": True, "generate_normal": True}
+
+    def profiled(name):
+        folder = tmp_path / name
+        folder.mkdir()
+        return process_texture(texture_path, "brick.png", preferences, {}, str(folder), profile_folder=str(folder))
+
+    with ThreadPoolExecutor(max_workers=2) as threads:
+        results = list(threads.map(profiled, ["first", "second"]))
+
+    for result in results:
+        assert result["error"] is None
+        assert result["profile"]["memory_peaks"]["normal"] >= 256 * 256 * 3
+    assert not tracemalloc.is_tracing()
+
+
+def test_unprofiled_stages_leave_the_traced_peak_alone():
+    timer = StageTimer()
+    tracemalloc.start()
+    try:
+        with timer.stage("greyscale"):
+            pass
+    finally:
+        tracemalloc.stop()
+
+    assert timer.memory_peaks == {}
+
+
+def test_profiled_tasks_skip_the_result_cache(texture_path, tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    profiles = tmp_path / "profiles"
+    profiles.mkdir()
+    task = {"upload": texture_path, "original_filename": "brick.png",
+            "preferences": {"target_export_resolution": "256x256", "generate_roughness": True},
+            "pbr_presets": {}, "output_folder": str(tmp_path)}
+
+    run_batch([task], cache=cache)
+    profiled = run_batch([dict(task, profile_folder=str(profiles))], cache=cache)
+
+    assert not profiled[0].get("cached")
+    assert profiled[0]["profile"]["profile"] == "brick.png.prof"
@@ -0,0 +1,160 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+from src import dds
+from src.dds import encode_dds
+from src.image_processing import ImageProcessor
+from src.pipeline import process_texture
+from src import tiled_processing
+from src.tiled_processing import (TILED_EXPORT_RESOLUTION, create_bmp_output, finish_output, open_strip_source,
+                                  read_image_size, read_proxy, render_normal, render_roughness)
+
+
+@pytest.fixture
+def source_image():
+    # Smoothed noise in BGR, the order the files are written in
+    rng = np.random.default_rng(0)
+    return cv2.GaussianBlur(rng.integers(0, 256, (300, 264, 3), dtype=np.uint8), (5, 5), 0)
+
+
+@pytest.mark.parametrize("extension", [".bmp", ".png"])
+def test_open_strip_source_reads_paths_and_bytes(tmp_path, source_image, extension):
+    path = tmp_path / f"scan{extension}"
+    cv2.imwrite(str(path), source_image)
+    expected = cv2.cvtColor(source_image, cv2.COLOR_BGR2RGB)
+
+    from_path = open_strip_source(str(path))
+    from_bytes = open_strip_source(path.read_bytes(), filename=path.name)
+
+    assert isinstance(from_path.pixels, np.memmap) == (extension == ".bmp")
+    assert np.array_equal(from_path.rows(0, 300), expected)
+    assert np.array_equal(from_bytes.rows(0, 300), expected)
+
+
+@pytest.mark.parametrize("extension", [".png", ".jpg"])
+def test_read_image_size_reads_the_header_only(tmp_path, source_image, extension):
+    encoded = cv2.imencode(extension, source_image)[1].tobytes()
+    path = tmp_path / f"scan{extension}"
+    path.write_bytes(encoded)
+
+    assert read_image_size(str(path)) == (264, 300)
+    # Truncated right after the header, the size is still known without the pixel data
+    assert read_image_size(encoded[:1024]) == (264, 300)
+    assert read_image_size(b"not an image") is None
+
+
+def test_open_strip_source_caps_decoded_sources_but_streams_bmp(tmp_path, source_image, monkeypatch):
+    monkeypatch.setattr(tiled_processing, "TILED_MAX_DECODED_PIXELS", 256 * 256)
+    cv2.imwrite(str(tmp_path / "scan.png"), source_image)
+    cv2.imwrite(str(tmp_path / "scan.bmp"), source_image)
+
+    with pytest.raises(ValueError, match="too large for a PNG or JPG"):
+        open_strip_source(str(tmp_path / "scan.png"))
+    assert open_strip_source(str(tmp_path / "scan.bmp")).height == 300
+
+
+@pytest.mark.parametrize("extension", [".bmp", ".png", ".jpg"])
+def test_read_proxy_matches_a_whole_image_downscale(tmp_path, extension):
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (1200, 1000, 3), dtype=np.uint8), (31, 31), 0)
+    path = tmp_path / f"scan{extension}"
+    cv2.imwrite(str(path), image)
+    expected = cv2.cvtColor(cv2.resize(cv2.imread(str(path)), (213, 256), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2RGB)
+
+    proxy, size = read_proxy(str(path), path.name, 256, strip_rows=100)
+
+    assert size == (1000, 1200)
+    assert proxy.shape == (256, 213, 3)
+    assert np.abs(proxy.astype(int) - expected).mean() < 2
+
+
+@pytest.mark.parametrize("make_tiling, band_width", [(False, None), (True, None), (True, 24)])
+def test_render_roughness_matches_whole_image(tmp_path, source_image, make_tiling, band_width):
+    path = tmp_path / "scan.bmp"
+    cv2.imwrite(str(path), source_image)
+    source = open_strip_source(str(path))
+    rgb_image = source.rows(0, source.height)
+
+    output = np.empty((source.height, source.width), dtype=np.uint8)
+    render_roughness(source, output, roughness=40, make_tiling=make_tiling, tiling_band_width=band_width, strip_rows=37)
+
+    expected = ImageProcessor.greyscale_adjust(rgb_image, roughness=40)
+    if make_tiling and band_width:
+        expected = ImageProcessor.make_tiling_seams(expected, band_width)
+    elif make_tiling:
+        expected = ImageProcessor.make_tiling(np.dstack([expected] * 3))[..., 0]
+    assert np.array_equal(output, expected)
+
+
+@pytest.mark.parametrize("normal_configuration", ["Normal Map", "Bump Map"])
+def test_render_normal_matches_whole_image(tmp_path, source_image, normal_configuration):
+    path = tmp_path / "scan.bmp"
+    cv2.imwrite(str(path), source_image)
+    source = open_strip_source(str(path))
+    rgb_image = source.rows(0, source.height)
+
+    output = np.empty((source.height, source.width, 3), dtype=np.uint8)
+    render_normal(source, output, normal_configuration, strip_rows=37)
+    assert np.array_equal(output, ImageProcessor.generate_normal_map(rgb_image, normal_configuration))
+
+    render_normal(source, output, strength=3.0, flip_green=True, strip_rows=37)
+    assert np.array_equal(output, ImageProcessor.generate_tangent_normal_map(rgb_image, 3.0, flip_green=True))
+
+
+def test_bmp_output_is_readable_and_converted(tmp_path):
+    bmp_path = str(tmp_path / "map.png.tmp.bmp")
+    output = create_bmp_output(bmp_path, 260, 257, 1)
+    output[:] = np.arange(257, dtype=np.uint16).astype(np.uint8)
+
+    finish_output(output, bmp_path, str(tmp_path / "map.png"))
+
+    assert not (tmp_path / "map.png.tmp.bmp").exists()
+    written = cv2.imread(str(tmp_path / "map.png"), cv2.IMREAD_UNCHANGED)
+    assert np.array_equal(written, np.asarray(output))
+
+
+@pytest.mark.parametrize("channels, compression", [(1, "BC4"), (3, "BC5")])
+def test_dds_output_is_written_in_strips(tmp_path, channels, compression, monkeypatch):
+    monkeypatch.setattr(dds, "BLOCK_ROWS_PER_CHUNK", 16)
+    height, width = 8192, 512
+    bmp_path = str(tmp_path / "map.dds.tmp.bmp")
+    output = create_bmp_output(bmp_path, height, width, channels)
+    rng = np.random.default_rng(0)
+    output[:] = rng.integers(0, 256, output.shape, dtype=np.uint8)
+    expected = encode_dds(np.array(output), compression)
+
+    tracemalloc.start()
+    try:
+        finish_output(output, bmp_path, str(tmp_path / "map.dds"), {"dds_compression": compression})
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # Even sides halve exactly, so the strips give the same file as the whole image
+    assert (tmp_path / "map.dds").read_bytes() == expected
+    assert peak < height * width * channels / 8
+    assert [path.name for path in tmp_path.iterdir()] == ["map.dds"]
+
+
+def test_process_texture_in_tiled_mode_keeps_source_resolution(tmp_path, source_image):
+    path = tmp_path / "scan.bmp"
+    cv2.imwrite(str(path), source_image)
+    preferences = {
+        "naming_convention": "Don't Convert",
+        "export_format": "PNG",
+        "target_export_resolution": TILED_EXPORT_RESOLUTION,
+        "generate_roughness": True,
+        "generate_normal": True,
+        "generate_metallic": True,
+    }
+
+    result = process_texture(str(path), "scan.bmp", preferences, {}, str(tmp_path))
+
+    assert result["error"] is None
+    assert [saved["map_type"] for saved in result["maps"]] == ["Roughness", "Normal", "Metallic"]
+    for filename in result["files"]:
+        assert cv2.imread(str(tmp_path / filename), cv2.IMREAD_UNCHANGED).shape[:2] == (300, 264)
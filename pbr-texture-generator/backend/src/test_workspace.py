@@ -0,0 +1,46 @@
+import os
+import time
+
+from src.http_cache import content_hash
+from src.workspace import (create_workspace, get_workspace, manifest_etags, processed_folder, read_manifest,
+                           remove_expired_workspaces, upload_folder, write_manifest)
+
+
+def test_workspaces_are_isolated(tmp_path):
+    first_id, first_path = create_workspace(str(tmp_path))
+    second_id, second_path = create_workspace(str(tmp_path))
+
+    assert first_id != second_id
+    assert os.path.isdir(upload_folder(first_path))
+    assert os.path.isdir(processed_folder(second_path))
+    assert get_workspace(str(tmp_path), first_id) == first_path
+
+
+def test_get_workspace_rejects_unknown_and_unsafe_ids(tmp_path):
+    assert get_workspace(str(tmp_path), "0" * 32) is None
+    assert get_workspace(str(tmp_path), "../processed") is None
+
+
+def test_remove_expired_workspaces(tmp_path):
+    old_id, old_path = create_workspace(str(tmp_path))
+    new_id, _ = create_workspace(str(tmp_path))
+    an_hour_ago = time.time() - 3600
+    os.utime(old_path, (an_hour_ago, an_hour_ago))
+
+    remove_expired_workspaces(str(tmp_path), max_age_seconds=600)
+
+    assert get_workspace(str(tmp_path), old_id) is None
+    assert get_workspace(str(tmp_path), new_id) is not None
+
+
+def test_manifest_records_content_hash_etags(tmp_path):
+    _, workspace_path = create_workspace(str(tmp_path))
+    with open(os.path.join(processed_folder(workspace_path), "brick_Normal.png"), 'wb') as file:
+        file.write(b"normal map")
+
+    write_manifest(workspace_path, [
+        {"source": "brick.png", "error": None, "maps": [{"map_type": "Normal", "filename": "brick_Normal.png", "bytes": 10}]},
+        {"source": "broken.png", "error": "Could not decode", "maps": []},
+    ])
+
+    assert manifest_etags(read_manifest(workspace_path)) == {"brick_Normal.png": content_hash(b"normal map")}
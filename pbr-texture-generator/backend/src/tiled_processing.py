@@ -0,0 +1,519 @@
+import io
+import os
+import struct
+import time
+
+import cv2
+import numpy as np
+
+from src.dds import write_dds
+from src.image_processing import ENCODER_DEFAULTS, ImageProcessor
+
+
+# Export resolution that switches process_texture to the tiled mode and keeps the source resolution
+TILED_EXPORT_RESOLUTION = "Full Resolution (Tiled)"
+
+# Size limit of the tiled mode, the regular pipeline stops at 15 MB
+TILED_MAX_SOURCE_BYTES = 2 * 1024 * 1024 * 1024
+
+# Only uncompressed 24-bit BMPs are streamed from disk. PNG and JPG sources are decoded whole, so their
+# resolution is capped to bound the memory one upload can take (64 MP is 192 MB decoded)
+TILED_MAX_DECODED_PIXELS = 64 * 1024 * 1024
+
+# JPEG start of frame markers, the segments that carry the image size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Rows processed at once, peak memory grows with strip_rows * width instead of the image size
+DEFAULT_STRIP_ROWS = 512
+
+# Extra rows each neighbourhood operation needs above and below a strip
+SOBEL_HALO = 1
+TILING_BLUR_SIZE = 31
+TILING_HALO = TILING_BLUR_SIZE // 2
+
+
+class StripSource:
+    """
+    Row access to a source image for the tiled mode.
+    Uncompressed 24-bit BMPs are viewed in place (memory mapped from disk, or straight from the uploaded bytes),
+    every other format is decoded once and the decoded image is shared by all passes.
+
+    Methods:
+        rows(top: int, bottom: int) -> np.ndarray:
+            Return a range of rows as an RGB image.
+
+        take(indices: np.ndarray) -> np.ndarray:
+            Return arbitrary rows as an RGB image.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        """
+        Parameters:
+            pixels (np.ndarray): H x W x 3 uint8 pixels in BGR order, the layout of both BMP files and cv2.imdecode.
+        """
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+
+    def rows(self, top: int, bottom: int) -> np.ndarray:
+        """
+        Return rows [top, bottom) as an RGB image, the channel order the pipeline works in.
+        """
+        return cv2.cvtColor(np.ascontiguousarray(self.pixels[top:bottom]), cv2.COLOR_BGR2RGB)
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Return the rows at the given indices as an RGB image.
+        """
+        return cv2.cvtColor(np.ascontiguousarray(self.pixels[indices]), cv2.COLOR_BGR2RGB)
+
+
+def map_bmp_pixels(source) -> np.ndarray:
+    """
+    View the pixels of an uncompressed 24-bit BMP without decoding or copying it.
+
+    Parameters:
+        source (str or bytes): Path to the BMP file, or its contents.
+
+    Returns:
+        np.ndarray: H x W x 3 BGR view with the top row first, or None if the file is not an uncompressed 24-bit BMP.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            header = file.read(54)
+    else:
+        header = bytes(source[:54])
+
+    if len(header) < 54 or header[:2] != b'BM':
+        return None
+
+    pixel_offset = struct.unpack_from('<I', header, 10)[0]
+    width, height, _, bits_per_pixel, compression = struct.unpack_from('<iiHHI', header, 18)
+    if bits_per_pixel != 24 or compression != 0 or width <= 0 or height == 0:
+        return None
+
+    row_stride = (width * 3 + 3) & ~3
+    shape = (abs(height), row_stride)
+    if isinstance(source, str):
+        rows = np.memmap(source, dtype=np.uint8, mode='r', offset=pixel_offset, shape=shape)
+    else:
+        rows = np.frombuffer(source, dtype=np.uint8, count=shape[0] * row_stride, offset=pixel_offset).reshape(shape)
+
+    pixels = rows[:, :width * 3].reshape(abs(height), width, 3)
+
+    # A positive height means the rows are stored bottom up
+    return pixels[::-1] if height > 0 else pixels
+
+
+def read_image_size(source) -> tuple:
+    """
+    Read the resolution of a PNG or JPEG from its header, without decoding the pixels.
+
+    Parameters:
+        source (str or bytes): Path to the image, or its contents.
+
+    Returns:
+        tuple: (width, height), or None if the header is not a PNG or JPEG header that could be read.
+    """
+    with (open(source, 'rb') if isinstance(source, str) else io.BytesIO(source)) as file:
+        signature = file.read(8)
+        if signature == b'\x89PNG\r\n\x1a\n':
+            # The IHDR chunk always comes first: length, type, width, height
+            chunk = file.read(16)
+            if len(chunk) < 16 or chunk[4:8] != b'IHDR':
+                return None
+            return struct.unpack('>II', chunk[8:16])
+
+        if signature[:2] != b'\xff\xd8':
+            return None
+        file.seek(2)
+        while True:
+            marker = file.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # Fill bytes may pad any marker
+            while marker[1] == 0xFF:
+                marker = marker[1:] + file.read(1)
+                if len(marker) < 2:
+                    return None
+            if 0xD0 <= marker[1] <= 0xD9 or marker[1] == 0x01:
+                # Markers without a payload
+                continue
+            length = file.read(2)
+            if len(length) < 2:
+                return None
+            length = struct.unpack('>H', length)[0]
+            if marker[1] in JPEG_SOF_MARKERS:
+                frame = file.read(5)
+                if len(frame) < 5:
+                    return None
+                height, width = struct.unpack('>HH', frame[1:5])
+                return width, height
+            file.seek(length - 2, io.SEEK_CUR)
+
+
+def check_tiled_source(source,
+                       filename: str = None):
+    """
+    Run the same extension and size checks as pre_process_check on a large upload,
+    with TILED_MAX_SOURCE_BYTES as the size limit.
+
+    Parameters:
+        source (str, bytes or file-like): Path to the image, its contents, or a stream to read them from.
+        filename (str): Original filename, used for the extension check when source is not a path.
+
+    Returns:
+        str or bytes: The path, or the contents read from the stream.
+    """
+    if isinstance(source, str):
+        filename = filename or source
+        file_size = os.path.getsize(source)
+    else:
+        source = source.read() if hasattr(source, 'read') else source
+        file_size = len(source)
+
+    valid_extensions = ('.png', '.jpg', '.jpeg', '.bmp')
+    if not filename or not filename.lower().endswith(valid_extensions):
+        raise ValueError("Invalid file extension. Only .png, .jpg, .jpeg, and .bmp are allowed.")
+    if file_size == 0:
+        raise ValueError("File size is 0. The file may be corrupted.")
+    if file_size > TILED_MAX_SOURCE_BYTES:
+        raise ValueError("File size is too large. Maximum allowed size in tiled mode is 2 GB.")
+
+    return source
+
+
+def check_decoded_size(size: tuple) -> None:
+    """
+    Check the header resolution of a PNG or JPG against TILED_MAX_DECODED_PIXELS before anything is decoded.
+
+    Parameters:
+        size (tuple): (width, height) from read_image_size, None if the header could not be read.
+    """
+    if size is None:
+        raise ValueError("Failed to read the image. The image may be corrupted or the format is not supported.")
+    if size[0] * size[1] > TILED_MAX_DECODED_PIXELS:
+        raise ValueError(f"Image resolution {size[0]}x{size[1]} is too large for a PNG or JPG in tiled mode, "
+                         f"the limit is {TILED_MAX_DECODED_PIXELS // (1024 * 1024)} megapixels. "
+                         "Save it as an uncompressed 24-bit BMP to process it at any size.")
+
+
+def open_strip_source(source,
+                      filename: str = None) -> StripSource:
+    """
+    Validate a large upload and open it for tiled processing, see check_tiled_source.
+    Uncompressed 24-bit BMPs are streamed, other formats are decoded whole and limited to TILED_MAX_DECODED_PIXELS,
+    checked on the header before anything is decoded.
+
+    Parameters:
+        source (str, bytes or file-like): Path to the image, its contents, or a stream to read them from.
+        filename (str): Original filename, used for the extension check when source is not a path.
+
+    Returns:
+        StripSource: Row access to the source image.
+    """
+    source = check_tiled_source(source, filename)
+
+    pixels = map_bmp_pixels(source)
+    if pixels is None:
+        check_decoded_size(read_image_size(source))
+        if isinstance(source, str):
+            source = np.fromfile(source, dtype=np.uint8)
+        # Stored orientation, like decode_image, so the size matches the header read above
+        pixels = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if pixels is None:
+            raise ValueError("Failed to read the image. The image may be corrupted or the format is not supported.")
+
+    if pixels.shape[0] < 256 or pixels.shape[1] < 256:
+        raise ValueError("Image resolution is too small. Minimum resolution is 256x256.")
+
+    return StripSource(pixels)
+
+
+def read_proxy(source,
+               filename: str,
+               max_side: int,
+               strip_rows: int = DEFAULT_STRIP_ROWS) -> tuple:
+    """
+    Validate a large upload like open_strip_source and downscale it to a proxy for previews of the tiled mode,
+    without holding the full resolution image in memory.
+    BMPs are shrunk a strip at a time, horizontally first and then vertically (INTER_AREA is separable).
+    PNGs and JPGs are decoded at a reduced scale when it still covers the proxy.
+
+    Parameters:
+        source (str, bytes or file-like): Path to the image, its contents, or a stream to read them from.
+        filename (str): Original filename, used for the extension check when source is not a path.
+        max_side (int): Longest side of the proxy in pixels. Smaller sources keep their size.
+        strip_rows (int): Rows of a BMP shrunk at once.
+
+    Returns:
+        tuple: (proxy, (width, height)), the RGB proxy and the resolution of the source.
+    """
+    source = check_tiled_source(source, filename)
+
+    pixels = map_bmp_pixels(source)
+    if pixels is not None:
+        height, width = pixels.shape[:2]
+    else:
+        size = read_image_size(source)
+        check_decoded_size(size)
+        width, height = size
+
+    if height < 256 or width < 256:
+        raise ValueError("Image resolution is too small. Minimum resolution is 256x256.")
+
+    scale = min(1.0, max_side / max(width, height))
+    proxy_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if pixels is not None:
+        narrowed = np.empty((height, proxy_size[0], 3), dtype=np.uint8)
+        for top, bottom in strips(height, strip_rows):
+            narrowed[top:bottom] = cv2.resize(np.ascontiguousarray(pixels[top:bottom]), (proxy_size[0], bottom - top),
+                                              interpolation=cv2.INTER_AREA)
+        proxy = cv2.resize(narrowed, proxy_size, interpolation=cv2.INTER_AREA)
+    else:
+        # The largest reduced decode that still has at least as many pixels as the proxy
+        flags = cv2.IMREAD_COLOR
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if max(width, height) // factor >= max(proxy_size):
+                flags = reduced
+                break
+        if isinstance(source, str):
+            source = np.fromfile(source, dtype=np.uint8)
+        decoded = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags | cv2.IMREAD_IGNORE_ORIENTATION)
+        if decoded is None:
+            raise ValueError("Failed to read the image. The image may be corrupted or the format is not supported.")
+        proxy = cv2.resize(decoded, proxy_size, interpolation=cv2.INTER_AREA)
+
+    return cv2.cvtColor(proxy, cv2.COLOR_BGR2RGB), (width, height)
+
+
+def create_bmp_output(path: str,
+                      height: int,
+                      width: int,
+                      channels: int) -> np.ndarray:
+    """
+    Create an uncompressed top-down BMP on disk and memory map its pixels, so maps can be written strip by strip.
+
+    Parameters:
+        path (str): Where the BMP is created.
+        height (int): Image height.
+        width (int): Image width.
+        channels (int): 1 for a greyscale map (8-bit with a grey palette) or 3 for a BGR map.
+
+    Returns:
+        np.ndarray: Writable H x W x channels view of the pixels, H x W for greyscale maps.
+    """
+    palette = bytes(value for grey in range(256) for value in (grey, grey, grey, 0)) if channels == 1 else b''
+    row_stride = (width * channels + 3) & ~3
+    pixel_offset = 14 + 40 + len(palette)
+    file_size = pixel_offset + row_stride * height
+
+    with open(path, 'wb') as file:
+        file.write(b'BM' + struct.pack('<IHHI', file_size, 0, 0, pixel_offset))
+        # A negative height stores the rows top down, in the order the strips are produced
+        file.write(struct.pack('<IiiHHIIiiII', 40, width, -height, 1, channels * 8, 0, row_stride * height,
+                               2835, 2835, 256 if channels == 1 else 0, 0))
+        file.write(palette)
+        file.truncate(file_size)
+
+    rows = np.memmap(path, dtype=np.uint8, mode='r+', offset=pixel_offset, shape=(height, row_stride))
+    pixels = rows[:, :width * channels]
+    return pixels if channels == 1 else pixels.reshape(height, width, channels)
+
+
+def finish_output(pixels: np.ndarray,
+                  bmp_path: str,
+                  output_path: str,
+                  encoder_settings: dict = None) -> dict:
+    """
+    Flush a map written through create_bmp_output and encode it to its final format.
+    BMP outputs are already complete, other formats are encoded from the memory mapped pixels in one pass.
+    DDS outputs are written strip by strip, so their memory use stays bounded like the BMP path.
+
+    Parameters:
+        pixels (np.ndarray): View returned by create_bmp_output.
+        bmp_path (str): Path of the BMP the view maps.
+        output_path (str): Final path of the map.
+        encoder_settings (dict): Overrides for ImageProcessor's ENCODER_DEFAULTS.
+
+    Returns:
+        dict: {"bytes": size of the final file, "encode_ms": time spent encoding}
+    """
+    if isinstance(pixels, np.memmap):
+        pixels.flush()
+
+    start = time.perf_counter()
+    if bmp_path != output_path:
+        extension = os.path.splitext(output_path)[1]
+        try:
+            if extension.lower() == '.dds':
+                # Compressed a strip at a time straight into the file, the mip levels are mapped from scratch files
+                settings = dict(ENCODER_DEFAULTS, **(encoder_settings or {}))
+                with open(output_path, 'wb') as file:
+                    write_dds(file, pixels, settings["dds_compression"], settings["dds_mipmaps"],
+                              scratch_directory=os.path.dirname(output_path) or '.')
+            elif not cv2.imwrite(output_path, pixels, ImageProcessor.encoder_parameters(extension, encoder_settings)):
+                raise ValueError(f"Failed to encode {os.path.basename(output_path)}.")
+        finally:
+            os.remove(bmp_path)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    return {"bytes": os.path.getsize(output_path), "encode_ms": round(encode_ms, 2)}
+
+
+def strips(height: int,
+           strip_rows: int = DEFAULT_STRIP_ROWS):
+    """
+    Yield (top, bottom) row ranges covering an image of the given height.
+    """
+    for top in range(0, height, strip_rows):
+        yield top, min(top + strip_rows, height)
+
+
+def reflect_rows(indices: np.ndarray,
+                 height: int) -> np.ndarray:
+    """
+    Map row indices outside the image back inside, mirroring OpenCV's default BORDER_REFLECT_101.
+    """
+    indices = np.abs(indices)
+    return np.where(indices >= height, 2 * height - 2 - indices, indices)
+
+
+def greyscale_lut(source: StripSource,
+                  intensity_factor: float = 1.0,
+                  grey_factor: float = 0.5,
+                  roughness: int = None,
+                  strip_rows: int = DEFAULT_STRIP_ROWS) -> np.ndarray:
+    """
+    First pass of the tiled roughness map, find the greyscale range of the whole image and build the point lookup table.
+
+    Returns:
+        np.ndarray: Lookup table from ImageProcessor.build_point_lut, identical to the one greyscale_adjust builds.
+    """
+    minimum, maximum = 255.0, 0.0
+    for top, bottom in strips(source.height, strip_rows):
+        greyscale = cv2.cvtColor(source.rows(top, bottom), cv2.COLOR_BGR2GRAY)
+        strip_minimum, strip_maximum = cv2.minMaxLoc(greyscale)[:2]
+        minimum, maximum = min(minimum, strip_minimum), max(maximum, strip_maximum)
+
+    return ImageProcessor.build_point_lut(minimum, maximum, intensity_factor, grey_factor, roughness)
+
+
+def render_roughness(source: StripSource,
+                     output: np.ndarray,
+                     roughness: int = None,
+                     make_tiling: bool = False,
+                     tiling_band_width: int = None,
+                     strip_rows: int = DEFAULT_STRIP_ROWS) -> None:
+    """
+    Render the roughness map strip by strip, the tiled counterpart of greyscale_adjust followed by
+    make_tiling_seams, or make_tiling when no band width is given.
+
+    Parameters:
+        source (StripSource): Source image.
+        output (np.ndarray): H x W uint8 array the map is written into, usually from create_bmp_output.
+        roughness (int): Preset roughness folded into the greyscale lookup table, see greyscale_adjust.
+        make_tiling (bool): Swap the quadrants and blend the seams.
+        tiling_band_width (int): Blend only this many pixels around the seams like make_tiling_seams.
+            None blurs the whole image like make_tiling.
+        strip_rows (int): Rows processed at once.
+    """
+    lut = greyscale_lut(source, roughness=roughness, strip_rows=strip_rows)
+    height, width = source.height, source.width
+
+    def greyscale_rows(rows):
+        return cv2.LUT(cv2.cvtColor(rows, cv2.COLOR_BGR2GRAY), lut)
+
+    if make_tiling and tiling_band_width is not None:
+        row_weights = ImageProcessor.seam_weights(height, tiling_band_width)
+        column_weights = ImageProcessor.seam_weights(width, tiling_band_width)
+
+    for top, bottom in strips(height, strip_rows):
+        if not make_tiling:
+            output[top:bottom] = greyscale_rows(source.rows(top, bottom))
+            continue
+
+        if tiling_band_width is not None:
+            # Rows of the quadrant swapped image, blended towards the same rows of the original inside the bands
+            swapped = greyscale_rows(source.take((np.arange(top, bottom) + height // 2) % height))
+            swapped = np.roll(swapped, -(width // 2), axis=1)
+            original = greyscale_rows(source.rows(top, bottom))
+            output[top:bottom] = ImageProcessor.blend_seam_band(swapped, original, row_weights[top:bottom], column_weights)
+            continue
+
+        # Rows of the quadrant swapped image, with the blur's halo mirrored at the image border
+        swapped_rows = reflect_rows(np.arange(top - TILING_HALO, bottom + TILING_HALO), height)
+        source_rows = (swapped_rows + height // 2) % height
+        greyscale = greyscale_rows(source.take(source_rows))
+        greyscale = np.roll(greyscale, -(width // 2), axis=1)
+
+        blended = cv2.GaussianBlur(greyscale.astype(np.float32) / 255.0, (TILING_BLUR_SIZE, TILING_BLUR_SIZE), 0)
+        blended = blended[TILING_HALO:TILING_HALO + bottom - top]
+        output[top:bottom] = np.clip(blended * 255.0, 0, 255).astype(np.uint8)
+
+
+def render_normal(source: StripSource,
+                  output: np.ndarray,
+                  normal_configuration: str = "Normal Map",
+                  strength: float = 2.0,
+                  flip_green: bool = None,
+                  strip_rows: int = DEFAULT_STRIP_ROWS) -> None:
+    """
+    Render the normal map strip by strip.
+    Tangent normal maps only need a one row halo. The legacy "Normal Map" and "Bump Map" stretch the gradients
+    by their range over the whole image, so they take two passes: one to find the range and one to write the map.
+
+    Parameters:
+        source (StripSource): Source image.
+        output (np.ndarray): H x W x 3 uint8 array the map is written into, usually from create_bmp_output.
+        normal_configuration (str): "Normal Map", "Bump Map", or a tangent workflow when flip_green is set.
+        strength (float): Slope multiplier of tangent normal maps.
+        flip_green (bool): None for the legacy configurations, otherwise whether green points down (DirectX).
+        strip_rows (int): Rows processed at once.
+    """
+    height = source.height
+
+    def haloed_rows(top, bottom):
+        halo_top, halo_bottom = max(top - SOBEL_HALO, 0), min(bottom + SOBEL_HALO, height)
+        return source.rows(halo_top, halo_bottom), top - halo_top
+
+    if flip_green is not None:
+        for top, bottom in strips(height, strip_rows):
+            rows, offset = haloed_rows(top, bottom)
+            normal_map = ImageProcessor.generate_tangent_normal_map(rows, strength, 0, flip_green, strip_rows=len(rows))
+            output[top:bottom] = normal_map[offset:offset + bottom - top]
+        return
+
+    def gradients(top, bottom):
+        rows, offset = haloed_rows(top, bottom)
+        greyscale = cv2.cvtColor(rows, cv2.COLOR_BGR2GRAY)
+        grad_x = cv2.Sobel(greyscale, cv2.CV_16S, 1, 0, ksize=3)[offset:offset + bottom - top]
+        grad_y = cv2.Sobel(greyscale, cv2.CV_16S, 0, 1, ksize=3)[offset:offset + bottom - top]
+        return grad_x, grad_y
+
+    # First pass, the gradient range of the whole image
+    ranges = [[np.inf, -np.inf], [np.inf, -np.inf]]
+    for top, bottom in strips(height, strip_rows):
+        for axis, gradient in enumerate(gradients(top, bottom)):
+            minimum, maximum = cv2.minMaxLoc(gradient)[:2]
+            ranges[axis] = [min(ranges[axis][0], minimum), max(ranges[axis][1], maximum)]
+
+    # Same scale and shift cv2.normalize derives for NORM_MINMAX
+    scales = []
+    for minimum, maximum in ranges:
+        scale = 255.0 / (maximum - minimum) if maximum - minimum > np.finfo(np.float64).eps else 0.0
+        scales.append((scale, -minimum * scale))
+
+    # Second pass, stretch the gradients and write the map
+    for top, bottom in strips(height, strip_rows):
+        normal_map = np.empty((bottom - top, source.width, 3), dtype=np.uint8)
+        for axis, gradient in enumerate(gradients(top, bottom)):
+            scale, shift = scales[axis]
+            normal_map[..., axis] = cv2.convertScaleAbs(gradient, alpha=scale, beta=shift)
+        normal_map[..., 2] = 127
+
+        if normal_configuration == "Bump Map":
+            normal_map = cv2.applyColorMap(cv2.cvtColor(normal_map, cv2.COLOR_BGR2GRAY), cv2.COLORMAP_JET)
+
+        output[top:bottom] = normal_map
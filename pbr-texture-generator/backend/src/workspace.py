@@ -0,0 +1,235 @@
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from src.http_cache import file_content_hash
+
+
+# Workspace IDs are uuid4 hex strings, anything else is rejected before touching the filesystem
+WORKSPACE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def create_workspace(workspace_root: str,
+                     previewed: bool = False) -> tuple:
+    """
+    Create an isolated workspace for one submission.
+    Each workspace holds its own uploads/, processed/ and previews/ folders so concurrent requests never touch each
+    other's files.
+
+    Parameters:
+        workspace_root (str): Folder that holds all workspaces.
+        previewed (bool): The workspace holds the uploads of a previewed submission, see is_preview_workspace.
+
+    Returns:
+        tuple: (workspace_id, workspace_path)
+    """
+    workspace_id = uuid.uuid4().hex
+    workspace_path = os.path.join(workspace_root, workspace_id)
+
+    os.makedirs(upload_folder(workspace_path))
+    os.makedirs(processed_folder(workspace_path))
+    os.makedirs(preview_folder(workspace_path))
+    if previewed:
+        open(os.path.join(workspace_path, 'preview'), 'w').close()
+
+    return workspace_id, workspace_path
+
+
+def get_workspace(workspace_root: str,
+                  workspace_id: str) -> str:
+    """
+    Look up an existing workspace.
+
+    Parameters:
+        workspace_root (str): Folder that holds all workspaces.
+        workspace_id (str): ID returned by create_workspace.
+
+    Returns:
+        str: Path of the workspace, or None if the ID is invalid or the workspace no longer exists.
+    """
+    if not WORKSPACE_ID_PATTERN.match(workspace_id or ""):
+        return None
+
+    workspace_path = os.path.join(workspace_root, workspace_id)
+    if not os.path.isdir(workspace_path):
+        return None
+
+    return workspace_path
+
+
+def is_preview_workspace(workspace_path: str) -> bool:
+    """
+    Whether a workspace was created by a preview and holds uploads that can be previewed and accepted.
+    The workspaces of submitted jobs are not, their preview ID would render an empty batch.
+    """
+    return (os.path.exists(os.path.join(workspace_path, 'preview'))
+            and os.path.isdir(upload_folder(workspace_path)) and bool(os.listdir(upload_folder(workspace_path))))
+
+
+def upload_folder(workspace_path: str) -> str:
+    """
+    Folder of a workspace where the uploaded source images are stored.
+    """
+    return os.path.join(workspace_path, 'uploads')
+
+
+def processed_folder(workspace_path: str) -> str:
+    """
+    Folder of a workspace where the generated maps are saved.
+    """
+    return os.path.join(workspace_path, 'processed')
+
+
+def preview_folder(workspace_path: str) -> str:
+    """
+    Folder of a workspace where the small previews of the generated maps are saved.
+    """
+    return os.path.join(workspace_path, 'previews')
+
+
+def proxy_folder(workspace_path: str) -> str:
+    """
+    Folder of a workspace where the small proxies of the uploads are kept between previews.
+    Only created when a submission is previewed.
+    """
+    return os.path.join(workspace_path, 'proxies')
+
+
+def profile_folder(workspace_path: str) -> str:
+    """
+    Folder of a workspace where the profiles of an admin profiled submission are saved.
+    Only created when a submission is profiled.
+    """
+    return os.path.join(workspace_path, 'profiles')
+
+
+def write_manifest(workspace_path: str,
+                   results: list) -> None:
+    """
+    Record which maps were generated from which source texture once a batch has finished.
+    The manifest is what lets downloads filter by map type and source texture. The outputs are final from
+    here on, so every map and preview also gets the content hash it is served with as a strong ETag.
+
+    Parameters:
+        workspace_path (str): Path of the workspace.
+        results (list): Result dicts returned by process_texture, in submission order.
+    """
+    output_folder = processed_folder(workspace_path)
+    previews = preview_folder(workspace_path)
+
+    sources = []
+    for result in results:
+        maps = []
+        for saved in result.get("maps", []):
+            saved = dict(saved)
+            path = os.path.join(output_folder, saved["filename"])
+            if os.path.isfile(path):
+                saved["etag"] = file_content_hash(path)
+            if saved.get("preview") and os.path.isfile(os.path.join(previews, saved["preview"])):
+                saved["preview_etag"] = file_content_hash(os.path.join(previews, saved["preview"]))
+            maps.append(saved)
+        sources.append({"source": result["source"], "maps": maps, "error": result["error"]})
+    manifest = {"sources": sources}
+
+    # Write to a temporary file first so readers never see a half written manifest
+    manifest_path = os.path.join(workspace_path, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def read_manifest(workspace_path: str) -> dict:
+    """
+    Read the manifest of a workspace.
+
+    Parameters:
+        workspace_path (str): Path of the workspace.
+
+    Returns:
+        dict: The manifest written by write_manifest, or None if the batch has not finished yet.
+    """
+    manifest_path = os.path.join(workspace_path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def write_job_status(workspace_path: str,
+                     job: dict) -> None:
+    """
+    Save the state of the job processing a workspace, so every web worker can answer status polls for it,
+    not only the worker that runs the job.
+
+    Parameters:
+        workspace_path (str): Path of the workspace.
+        job (dict): Job snapshot returned by JobManager.get.
+    """
+    # Write to a temporary file first so readers never see a half written status
+    status_path = os.path.join(workspace_path, 'status.json')
+    temporary_path = f'{status_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(job, file)
+    os.replace(temporary_path, status_path)
+
+
+def read_job_status(workspace_path: str) -> dict:
+    """
+    Read the job state saved by write_job_status.
+
+    Returns:
+        dict: The job snapshot, or None if no job was submitted for the workspace.
+    """
+    status_path = os.path.join(workspace_path, 'status.json')
+    if not os.path.exists(status_path):
+        return None
+
+    with open(status_path) as file:
+        return json.load(file)
+
+
+def manifest_etags(manifest: dict,
+                   previews: bool = False) -> dict:
+    """
+    Return the ETag of every map, or of every preview, in a manifest.
+
+    Parameters:
+        manifest (dict): Manifest returned by read_manifest.
+        previews (bool): Return the ETags of the previews instead of the maps.
+
+    Returns:
+        dict: Filename of each map (or preview) mapped to its content hash ETag.
+    """
+    name_key, etag_key = ("preview", "preview_etag") if previews else ("filename", "etag")
+    return {saved[name_key]: saved[etag_key] for entry in manifest["sources"] for saved in entry["maps"] if etag_key in saved}
+
+
+def remove_expired_workspaces(workspace_root: str,
+                              max_age_seconds: int) -> None:
+    """
+    Delete workspaces that have not been modified for longer than max_age_seconds.
+
+    Parameters:
+        workspace_root (str): Folder that holds all workspaces.
+        max_age_seconds (int): Age after which a workspace is deleted.
+    """
+    # Nothing to clean up before the first workspace has been created
+    if not os.path.isdir(workspace_root):
+        return
+
+    cutoff = time.time() - max_age_seconds
+
+    for workspace_id in os.listdir(workspace_root):
+        workspace_path = os.path.join(workspace_root, workspace_id)
+        if not WORKSPACE_ID_PATTERN.match(workspace_id) or not os.path.isdir(workspace_path):
+            continue
+
+        try:
+            if os.path.getmtime(workspace_path) < cutoff:
+                shutil.rmtree(workspace_path)
+        except Exception as e:
+            print(f'Failed to delete {workspace_path}. Reason: {e}')